@@ -1,507 +1,5587 @@
-import sys
-import json
-import os
-import csv
-import subprocess
-from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QTextEdit, QPushButton, QTableWidget, QTableWidgetItem, QHeaderView, QComboBox, QTabWidget, QFileDialog
-from PyQt5.QtGui import QFont, QPalette, QColor, QPixmap
-from PyQt5.QtCore import Qt
-from reportlab.lib.pagesizes import letter
-from reportlab.lib import colors
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle
-from PyQt5.QtWidgets import QStyledItemDelegate
-from PyQt5.QtWidgets import QMessageBox
-
-
-def install_dependencies():
-    try:
-        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
-    except subprocess.CalledProcessError:
-        print("Failed to install required dependencies.")
-        sys.exit(1)
-
-def check_dependencies():
-    try:
-        import PyQt5
-        import reportlab
-    except ImportError:
-        return False
-    return True
-
-class ContractorLeadsApp(QMainWindow):
-    def __init__(self):
-        super().__init__()
-        self.setWindowTitle("Contractor Leads Database by REA")
-        self.setGeometry(100, 100, 1600, 800)
-
-        if not check_dependencies():
-            install_dependencies()
-
-        self.central_widget = QWidget(self)
-        self.setCentralWidget(self.central_widget)
-
-        self.leads = []
-        self.load_leads_data()
-
-        self.setup_ui()
-
-    def setup_ui(self):
-        self.tabs = TabWidget(self, self.leads)
-        self.logo_label = QLabel()
-        self.logo_pixmap = QPixmap("logo.png")
-        self.logo_pixmap = self.logo_pixmap.scaledToWidth(150, Qt.SmoothTransformation)
-        self.logo_label.setPixmap(self.logo_pixmap)
-        self.logo_label.setAlignment(Qt.AlignCenter)
-
-        layout = QVBoxLayout()
-        layout.addWidget(self.logo_label)
-        layout.addWidget(self.tabs)
-        self.central_widget.setLayout(layout)
-
-        self.set_dark_theme()
-
-    def set_dark_theme(self):
-        app = QApplication.instance()
-        app.setStyle("Fusion")
-
-        # Dark palette
-        dark_palette = QPalette()
-        dark_palette.setColor(QPalette.Window, Qt.black)
-        dark_palette.setColor(QPalette.WindowText, Qt.white)
-        dark_palette.setColor(QPalette.Base, QColor(53, 53, 53))
-        dark_palette.setColor(QPalette.AlternateBase, QColor(35, 35, 35))
-        dark_palette.setColor(QPalette.ToolTipBase, Qt.white)
-        dark_palette.setColor(QPalette.ToolTipText, Qt.white)
-        dark_palette.setColor(QPalette.Text, Qt.white)
-        dark_palette.setColor(QPalette.Button, QColor(53, 53, 53))
-        dark_palette.setColor(QPalette.ButtonText, Qt.white)
-        dark_palette.setColor(QPalette.BrightText, Qt.red)
-        dark_palette.setColor(QPalette.Link, QColor(42, 130, 218))
-        dark_palette.setColor(QPalette.Highlight, QColor(42, 130, 218))
-        dark_palette.setColor(QPalette.HighlightedText, Qt.black)
-
-        app.setPalette(dark_palette)
-
-        # Set the font for all widgets to improve readability
-        app_font = QFont("Arial", 10)
-        app.setFont(app_font)
-
-    def closeEvent(self, event):
-        self.save_leads_data()
-        event.accept()
-
-    def save_leads_data(self):
-        with open("leads_data.json", "w") as file:
-            json.dump(self.leads, file)
-
-    def load_leads_data(self):
-        if os.path.exists("leads_data.json"):
-            try:
-                with open("leads_data.json", "r") as file:
-                    self.leads = json.load(file)
-            except json.JSONDecodeError:
-                self.leads = []
-        else:
-            folder_path = os.path.dirname(os.path.abspath(__file__))
-            os.makedirs(folder_path, exist_ok=True)
-            self.leads = []
-
-
-class TabWidget(QWidget):
-    def __init__(self, parent, leads_list):
-        super().__init__()
-
-        self.leads_list = leads_list
-
-        self.tabs = QTabWidget(self)
-
-        self.contractor_input_tab = ContractorInputTab(self.leads_list, self)
-        self.leads_table_tab = LeadsTableTab(self.leads_list)  # Remove the second argument
-        self.calendar_tab = ComingSoonTab()
-        self.calls_tab = ComingSoonTab()
-        self.email_tab = QTabWidget()
-        self.email_gmail_tab = ComingSoonTab()
-        self.email_smtp_tab = ComingSoonTab()
-        self.messaging_tab = QTabWidget()
-        self.messaging_twilio_tab = ComingSoonTab()
-        self.forms_tab = QTabWidget()
-        self.forms_my_forms_tab = ComingSoonTab()
-        self.forms_create_tab = ComingSoonTab()
-        self.forms_embed_tab = ComingSoonTab()
-        self.forms_settings_tab = ComingSoonTab()
-        self.integrations_tab = ComingSoonTab()
-        self.settings_tab = ComingSoonTab()
-
-        self.email_tab.addTab(self.email_gmail_tab, "Gmail")
-        self.email_tab.addTab(self.email_smtp_tab, "SMTP")
-
-        self.messaging_tab.addTab(self.messaging_twilio_tab, "Twilio")
-
-        self.forms_tab.addTab(self.forms_my_forms_tab, "My Forms")
-        self.forms_tab.addTab(self.forms_create_tab, "Create")
-        self.forms_tab.addTab(self.forms_embed_tab, "Embed")
-        self.forms_tab.addTab(self.forms_settings_tab, "Settings")
-
-        self.tabs.addTab(self.contractor_input_tab, "Contractor Leads Input")
-        self.tabs.addTab(self.leads_table_tab, "Leads Table View")
-        self.tabs.addTab(self.calendar_tab, "Calendar")
-        self.tabs.addTab(self.calls_tab, "Calls")
-        self.tabs.addTab(self.email_tab, "Email")
-        self.tabs.addTab(self.messaging_tab, "Messaging")
-        self.tabs.addTab(self.forms_tab, "Forms")
-        self.tabs.addTab(self.integrations_tab, "Integrations")
-        self.tabs.addTab(self.settings_tab, "Settings")
-
-        layout = QVBoxLayout()
-        layout.addWidget(self.tabs)
-        self.setLayout(layout)
-
-class ContractorInputTab(QWidget):
-    def __init__(self, leads_list, parent):
-        super().__init__()
-
-        self.leads_list = leads_list
-        self.parent = parent
-
-        self.name_label = QLabel("Name:")
-        self.name_input = QLineEdit()
-
-        self.address_label = QLabel("Address:")
-        self.address_input = QLineEdit()
-
-        self.phone_label = QLabel("Phone Number:")
-        self.phone_input = QLineEdit()
-
-        self.email_label = QLabel("Email:")
-        self.email_input = QLineEdit()
-
-        self.notes_label = QLabel("Notes:")
-        self.notes_input = QTextEdit()
-
-        self.referred_by_label = QLabel("Referred By:")
-        self.referred_by_input = QLineEdit()
-        
-        self.job_type_label = QLabel("Job Type:")
-        self.job_type_dropdown = QComboBox()
-        self.job_type_dropdown.addItems(["Residential", "Commercial", "Unknown"])
-        
-        self.submit_button = QPushButton("Submit")
-        self.submit_button.clicked.connect(self.add_lead)  # Connect to the add_lead method
-
-        layout = QVBoxLayout()
-        layout.addWidget(self.name_label)
-        layout.addWidget(self.name_input)
-        layout.addWidget(self.address_label)
-        layout.addWidget(self.address_input)
-        layout.addWidget(self.phone_label)
-        layout.addWidget(self.phone_input)
-        layout.addWidget(self.email_label)
-        layout.addWidget(self.email_input)
-        layout.addWidget(self.notes_label)
-        layout.addWidget(self.notes_input)
-        layout.addWidget(self.referred_by_label)
-        layout.addWidget(self.referred_by_input)
-        layout.addWidget(self.job_type_label)
-        layout.addWidget(self.job_type_dropdown)
-        layout.addWidget(self.submit_button)
-
-        self.setLayout(layout)
-
-    def add_lead(self):
-        name = self.name_input.text()
-        address = self.address_input.text()
-        phone = self.phone_input.text()
-        email = self.email_input.text()
-        notes = self.notes_input.toPlainText()
-        referred_by = self.referred_by_input.text()
-        job_type = self.job_type_dropdown.currentText()
-
-        lead_data = {
-            "Name": name,
-            "Address": address,
-            "Phone": phone,
-            "Email": email,
-            "Notes": notes,
-            "Referred By": referred_by,
-            "Job Type": job_type,
-            "Lead Status": "In System"  # Set the initial status here
-        }
-
-        # Append the lead data to the leads_list
-        self.leads_list.append(lead_data)
-        self.parent.leads_table_tab.populate_table()
-        
-        # Clear input fields after adding the lead
-        self.name_input.clear()
-        self.address_input.clear()
-        self.phone_input.clear()
-        self.email_input.clear()
-        self.notes_input.clear()
-        self.job_type_dropdown.setCurrentIndex(0)
-
-class CustomDelegate(QStyledItemDelegate):
-    def createEditor(self, parent, option, index):
-        editor = super().createEditor(parent, option, index)
-        if isinstance(editor, QLineEdit):
-            editor.editingFinished.connect(lambda: self.commitData.emit(editor))
-        elif isinstance(editor, QComboBox):
-            editor.currentIndexChanged.connect(lambda: self.commitData.emit(editor))
-        return editor
-        
-class LeadsTableTab(QWidget):
-    def __init__(self, leads_list):
-        super().__init__()
-        self.edit_mode = False  # Initialize edit_mode to False
-
-        self.leads_list = leads_list
-
-        self.table = QTableWidget(self)
-        self.table.setColumnCount(10)
-        self.table.setHorizontalHeaderLabels(
-            ["Lead Status", "Name", "Address", "Phone", "Email", "Notes", "Job Type", "Referred By", "Referred To", "Actions"])
-        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
-
-        # Apply custom delegate to handle editing of cell widgets
-        delegate = CustomDelegate()
-        self.table.setItemDelegate(delegate)
-        
-        # Create the refresh button
-        self.refresh_button = QPushButton("Refresh")
-        self.refresh_button.clicked.connect(self.populate_table)
-
-        # Create the export buttons
-        self.export_csv_button = QPushButton("Export to CSV")
-        self.export_csv_button.clicked.connect(self.export_to_csv)
-        self.export_pdf_button = QPushButton("Export to PDF")
-        self.export_pdf_button.clicked.connect(self.export_to_pdf)
-        self.export_txt_button = QPushButton("Export to TXT")
-        self.export_txt_button.clicked.connect(self.export_to_txt)
-
-        # Create the toggle edit mode button
-        self.toggle_edit_button = QPushButton("Toggle Edit Mode")
-        self.toggle_edit_button.clicked.connect(self.toggle_edit_mode)
-
-        # Modify the button sizes here
-        button_width = 120
-        button_height = 30
-
-        # Set fixed sizes for the buttons
-        self.refresh_button.setFixedSize(button_width, button_height)
-        self.export_csv_button.setFixedSize(button_width, button_height)
-        self.export_pdf_button.setFixedSize(button_width, button_height)
-        self.export_txt_button.setFixedSize(button_width, button_height)
-        self.toggle_edit_button.setFixedSize(button_width, button_height)
-
-        # Create a layout for the export buttons
-        export_button_layout = QVBoxLayout()
-        export_button_layout.addWidget(self.export_csv_button)
-        export_button_layout.addWidget(self.export_pdf_button)
-        export_button_layout.addWidget(self.export_txt_button)
-
-        # Create a layout for the buttons and set alignment
-        button_layout = QVBoxLayout()
-        button_layout.addWidget(self.refresh_button)
-        button_layout.addLayout(export_button_layout)
-        button_layout.addWidget(self.toggle_edit_button)
-        button_layout.setAlignment(Qt.AlignCenter)  # Center-align the buttons vertically
-
-        # Create the main layout for the tab
-        layout = QVBoxLayout()
-        layout.addWidget(self.table)
-        layout.addLayout(button_layout)  # Add the button layout to the main layout
-
-        self.setLayout(layout)
-
-        self.populate_table()
-
-
-    def toggle_edit_mode(self):
-        self.edit_mode = not getattr(self, "edit_mode", False)
-        
-        for row in range(self.table.rowCount()):
-            for col in range(1, self.table.columnCount() - 1):
-                item = self.table.cellWidget(row, col)
-                if isinstance(item, QLineEdit):
-                    item.setReadOnly(not self.edit_mode)
-        
-        self.toggle_edit_button.setText("Editing Enabled" if self.edit_mode else "Editing Disabled")
-
-    def createEditor(self, parent, option, index):
-        if not self.edit_mode:
-            QMessageBox.warning(self, "Editing Mode Off", "Editing must be enabled to edit cell data.")
-            return None
-
-        editor = super().createEditor(parent, option, index)
-        if isinstance(editor, QLineEdit):
-            editor.editingFinished.connect(lambda: self.commitData.emit(editor))
-        elif isinstance(editor, QComboBox):
-            editor.currentIndexChanged.connect(lambda: self.commitData.emit(editor))
-        return editor
-
-    def populate_table(self):
-        self.table.setRowCount(len(self.leads_list))  # Clear existing rows
-        for row, lead in enumerate(self.leads_list):
-
-            # Status Combo Box
-            status_combo = QComboBox()
-            status_combo.addItems(["In System", "Good Lead", "Contact Later", "Bad Lead", "Passed Along", "Closed"])
-            current_status = lead.get("Lead Status", "In System")
-            status_combo.setCurrentText(current_status)
-            status_combo.currentTextChanged.connect(lambda text, r=row: self.status_changed(r, text))
-            self.table.setCellWidget(row, 0, status_combo)
-
-            # Name, Address, Phone, Email
-            name_input = QLineEdit(lead["Name"])
-            name_input.editingFinished.connect(lambda r=row, input_field=name_input: self.input_field_changed(r, "Name", input_field.text()))
-            self.table.setCellWidget(row, 1, name_input)
-
-            address_input = QLineEdit(lead["Address"])
-            address_input.editingFinished.connect(lambda r=row, input_field=address_input: self.input_field_changed(r, "Address", input_field.text()))
-            self.table.setCellWidget(row, 2, address_input)
-
-            phone_input = QLineEdit(lead["Phone"])
-            phone_input.editingFinished.connect(lambda r=row, input_field=phone_input: self.input_field_changed(r, "Phone", input_field.text()))
-            self.table.setCellWidget(row, 3, phone_input)
-
-            email_input = QLineEdit(lead["Email"])
-            email_input.editingFinished.connect(lambda r=row, input_field=email_input: self.input_field_changed(r, "Email", input_field.text()))
-            self.table.setCellWidget(row, 4, email_input)
-            
-            # Notes
-            notes_input = QLineEdit(lead["Notes"])
-            self.table.setCellWidget(row, 5, notes_input)
-
-            #Type, Referred to/by
-            self.table.setItem(row, 6, QTableWidgetItem(lead["Job Type"]))
-            self.table.setItem(row, 7, QTableWidgetItem(lead["Referred By"]))
-            self.table.setItem(row, 8, QTableWidgetItem(lead.get("Referred To", "")))
-
-            # Job Type Combo Box
-            job_type_combo = QComboBox()
-            job_type_combo.addItems(["Residential", "Commercial", "Other"])
-            current_job_type = lead.get("Job Type", "Unknown")
-            job_type_combo.setCurrentText(current_job_type)
-            job_type_combo.currentTextChanged.connect(lambda text, r=row: self.job_type_changed(r, text))
-            self.table.setCellWidget(row, 6, job_type_combo)
-
-            # Referred By, Referred To
-            referred_by_input = QLineEdit(lead.get("Referred By", ""))
-            referred_by_input.textChanged.connect(lambda text, r=row: self.referred_by_changed(r, text))
-            self.table.setCellWidget(row, 7, referred_by_input)
-            referred_to_input = QLineEdit(lead.get("Referred To", ""))
-            referred_to_input.textChanged.connect(lambda text, r=row: self.referred_to_changed(r, text))
-            self.table.setCellWidget(row, 8, referred_to_input)
-
-            # Delete Button
-            delete_button = QPushButton("Delete")
-            delete_button.clicked.connect(lambda _, r=row: self.delete_lead(r))
-            self.table.setCellWidget(row, 9, delete_button)
-
-            # Connect input field changes to corresponding functions
-            referred_by_input.textChanged.connect(lambda text, r=row: self.input_field_changed(r, "Referred By", text))
-            referred_to_input.textChanged.connect(lambda text, r=row: self.input_field_changed(r, "Referred To", text))
-            
-    def input_field_changed(self, row, field_name, new_value):
-        self.leads_list[row][field_name] = new_value
-
-    def status_changed(self, row, text):
-        self.leads_list[row]["Lead Status"] = text
-
-    def name_changed(self, row, text):
-        self.leads_list[row]["Name"] = text
-        
-    def address_changed(self, row, text):
-        self.leads_list[row]["Address"] = text
-        
-    def phone_changed(self, row, text):
-        self.leads_list[row]["Phone"] = text
-        
-    def email_changed(self, row, text):
-        self.leads_list[row]["Email"] = text
-        
-    def notes_changed(self, row, text):
-        self.leads_list[row]["Notes"] = text
-        
-    def referred_by_changed(self, row, text):
-        self.leads_list[row]["Referred By"] = text
-
-    def referred_to_changed(self, row, text):
-        self.leads_list[row]["Referred To"] = text
-        
-    def export_to_csv(self):
-        options = QFileDialog.Options()
-        options |= QFileDialog.DontUseNativeDialog
-        file_name, _ = QFileDialog.getSaveFileName(self, "Export to CSV", "", "CSV Files (*.csv);;All Files (*)", options=options)
-        if file_name:
-            with open(file_name, "w", newline="") as csvfile:
-                writer = csv.writer(csvfile)
-                # Write the header
-                writer.writerow(["Name", "Address", "Phone", "Email", "Notes", "Job Type"])
-                # Write the data
-                for lead in self.leads_list:
-                    writer.writerow([lead["Name"], lead["Address"], lead["Phone"], lead["Email"], lead["Notes"], lead["Job Type"]])
-
-    def export_to_pdf(self):
-        options = QFileDialog.Options()
-        options |= QFileDialog.DontUseNativeDialog
-        file_name, _ = QFileDialog.getSaveFileName(self, "Export to PDF", "", "PDF Files (*.pdf);;All Files (*)", options=options)
-        if file_name:
-            doc = SimpleDocTemplate(file_name, pagesize=letter)
-            elements = []
-            data = [["Name", "Address", "Phone", "Email", "Notes", "Job Type"]]
-            for lead in self.leads_list:
-                data.append([lead["Name"], lead["Address"], lead["Phone"], lead["Email"], lead["Notes"], lead["Job Type"]])
-            t = Table(data)
-            t.setStyle(TableStyle([('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                                   ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                                   ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                                   ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                                   ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                                   ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                                   ('GRID', (0, 0), (-1, -1), 1, colors.black)]))
-            elements.append(t)
-            doc.build(elements)
-
-    def export_to_txt(self):
-        options = QFileDialog.Options()
-        options |= QFileDialog.DontUseNativeDialog
-        file_name, _ = QFileDialog.getSaveFileName(self, "Export to TXT", "", "Text Files (*.txt);;All Files (*)", options=options)
-        if file_name:
-            with open(file_name, "w") as file:
-                for lead in self.leads_list:
-                    file.write(f"Name: {lead['Name']}\n")
-                    file.write(f"Address: {lead['Address']}\n")
-                    file.write(f"Phone: {lead['Phone']}\n")
-                    file.write(f"Email: {lead['Email']}\n")
-                    file.write(f"Notes: {lead['Notes']}\n")
-                    file.write(f"Job Type: {lead['Job Type']}\n")
-                    file.write("\n")
-
-    def delete_lead(self, row):
-        confirmation = QMessageBox.question(
-            self, "Confirm Deletion",
-            "Are you sure you want to delete this lead?",
-            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
-        )
-        
-        if confirmation == QMessageBox.Yes:
-            del self.leads_list[row]
-            self.populate_table()  # Refresh the table
-
-    def job_type_changed(self, row, text):
-        self.leads_list[row]["Job Type"] = text
-
-class ComingSoonTab(QWidget):
-    def __init__(self):
-        super().__init__()
-        self.label = QLabel("Coming Soon")
-        self.label.setAlignment(Qt.AlignCenter)
-        layout = QVBoxLayout()
-        layout.addWidget(self.label)
-        self.setLayout(layout)
-        
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    window = ContractorLeadsApp()
-    window.show()
-    sys.exit(app.exec_())
+import time
+# Taken before anything heavy is imported so the startup report covers the imports too
+STARTUP_STARTED = time.perf_counter()
+import sys
+import json
+import os
+import csv
+import io
+import subprocess
+import sqlite3
+import threading
+import zlib
+import re
+import bisect
+import heapq
+import operator
+import shutil
+import datetime
+import gc
+import random
+import platform
+import tempfile
+import collections
+import importlib.util
+import functools
+import itertools
+import argparse
+import asyncio
+import urllib.parse
+import secrets
+import hmac
+import html
+import concurrent.futures
+from array import array
+from PyQt5.QtWidgets import QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QLineEdit, QTextEdit, QPushButton, QTableView, QTableWidget, QTableWidgetItem, QDialog, QHeaderView, QComboBox, QCheckBox, QTabWidget, QCalendarWidget, QFileDialog, QAbstractItemView, QStyle, QStyleOptionButton, QProgressDialog
+from PyQt5.QtGui import QFont, QPalette, QColor, QPixmap, QTextCharFormat
+from PyQt5.QtCore import Qt, QObject, QDate, QAbstractTableModel, QAbstractProxyModel, QModelIndex, QEvent, QTimer, QThread, pyqtSignal
+from PyQt5.QtWidgets import QStyledItemDelegate
+from PyQt5.QtWidgets import QMessageBox
+
+
+def install_dependencies():
+    try:
+        subprocess.check_call([sys.executable, "-m", "pip", "install", "-r", "requirements.txt"])
+    except subprocess.CalledProcessError:
+        print("Failed to install required dependencies.")
+        return False
+    return True
+
+def check_dependencies():
+    # Only looks the packages up, reportlab itself is imported on the first PDF export
+    return all(importlib.util.find_spec(name) is not None for name in ("PyQt5", "reportlab"))
+
+
+# (label, seconds since STARTUP_STARTED) for each startup step, LEADS_STARTUP_REPORT=1 prints them
+STARTUP_TIMINGS = []
+
+
+def startup_mark(label):
+    STARTUP_TIMINGS.append((label, time.perf_counter() - STARTUP_STARTED))
+
+
+def startup_report():
+    lines = []
+    previous = 0.0
+    for label, elapsed in STARTUP_TIMINGS:
+        lines.append(f"{label:<24}{(elapsed - previous) * 1000:8.1f} ms{elapsed * 1000:10.1f} ms")
+        previous = elapsed
+    return "\n".join(lines)
+
+
+class Profiler:
+    # Opt-in timings and counts for the hot paths (LEADS_PROFILE=1, or the Settings tab). While
+    # it is off a @profiled function pays one attribute check. While on, every call is counted
+    # and timed per name and kept as a trace event, the last TRACE_LIMIT of them, which
+    # write_chrome_trace saves for chrome://tracing or Perfetto.
+    TRACE_LIMIT = 200000
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # name -> [count, total seconds, max seconds]
+            self.stats = {}
+            self.events = collections.deque(maxlen=self.TRACE_LIMIT)
+            self.thread_names = {}
+            self.started = time.perf_counter()
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def add(self, phase, name, start, value):
+        with self.lock:
+            stat = self.stats.get(name)
+            if stat is None:
+                stat = self.stats[name] = [0, 0.0, 0.0]
+            stat[0] += 1
+            stat[1] += value
+            stat[2] = max(stat[2], value)
+            thread = threading.get_ident()
+            if thread not in self.thread_names:
+                self.thread_names[thread] = threading.current_thread().name
+            self.events.append((phase, name, start, value, thread))
+
+    def record(self, name, start, duration):
+        self.add("X", name, start, duration)
+
+    def sample(self, name, value):
+        # A measured value rather than a call, shown as a counter track in the trace
+        self.add("C", name, time.perf_counter(), value)
+
+    def summary(self):
+        # [(name, count, total, mean, max)] busiest first
+        with self.lock:
+            rows = [(name, count, total, total / count, longest) for name, (count, total, longest) in self.stats.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    def write_chrome_trace(self, path):
+        with self.lock:
+            events = list(self.events)
+            thread_names = dict(self.thread_names)
+        pid = os.getpid()
+        trace = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": thread, "args": {"name": name}} for thread, name in thread_names.items()]
+        for phase, name, start, value, thread in events:
+            event = {"name": name, "ph": phase, "ts": round((start - self.started) * 1e6, 1), "pid": pid, "tid": thread}
+            if phase == "X":
+                event["dur"] = round(value * 1e6, 1)
+            else:
+                event["args"] = {"ms": round(value * 1000, 3)}
+            trace.append(event)
+        with open(path, "w") as file:
+            json.dump({"traceEvents": trace, "displayTimeUnit": "ms"}, file)
+        return len(events)
+
+
+PROFILER = Profiler()
+
+
+def profiled(name):
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return function(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                PROFILER.record(name, start, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+class LeadsListener:
+    # Base class for anything that wants to follow changes to a LeadsList, override what you need
+    def leads_inserted(self, first, last):
+        pass
+
+    def leads_about_to_be_removed(self, first, last):
+        pass
+
+    def leads_removed(self, first, last, removed):
+        pass
+
+    def lead_updated(self, row, field_name, old_value, new_value):
+        pass
+
+    def leads_reset(self):
+        pass
+
+
+LEADS_DATA_FILE = "leads_data.json"
+LEADS_DB_FILE = "leads_data.db"
+LEADS_SHARDS_DIR = "leads_shards"
+
+LEAD_STATUSES = ["In System", "Good Lead", "Contact Later", "Bad Lead", "Passed Along", "Closed"]
+JOB_TYPES = ["Residential", "Commercial", "Other"]
+
+# Lead fields and the matching columns of the SQLite leads table
+LEAD_FIELDS = ["Name", "Address", "Phone", "Email", "Notes", "Referred By", "Job Type", "Lead Status", "Referred To"]
+SQL_COLUMNS = ["name", "address", "phone", "email", "notes", "referred_by", "job_type", "lead_status", "referred_to"]
+
+
+class Vocabulary:
+    # Interned enumeration of the values a column can take. Rows store the small integer
+    # code, every row with the same value shares one string. Code 0 means the field is not set.
+    def __init__(self, values):
+        self.values = [None]
+        self.codes = {None: 0}
+        for value in values:
+            self.code(value)
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            value = sys.intern(str(value))
+            code = len(self.values)
+            self.values.append(value)
+            self.codes[value] = code
+        return code
+
+
+LEAD_STATUS_VOCABULARY = Vocabulary(LEAD_STATUSES)
+JOB_TYPE_VOCABULARY = Vocabulary(JOB_TYPES + ["Unknown"])
+ENUM_FIELDS = {"Lead Status": LEAD_STATUS_VOCABULARY, "Job Type": JOB_TYPE_VOCABULARY}
+TEXT_FIELDS = [field_name for field_name in LEAD_FIELDS if field_name not in ENUM_FIELDS]
+# Free text fields that mostly repeat a handful of values
+INTERNED_FIELDS = {"Referred By", "Referred To"}
+LEAD_SLOTS = dict(zip(LEAD_FIELDS, SQL_COLUMNS))
+
+
+def lead_dict(values, extra):
+    # The JSON shape from the LEAD_FIELDS values and the extra dict: fields that were never set
+    # are left out, a field that was saved as null is in extra as None and written as null
+    # again, and anything unknown follows the lead fields
+    if not extra:
+        return {field_name: value for field_name, value in zip(LEAD_FIELDS, values) if value is not None}
+    data = {field_name: value for field_name, value in zip(LEAD_FIELDS, values) if value is not None or field_name in extra}
+    data.update((key, value) for key, value in extra.items() if key not in LEAD_SLOTS)
+    return data
+
+
+class Lead:
+    # One lead record. Reads like the dicts leads used to be (lead["Name"], lead.get(...))
+    # and converts to and from the JSON shape with from_dict/to_dict. Fields that were never
+    # set are None and are left out of to_dict, anything unknown is kept in extra (and so is
+    # a field that was set to null, see lead_dict).
+    __slots__ = SQL_COLUMNS + ["extra"]
+
+    def __init__(self, **fields):
+        for slot in SQL_COLUMNS:
+            setattr(self, slot, fields.get(slot))
+        self.extra = fields.get("extra")
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, Lead):
+            return data
+        lead = cls()
+        for field_name, value in data.items():
+            lead[field_name] = value
+        return lead
+
+    def to_dict(self):
+        return lead_dict([getattr(self, slot) for slot in SQL_COLUMNS], self.extra)
+
+    def get(self, field_name, default=None):
+        slot = LEAD_SLOTS.get(field_name)
+        if slot is not None:
+            value = getattr(self, slot)
+        else:
+            value = self.extra.get(field_name) if self.extra else None
+        return default if value is None else value
+
+    def __getitem__(self, field_name):
+        value = self.get(field_name)
+        if value is None:
+            raise KeyError(field_name)
+        return value
+
+    def __setitem__(self, field_name, value):
+        slot = LEAD_SLOTS.get(field_name)
+        if slot is not None:
+            setattr(self, slot, value)
+            if value is None:
+                if self.extra is None:
+                    self.extra = {}
+                self.extra[field_name] = None
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[field_name] = value
+
+    def __contains__(self, field_name):
+        return self.get(field_name) is not None
+
+    def keys(self):
+        return self.to_dict().keys()
+
+    def items(self):
+        return self.to_dict().items()
+
+    def __eq__(self, other):
+        if isinstance(other, (Lead, dict)):
+            return self.to_dict() == (other.to_dict() if isinstance(other, Lead) else other)
+        return NotImplemented
+
+    def __repr__(self):
+        return f"Lead({self.to_dict()!r})"
+
+
+class LeadsList:
+    # The leads collection, stored column by column: a list per text field, an array of
+    # Vocabulary codes for Lead Status and Job Type, and the stable lead ids (the storage
+    # backends' key) in an array. Indexing returns Lead records built from the columns;
+    # changes go through the methods below, which report them to the listeners as row
+    # ranges so views and indexes can patch just the affected rows. Changes hold the lock,
+    # so another thread (the API server) can read a consistent view by taking it too.
+    def __init__(self, leads=()):
+        self.listeners = []
+        self.lock = threading.RLock()
+        self.clear_columns()
+        self.next_id = 1
+        self.append_records(leads)
+        self.ids = array("q", self.take_ids(len(self.extra)))
+
+    def clear_columns(self):
+        self.columns = {field_name: [] for field_name in TEXT_FIELDS}
+        # 32 bit codes, a column can take more than 65535 distinct values
+        self.codes = {field_name: array("I") for field_name in ENUM_FIELDS}
+        self.extra = []
+        self.ids = array("q")
+        self.ids_changed()
+
+    def ids_changed(self):
+        # New leads get ids above every existing one, so the ids are normally in order and
+        # row_of() is a bisect. A lead added while a store is still paging in the rest puts
+        # them out of order, then row_of() uses an id -> row dict built when it's first needed.
+        self.ids_sorted = all(map(operator.lt, self.ids, itertools.islice(self.ids, 1, None)))
+        self.id_rows = None
+
+    def append_records(self, leads):
+        leads = [lead if isinstance(lead, dict) else lead.to_dict() for lead in leads]
+        for field_name, column in self.columns.items():
+            if field_name in INTERNED_FIELDS:
+                column.extend([None if lead.get(field_name) is None else sys.intern(lead[field_name]) for lead in leads])
+            else:
+                column.extend([lead.get(field_name) for lead in leads])
+        for field_name, codes in self.codes.items():
+            code = ENUM_FIELDS[field_name].code
+            codes.extend([code(lead.get(field_name)) for lead in leads])
+        self.extra.extend([{key: value for key, value in lead.items() if key not in LEAD_SLOTS or value is None} or None for lead in leads])
+
+    def add_listener(self, listener):
+        self.listeners.append(listener)
+
+    def remove_listener(self, listener):
+        if listener in self.listeners:
+            self.listeners.remove(listener)
+
+    def take_ids(self, count, ids=None):
+        if ids is None:
+            ids = list(range(self.next_id, self.next_id + count))
+        else:
+            ids = list(ids)
+        if ids:
+            self.next_id = max(self.next_id, max(ids) + 1)
+        return ids
+
+    def lead_id(self, row):
+        return self.ids[row]
+
+    def row_of(self, lead_id):
+        if self.ids_sorted:
+            row = bisect.bisect_left(self.ids, lead_id)
+            return row if row < len(self.ids) and self.ids[row] == lead_id else None
+        if self.id_rows is None:
+            self.id_rows = {row_id: row for row, row_id in enumerate(self.ids)}
+        return self.id_rows.get(lead_id)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, row):
+        if isinstance(row, slice):
+            return [self.record(index) for index in range(*row.indices(len(self)))]
+        if row < 0:
+            row += len(self)
+        return self.record(row)
+
+    def __iter__(self):
+        for row in range(len(self)):
+            yield self.record(row)
+
+    def record(self, row):
+        lead = Lead()
+        for field_name, column in self.columns.items():
+            setattr(lead, LEAD_SLOTS[field_name], column[row])
+        for field_name, codes in self.codes.items():
+            setattr(lead, LEAD_SLOTS[field_name], ENUM_FIELDS[field_name].values[codes[row]])
+        if self.extra[row]:
+            lead.extra = dict(self.extra[row])
+        return lead
+
+    def value(self, row, field_name):
+        # A single field straight from its column, None if the lead doesn't have it
+        column = self.columns.get(field_name)
+        if column is not None:
+            return column[row]
+        if field_name in self.codes:
+            return ENUM_FIELDS[field_name].values[self.codes[field_name][row]]
+        extra = self.extra[row]
+        return extra.get(field_name) if extra else None
+
+    def column_slice(self, field_name, start=0, stop=None):
+        column = self.columns.get(field_name)
+        if column is not None:
+            return column[start:stop]
+        if field_name in self.codes:
+            values = ENUM_FIELDS[field_name].values
+            return [values[code] for code in self.codes[field_name][start:stop]]
+        return [extra.get(field_name) if extra else None for extra in self.extra[start:stop]]
+
+    def iter_dicts(self, chunk_size=1000):
+        # Chunks of leads in the JSON shape, built straight from the columns
+        for start in range(0, len(self), chunk_size):
+            columns = [self.column_slice(field_name, start, start + chunk_size) for field_name in LEAD_FIELDS]
+            yield [lead_dict(values, extra) for values, extra in zip(zip(*columns), self.extra[start:start + chunk_size])]
+
+    def iter_rows(self, fields, chunk_size=1000):
+        # Chunks of value tuples for the given fields, what the exporters write from
+        for start in range(0, len(self), chunk_size):
+            yield list(zip(*[self.column_slice(field_name, start, start + chunk_size) for field_name in fields]))
+
+    def snapshot(self, rows=None):
+        # Point-in-time copy of the columns, or of just the given rows, with no listeners
+        copy = LeadsList()
+        if rows is None:
+            copy.columns = {field_name: list(column) for field_name, column in self.columns.items()}
+            copy.codes = {field_name: array("I", codes) for field_name, codes in self.codes.items()}
+            copy.extra = [dict(extra) if extra else None for extra in self.extra]
+            copy.ids = array("q", self.ids)
+        else:
+            copy.columns = {field_name: [column[row] for row in rows] for field_name, column in self.columns.items()}
+            copy.codes = {field_name: array("I", [codes[row] for row in rows]) for field_name, codes in self.codes.items()}
+            copy.extra = [dict(self.extra[row]) if self.extra[row] else None for row in rows]
+            copy.ids = array("q", [self.ids[row] for row in rows])
+        copy.ids_changed()
+        copy.next_id = self.next_id
+        return copy
+
+    def append_lead(self, lead, lead_id=None):
+        return self.add_leads([lead], None if lead_id is None else [lead_id])
+
+    @profiled("leads add")
+    def add_leads(self, leads, ids=None):
+        with self.lock:
+            first = len(self)
+            self.append_records(leads)
+            new_ids = self.take_ids(len(self.extra) - first, ids)
+            if self.ids_sorted and new_ids and ((first and new_ids[0] <= self.ids[-1]) or
+                                                 not all(map(operator.lt, new_ids, new_ids[1:]))):
+                self.ids_sorted = False
+            self.ids.extend(new_ids)
+            if self.id_rows is not None:
+                self.id_rows.update(zip(new_ids, range(first, len(self))))
+            last = len(self) - 1
+            if last >= first:
+                for listener in self.listeners:
+                    listener.leads_inserted(first, last)
+            return first
+
+    def remove_lead(self, row):
+        return self.remove_leads(row, 1)[0]
+
+    @profiled("leads remove")
+    def remove_leads(self, first, count):
+        with self.lock:
+            last = first + count - 1
+            for listener in self.listeners:
+                listener.leads_about_to_be_removed(first, last)
+            removed = self[first:last + 1]
+            for column in self.columns.values():
+                del column[first:last + 1]
+            for codes in self.codes.values():
+                del codes[first:last + 1]
+            del self.extra[first:last + 1]
+            del self.ids[first:last + 1]
+            # The rows after the removed ones moved up, the dict is built again when needed
+            self.id_rows = None
+            for listener in self.listeners:
+                listener.leads_removed(first, last, removed)
+            return removed
+
+    @profiled("leads update")
+    def update_lead(self, row, field_name, value):
+        with self.lock:
+            old_value = self.value(row, field_name)
+            if old_value is None:
+                old_value = ""
+            if old_value == value:
+                return False
+            if field_name in self.columns:
+                self.columns[field_name][row] = sys.intern(value) if field_name in INTERNED_FIELDS else value
+            elif field_name in self.codes:
+                self.codes[field_name][row] = ENUM_FIELDS[field_name].code(value)
+            else:
+                if self.extra[row] is None:
+                    self.extra[row] = {}
+                self.extra[row][field_name] = value
+            for listener in self.listeners:
+                listener.lead_updated(row, field_name, old_value, value)
+            return True
+
+    def reset(self, leads, ids=None):
+        with self.lock:
+            self.clear_columns()
+            self.append_records(leads)
+            self.next_id = 1
+            self.ids = array("q", self.take_ids(len(self.extra), ids))
+            self.ids_changed()
+            for listener in self.listeners:
+                listener.leads_reset()
+
+    def take_columns(self, other):
+        # reset() to the leads of a LeadsList built elsewhere (e.g. on a loading thread), which
+        # hands over its columns instead of them being built again here
+        with self.lock:
+            self.columns, self.codes, self.extra, self.ids = other.columns, other.codes, other.extra, other.ids
+            self.ids_sorted, self.id_rows = other.ids_sorted, other.id_rows
+            self.next_id = other.next_id
+            other.clear_columns()
+            for listener in self.listeners:
+                listener.leads_reset()
+
+
+class LeadStore(LeadsListener):
+    # Storage backends load into a LeadsList and then follow it as a listener.
+    # load() only has to fill in the first page, load_more() is called until it returns False.
+    PAGE_SIZE = 1000
+
+    def __init__(self):
+        self.leads = None
+        # flush() may run on the autosave thread, this keeps it from overlapping a save or close
+        self.flush_lock = threading.Lock()
+
+    def attach(self, leads):
+        self.leads = leads
+        leads.add_listener(self)
+
+    def prepare(self):
+        # The slow part of load() that doesn't touch the LeadsList, so the app can run it on a
+        # worker thread first. load() does it itself when it wasn't.
+        pass
+
+    def load(self, leads):
+        raise NotImplementedError
+
+    def load_more(self, leads, count=None):
+        return False
+
+    def save(self, leads):
+        raise NotImplementedError
+
+    def flush(self):
+        pass
+
+    def compaction_due(self):
+        # Whether compact() has enough work to be worth running once edits pause
+        return False
+
+    def compact(self):
+        pass
+
+    def pending_count(self):
+        # Changes made but not written yet
+        return 0
+
+    def close(self):
+        pass
+
+    # Headless access for the command line, straight against storage with nothing loaded.
+    # Leads are plain dicts in the JSON shape and come and go a chunk at a time.
+    def iter_leads(self, chunk_size=None):
+        raise NotImplementedError
+
+    def append_leads(self, chunks):
+        raise NotImplementedError
+
+    def update_leads(self, update):
+        # update(lead) changes the dict in place and returns True if it did, returns how many changed
+        raise NotImplementedError
+
+    # Whole-dataset operations for the command line, options holds the query, status and
+    # job_type filters (see filter_options). ShardedLeadStore runs them on a process pool.
+    def iter_matching(self, options):
+        matches = lead_filter(options)
+        for chunk in self.iter_leads(CLI_CHUNK_SIZE):
+            chunk = [lead for lead in chunk if matches(lead)]
+            if chunk:
+                yield chunk
+
+    def export_matching(self, export_format, options, file_name):
+        return export_leads(export_format, LeadStream(self.iter_matching(options)), file_name)
+
+    def lead_counts(self, options):
+        # {field: Counter} like the dashboard's, for AGGREGATE_FIELDS
+        counts = {field_name: collections.Counter() for field_name in AGGREGATE_FIELDS}
+        for chunk in self.iter_matching(options):
+            count_leads(counts, chunk)
+        return counts
+
+    def import_keys(self):
+        return {lead_import_key(lead) for chunk in self.iter_leads(CLI_CHUNK_SIZE) for lead in chunk}
+
+    def find_duplicates(self, limit=None):
+        # ([(score, id, id)] best first, {id: duplicate record} for those ids). The ids only
+        # exist once the leads are loaded, so here they are, like the app does.
+        leads = LeadsList()
+        self.load(leads)
+        while self.load_more(leads):
+            pass
+        index = DuplicateIndex(leads)
+        duplicates = index.find_duplicates(limit)
+        return duplicates, {lead_id: index.records[lead_id] for pair in duplicates for lead_id in pair[1:]}
+
+
+def fsync_directory(path):
+    if os.name != "posix":
+        return
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def replay_journal_record(leads, record):
+    op = record["op"]
+    if op == "insert":
+        leads.extend(record["leads"])
+    elif op == "delete":
+        del leads[record["row"]:record["row"] + record["count"]]
+    elif op == "update":
+        leads[record["row"]][record["field"]] = record["value"]
+
+
+class JsonLeadStore(LeadStore):
+    # leads_data.json is a snapshot, every change after it is queued as a journal record and
+    # flush() appends (and fsyncs) the queued records to a journal segment leads_data.json.log.<n>.
+    # Once COMPACT_EVERY records are in the journal, compact() folds the segments into a new snapshot
+    # and writes a checkpoint record holding the snapshot's crc32 and the last segment it covers,
+    # so a crash at any point never replays a segment twice.
+    COMPACT_EVERY = 1000
+
+    def __init__(self, path=LEADS_DATA_FILE):
+        super().__init__()
+        self.path = path
+        self.journal_file = None
+        # Bytes of whole records in the open segment, a failed write is cut back to this
+        self.journal_size = 0
+        self.journal_torn = False
+        self.segment = 0
+        self.segment_has_edits = False
+        # Records not written yet, only touched while holding the leads' lock
+        self.pending_records = []
+        self.records_since_compaction = 0
+        # (LeadsList, next segment) from prepare()
+        self.prepared = None
+
+    def segment_path(self, segment):
+        return f"{self.path}.log.{segment}"
+
+    def existing_segments(self):
+        prefix = os.path.basename(self.path) + ".log."
+        folder_path = os.path.dirname(os.path.abspath(self.path))
+        segments = []
+        for name in os.listdir(folder_path):
+            if name.startswith(prefix) and name[len(prefix):].isdigit():
+                segments.append(int(name[len(prefix):]))
+        return sorted(segments)
+
+    def read_segment(self, segment):
+        records = []
+        with open(self.segment_path(segment), "r") as file:
+            for line in file:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    # A torn last line from a crash mid-write, nothing after it was acknowledged
+                    break
+        return records
+
+    @profiled("json store prepare")
+    def prepare(self):
+        snapshot = []
+        snapshot_crc = None
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as file:
+                data = file.read()
+            snapshot_crc = zlib.crc32(data)
+            try:
+                # A record at a time rather than one json.loads(), which would hold the GIL
+                # (and freeze the window) for the whole file
+                snapshot = list(iter_json_records(io.StringIO(data.decode("utf-8"))))
+            except ValueError:
+                snapshot = []
+        else:
+            folder_path = os.path.dirname(os.path.abspath(self.path))
+            os.makedirs(folder_path, exist_ok=True)
+
+        segments = [(segment, self.read_segment(segment)) for segment in self.existing_segments()]
+        covered = -1
+        for _, records in segments:
+            for record in records:
+                if record["op"] == "checkpoint" and record["crc"] == snapshot_crc:
+                    covered = max(covered, record["through"])
+        for segment, records in segments:
+            if segment <= covered:
+                continue
+            for record in records:
+                replay_journal_record(snapshot, record)
+            self.records_since_compaction += len(records)
+        # Always start a fresh segment so nothing is appended after a torn line
+        self.prepared = (LeadsList(snapshot), segments[-1][0] + 1 if segments else 1)
+
+    @profiled("json store load")
+    def load(self, leads):
+        if self.prepared is None:
+            self.prepare()
+        loaded, self.segment = self.prepared
+        self.prepared = None
+        leads.take_columns(loaded)
+        self.open_journal()
+
+    def open_journal(self):
+        self.journal_file = open(self.segment_path(self.segment), "a")
+        self.journal_size = os.fstat(self.journal_file.fileno()).st_size
+        self.journal_torn = False
+
+    def write_journal(self, text):
+        # read_segment() stops at the first line it can't parse, so a line torn by a failed write
+        # is cut off before anything else is appended, or every record after it would be lost
+        if self.journal_torn:
+            try:
+                self.journal_file.close()
+            except OSError:
+                # Whatever was still buffered from the failed write, it's cut off below anyway
+                pass
+            os.truncate(self.segment_path(self.segment), self.journal_size)
+            self.open_journal()
+        try:
+            self.journal_file.write(text)
+            self.journal_file.flush()
+            os.fsync(self.journal_file.fileno())
+        except Exception:
+            self.journal_torn = True
+            raise
+        self.journal_size += len(text.encode())
+
+    def append_record(self, record):
+        # Typing into a field updates it once per key, only the last value needs writing
+        last = self.pending_records[-1] if self.pending_records else None
+        if (record["op"] == "update" and last is not None and last["op"] == "update"
+                and last["row"] == record["row"] and last["field"] == record["field"]):
+            last["value"] = record["value"]
+            return
+        self.pending_records.append(record)
+        self.records_since_compaction += 1
+
+    def pending_count(self):
+        return len(self.pending_records)
+
+    @profiled("json store flush")
+    def flush(self, compact=False):
+        # Safe to call from a worker thread: the queued records (and for a compaction, a copy of
+        # the leads) are taken under the leads' lock, the writing happens outside it
+        with self.flush_lock:
+            if self.journal_file is None or self.leads is None:
+                return
+            with self.leads.lock:
+                records, self.pending_records = self.pending_records, []
+                counted = self.records_since_compaction
+                if compact:
+                    snapshot = self.leads.snapshot()
+                    self.records_since_compaction = 0
+            if records:
+                try:
+                    self.write_journal("".join(json.dumps(record) + "\n" for record in records))
+                except Exception:
+                    # Back in front of anything queued meanwhile, the next flush writes them again
+                    with self.leads.lock:
+                        self.pending_records[:0] = records
+                        if compact:
+                            self.records_since_compaction += counted
+                    raise
+                self.segment_has_edits = True
+            if compact:
+                # The snapshot covers this segment and every one before it, later records go in a new one
+                through = self.segment
+                self.journal_file.close()
+                self.segment += 1
+                self.open_journal()
+                self.segment_has_edits = False
+                self.write_snapshot(snapshot, through)
+
+    def compaction_due(self):
+        return self.records_since_compaction >= self.COMPACT_EVERY
+
+    def compact(self):
+        self.flush(compact=True)
+
+    @staticmethod
+    def write_leads_file(path, chunks):
+        # Streams the same bytes json.dump would write, a chunk of leads at a time, and returns their crc32
+        crc = 0
+        with open(path, "wb", buffering=EXPORT_BUFFER_SIZE) as file:
+            separator = "["
+            for chunk in chunks:
+                if not chunk:
+                    continue
+                data = (separator + ", ".join(json.dumps(lead) for lead in chunk)).encode()
+                crc = zlib.crc32(data, crc)
+                file.write(data)
+                separator = ", "
+            data = b"[]" if separator == "[" else b"]"
+            crc = zlib.crc32(data, crc)
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        return crc
+
+    def write_snapshot(self, snapshot, through):
+        temp_path = self.path + ".tmp"
+        crc = self.write_leads_file(temp_path, snapshot.iter_dicts())
+        self.write_journal(json.dumps({"op": "checkpoint", "crc": crc, "through": through}) + "\n")
+        os.replace(temp_path, self.path)
+        fsync_directory(self.path)
+        for segment in self.existing_segments():
+            if segment <= through:
+                os.remove(self.segment_path(segment))
+
+    @profiled("json store save")
+    def save(self, leads):
+        self.flush(compact=True)
+
+    def close(self):
+        self.flush()
+        with self.flush_lock:
+            if self.journal_file is None:
+                return
+            self.journal_file.close()
+            # The snapshot is in place and nothing was edited after it, the segment is not needed
+            if not self.segment_has_edits:
+                os.remove(self.segment_path(self.segment))
+            self.journal_file = None
+
+    def fold_journal(self):
+        # Headless commands stream the snapshot file, so anything still in the journal is folded
+        # into it first. Only this step needs the leads in memory, and only when there is a journal.
+        if not self.existing_segments():
+            return
+        leads = LeadsList()
+        self.load(leads)
+        self.attach(leads)
+        self.flush(compact=True)
+        self.close()
+        leads.remove_listener(self)
+        self.leads = None
+
+    def iter_leads(self, chunk_size=None):
+        self.fold_journal()
+        if not os.path.exists(self.path):
+            return
+        chunk_size = chunk_size or self.PAGE_SIZE
+        with open(self.path, "r") as file:
+            chunk = []
+            for lead in iter_json_records(file):
+                chunk.append(lead)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+            if chunk:
+                yield chunk
+
+    def replace_leads(self, chunks):
+        # chunks usually reads the current snapshot (see iter_leads), the new one replaces it at the end
+        self.fold_journal()
+        temp_path = self.path + ".tmp"
+        self.write_leads_file(temp_path, chunks)
+        os.replace(temp_path, self.path)
+        fsync_directory(self.path)
+
+    def append_leads(self, chunks):
+        self.replace_leads(itertools.chain(self.iter_leads(), chunks))
+
+    def update_leads(self, update):
+        updated = 0
+
+        def updated_chunks():
+            nonlocal updated
+            for chunk in self.iter_leads():
+                for lead in chunk:
+                    if update(lead):
+                        updated += 1
+                yield chunk
+
+        self.replace_leads(updated_chunks())
+        return updated
+
+    def leads_inserted(self, first, last):
+        self.append_record({"op": "insert", "row": first, "leads": [lead.to_dict() for lead in self.leads[first:last + 1]]})
+
+    def leads_removed(self, first, last, removed):
+        self.append_record({"op": "delete", "row": first, "count": last - first + 1})
+
+    def lead_updated(self, row, field_name, old_value, new_value):
+        self.append_record({"op": "update", "row": row, "field": field_name, "value": new_value})
+
+
+class QueuedLeadStore(LeadStore):
+    # Stores that write leads by id: each change queues the lead's id, and flush() hands the
+    # queue to write_pending() in one go. A failed write goes back in the queue for the next flush.
+    def __init__(self):
+        super().__init__()
+        # id -> lead to upsert, or None to delete. Several edits to one lead collapse into one write.
+        # Only touched while holding the leads' lock.
+        self.pending = {}
+        self.removing_ids = []
+        # Set while loading rows that are already stored, so they aren't queued again
+        self.loading = False
+
+    def queue(self, lead_id, lead):
+        self.pending[lead_id] = lead
+
+    def pending_count(self):
+        return len(self.pending)
+
+    def flush(self):
+        with self.flush_lock:
+            if self.leads is None:
+                return
+            with self.leads.lock:
+                pending, self.pending = self.pending, {}
+            if not pending:
+                return
+            try:
+                self.write_pending(pending)
+            except Exception:
+                # Changes queued since are newer and win
+                with self.leads.lock:
+                    for lead_id, lead in pending.items():
+                        self.pending.setdefault(lead_id, lead)
+                raise
+
+    def write_pending(self, pending):
+        # The caller holds flush_lock
+        raise NotImplementedError
+
+    def save(self, leads):
+        # Every change is already queued as it happens, saving only has to commit them
+        self.flush()
+
+    def leads_inserted(self, first, last):
+        if self.loading:
+            return
+        for row in range(first, last + 1):
+            self.queue(self.leads.ids[row], self.leads[row])
+
+    def leads_about_to_be_removed(self, first, last):
+        self.removing_ids = self.leads.ids[first:last + 1]
+
+    def leads_removed(self, first, last, removed):
+        for lead_id in self.removing_ids:
+            self.queue(lead_id, None)
+        self.removing_ids = []
+
+    def lead_updated(self, row, field_name, old_value, new_value):
+        self.queue(self.leads.ids[row], self.leads[row])
+
+
+class SqliteLeadStore(QueuedLeadStore):
+    def __init__(self, path=LEADS_DB_FILE):
+        super().__init__()
+        self.path = path
+        self.is_new = not os.path.exists(path)
+        # flush() runs on the autosave thread, every use of the connection holds flush_lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        columns = ", ".join(f"{column} TEXT" for column in SQL_COLUMNS)
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS leads (id INTEGER PRIMARY KEY, {columns}, extra TEXT)")
+        self.connection.commit()
+        self.last_loaded_id = 0
+
+        all_columns = ["id"] + SQL_COLUMNS + ["extra"]
+        updates = ", ".join(f"{column}=excluded.{column}" for column in all_columns[1:])
+        self.upsert_sql = (f"INSERT INTO leads ({', '.join(all_columns)}) VALUES ({', '.join('?' * len(all_columns))}) "
+                           f"ON CONFLICT(id) DO UPDATE SET {updates}")
+
+    @staticmethod
+    def lead_to_row(lead_id, lead):
+        extra = {key: value for key, value in lead.items() if key not in LEAD_FIELDS}
+        return [lead_id] + [lead.get(field) for field in LEAD_FIELDS] + [json.dumps(extra) if extra else None]
+
+    @staticmethod
+    def row_to_lead(row):
+        lead = {}
+        for field, value in zip(LEAD_FIELDS, row[1:]):
+            # Keep the JSON shape, fields that were never set stay missing
+            if value is not None:
+                lead[field] = value
+        if row[-1]:
+            lead.update(json.loads(row[-1]))
+        return lead
+
+    def import_json_file(self, json_path):
+        # One-shot import of an existing leads_data.json, done in a single transaction
+        with open(json_path, "r") as file:
+            leads = json.load(file)
+        start = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM leads").fetchone()[0] + 1
+        with self.connection:
+            self.connection.executemany(self.upsert_sql, (self.lead_to_row(start + offset, lead) for offset, lead in enumerate(leads)))
+        return len(leads)
+
+    def fetch_page(self, after_id, count):
+        columns = ", ".join(["id"] + SQL_COLUMNS + ["extra"])
+        with self.flush_lock:
+            return self.connection.execute(f"SELECT {columns} FROM leads WHERE id > ? ORDER BY id LIMIT ?", (after_id, count)).fetchall()
+
+    @profiled("sqlite store load")
+    def load(self, leads):
+        rows = self.fetch_page(0, self.PAGE_SIZE)
+        self.last_loaded_id = rows[-1][0] if rows else 0
+        leads.reset([self.row_to_lead(row) for row in rows], [row[0] for row in rows])
+        # Leads added before the last page is in must not reuse the id of one still in the table
+        with self.flush_lock:
+            leads.next_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM leads").fetchone()[0] + 1
+
+    @profiled("sqlite store load_more")
+    def load_more(self, leads, count=None):
+        rows = self.fetch_page(self.last_loaded_id, count or self.PAGE_SIZE)
+        if not rows:
+            return False
+        self.last_loaded_id = rows[-1][0]
+        # These rows are already stored, don't queue them for writing again
+        self.loading = True
+        try:
+            leads.add_leads([self.row_to_lead(row) for row in rows], [row[0] for row in rows])
+        finally:
+            self.loading = False
+        return True
+
+    def iter_pages(self, chunk_size=None):
+        # The stored rows (id first) in id order, a page at a time
+        last_id = 0
+        while True:
+            rows = self.fetch_page(last_id, chunk_size or self.PAGE_SIZE)
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            yield rows
+
+    def iter_leads(self, chunk_size=None):
+        for rows in self.iter_pages(chunk_size):
+            yield [self.row_to_lead(row) for row in rows]
+
+    def max_id(self):
+        with self.flush_lock:
+            return self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM leads").fetchone()[0]
+
+    def append_leads(self, chunks):
+        next_id = self.connection.execute("SELECT COALESCE(MAX(id), 0) FROM leads").fetchone()[0] + 1
+        for chunk in chunks:
+            with self.connection:
+                self.connection.executemany(self.upsert_sql, (self.lead_to_row(next_id + offset, lead) for offset, lead in enumerate(chunk)))
+            next_id += len(chunk)
+
+    def update_leads(self, update):
+        updated = 0
+        last_id = 0
+        while True:
+            rows = self.fetch_page(last_id, self.PAGE_SIZE)
+            if not rows:
+                return updated
+            last_id = rows[-1][0]
+            changed = []
+            for row in rows:
+                lead = self.row_to_lead(row)
+                if update(lead):
+                    changed.append(self.lead_to_row(row[0], lead))
+            if changed:
+                with self.connection:
+                    self.connection.executemany(self.upsert_sql, changed)
+                updated += len(changed)
+
+    @profiled("sqlite store flush")
+    def write_pending(self, pending):
+        upserts = [self.lead_to_row(lead_id, lead) for lead_id, lead in pending.items() if lead is not None]
+        deletes = [(lead_id,) for lead_id, lead in pending.items() if lead is None]
+        self.write_rows(upserts, deletes)
+
+    def write_rows(self, upserts, deletes):
+        # One transaction, the caller holds flush_lock
+        with self.connection:
+            if upserts:
+                self.connection.executemany(self.upsert_sql, upserts)
+            if deletes:
+                self.connection.executemany("DELETE FROM leads WHERE id = ?", deletes)
+
+    @profiled("sqlite store save")
+    def save(self, leads):
+        super().save(leads)
+
+    def close(self):
+        self.flush()
+        with self.flush_lock:
+            self.connection.close()
+
+
+class ShardedLeadStore(QueuedLeadStore):
+    # Leads spread over several SQLite files in leads_shards/, by id (id % shard count) or by Job
+    # Type (one shard per job type and one for leads without), fixed in shards.json when the
+    # folder is created. The app still loads every lead into one LeadsList, merged back into id
+    # order; the full-dataset commands run on a process pool instead, one task per id range
+    # (reading that range from every shard, so the results come back in id order) or per shard
+    # where order doesn't matter, and the results are merged here.
+    # Each shard commits its part of a flush on its own, a crash in the middle of one can leave
+    # some shards a flush behind the others.
+    DEFAULT_SHARDS = 8
+    SCAN_RANGE = 50000
+    PARTITIONS = ["id", "job"]
+
+    def __init__(self, path=LEADS_SHARDS_DIR, shard_count=None, partition=None, workers=None):
+        super().__init__()
+        self.path = path
+        layout_path = os.path.join(path, "shards.json")
+        self.is_new = not os.path.exists(layout_path)
+        if self.is_new:
+            partition = partition or os.environ.get("LEADS_SHARD_BY") or "id"
+            if partition not in self.PARTITIONS:
+                raise ValueError(f"Leads can be sharded by {' or '.join(self.PARTITIONS)}, not {partition!r}")
+            if partition == "job":
+                shard_count = len(JOB_TYPES) + 1
+            shard_count = shard_count or int(os.environ.get("LEADS_SHARDS") or self.DEFAULT_SHARDS)
+            os.makedirs(path, exist_ok=True)
+            with open(layout_path, "w") as file:
+                json.dump({"partition": partition, "shards": shard_count}, file)
+        else:
+            with open(layout_path, "r") as file:
+                layout = json.load(file)
+            partition, shard_count = layout["partition"], layout["shards"]
+        self.partition = partition
+        self.shards = [SqliteLeadStore(os.path.join(path, f"shard_{index}.db")) for index in range(shard_count)]
+        self.workers = workers or int(os.environ.get("LEADS_WORKERS") or 0) or os.cpu_count() or 1
+        self.executor = None
+        self.loading_rows = None
+
+    def shard_index(self, lead_id, lead):
+        if self.partition == "job":
+            job_type = lead.get("Job Type")
+            return JOB_TYPES.index(job_type) if job_type in JOB_TYPES else len(JOB_TYPES)
+        return lead_id % len(self.shards)
+
+    def shard_paths(self, options=None):
+        # A --job-type filter only has to read its own shard when sharded by Job Type
+        job_type = getattr(options, "job_type", None)
+        if self.partition == "job" and job_type:
+            job_type = IMPORT_JOB_TYPES.get(job_type.lower(), job_type)
+            return [self.shards[self.shard_index(0, {"Job Type": job_type})].path]
+        return [shard.path for shard in self.shards]
+
+    def max_id(self):
+        return max(shard.max_id() for shard in self.shards)
+
+    def write_leads(self, leads, from_shard=None):
+        # [(id, lead)] upserted into their shards, and dropped from from_shard if they moved out of it
+        upserts = collections.defaultdict(list)
+        deletes = collections.defaultdict(list)
+        for lead_id, lead in leads:
+            index = self.shard_index(lead_id, lead)
+            upserts[index].append(SqliteLeadStore.lead_to_row(lead_id, lead))
+            if from_shard is not None and index != from_shard:
+                deletes[from_shard].append((lead_id,))
+        self.write_rows(upserts, deletes)
+
+    def write_rows(self, upserts, deletes):
+        for index, shard in enumerate(self.shards):
+            if index in upserts or index in deletes:
+                with shard.flush_lock:
+                    shard.write_rows(upserts.get(index, []), deletes.get(index, []))
+
+    def import_store(self, store):
+        # One-shot copy of a single file store. SQLite ids are kept, JSON leads are numbered
+        # in file order the way LeadsList numbers them when it loads the file.
+        if isinstance(store, SqliteLeadStore):
+            for rows in store.iter_pages(CLI_CHUNK_SIZE * 10):
+                self.write_leads((row[0], store.row_to_lead(row)) for row in rows)
+        else:
+            self.append_leads(store.iter_leads(CLI_CHUNK_SIZE * 10))
+
+    def load(self, leads):
+        # Every shard is read in id order and merged, stopping at the last id stored now so
+        # leads added while the rest are paged in aren't read back a second time
+        stop_id = self.max_id() + 1
+        shard_rows = [itertools.chain.from_iterable(shard.iter_pages()) for shard in self.shards]
+        self.loading_rows = itertools.takewhile(lambda row: row[0] < stop_id, heapq.merge(*shard_rows, key=operator.itemgetter(0)))
+        rows = list(itertools.islice(self.loading_rows, self.PAGE_SIZE))
+        leads.reset([SqliteLeadStore.row_to_lead(row) for row in rows], [row[0] for row in rows])
+        leads.next_id = stop_id
+
+    def load_more(self, leads, count=None):
+        rows = list(itertools.islice(self.loading_rows, count or self.PAGE_SIZE)) if self.loading_rows is not None else []
+        if not rows:
+            self.loading_rows = None
+            return False
+        self.loading = True
+        try:
+            leads.add_leads([SqliteLeadStore.row_to_lead(row) for row in rows], [row[0] for row in rows])
+        finally:
+            self.loading = False
+        return True
+
+    def iter_leads(self, chunk_size=None):
+        shard_rows = [itertools.chain.from_iterable(shard.iter_pages(chunk_size)) for shard in self.shards]
+        rows = heapq.merge(*shard_rows, key=operator.itemgetter(0))
+        while True:
+            chunk = [SqliteLeadStore.row_to_lead(row) for row in itertools.islice(rows, chunk_size or self.PAGE_SIZE)]
+            if not chunk:
+                return
+            yield chunk
+
+    def append_leads(self, chunks):
+        next_id = self.max_id() + 1
+        for chunk in chunks:
+            self.write_leads(zip(itertools.count(next_id), chunk))
+            next_id += len(chunk)
+
+    def update_leads(self, update):
+        # update() is usually a closure, which can't be sent to a pool process, so this one
+        # goes shard by shard here. A Job Type change moves the lead to its new shard.
+        updated = 0
+        for index, shard in enumerate(self.shards):
+            for rows in shard.iter_pages():
+                changed = []
+                for row in rows:
+                    lead = shard.row_to_lead(row)
+                    if update(lead):
+                        changed.append((row[0], lead))
+                if changed:
+                    self.write_leads(changed, index)
+                    updated += len(changed)
+        return updated
+
+    def pool(self):
+        if self.executor is None and self.workers > 1:
+            self.executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+        return self.executor
+
+    def id_ranges(self, options=None):
+        paths = self.shard_paths(options)
+        stop_id = self.max_id() + 1
+        return [(paths, first_id, min(first_id + self.SCAN_RANGE, stop_id)) for first_id in range(1, stop_id, self.SCAN_RANGE)]
+
+    def iter_matching(self, options):
+        tasks = [task + (options,) for task in self.id_ranges(options)]
+        for chunk in pool_results(self.pool(), scan_shard_range, tasks, self.workers * 2):
+            if chunk:
+                yield chunk
+
+    def export_matching(self, export_format, options, file_name):
+        tasks = self.id_ranges(options)
+        if export_format not in CONCATENATED_EXPORTS or not tasks:
+            # A PDF can't be written in pieces, it's laid out here from the merged leads
+            return super().export_matching(export_format, options, file_name)
+        # Each id range is exported to its own part next to the file, then the parts are
+        # joined in order, keeping the header of the first CSV part only
+        parts_folder = tempfile.mkdtemp(prefix=".export-", dir=os.path.dirname(os.path.abspath(file_name)))
+        try:
+            tasks = [task + (options, export_format, os.path.join(parts_folder, f"{index}.part")) for index, task in enumerate(tasks)]
+            count = 0
+            with open(file_name, "wb") as output:
+                for index, (part_count, part_file) in enumerate(pool_results(self.pool(), export_shard_range, tasks, self.workers * 2)):
+                    with open(part_file, "rb") as part:
+                        if index and export_format == "csv":
+                            part.readline()
+                        shutil.copyfileobj(part, output, EXPORT_BUFFER_SIZE)
+                    os.remove(part_file)
+                    count += part_count
+            return count
+        finally:
+            shutil.rmtree(parts_folder, ignore_errors=True)
+
+    def lead_counts(self, options):
+        counts = {field_name: collections.Counter() for field_name in AGGREGATE_FIELDS}
+        tasks = [(path, options) for path in self.shard_paths(options)]
+        for shard_counts in pool_results(self.pool(), count_shard, tasks, len(tasks)):
+            for field_name, counter in shard_counts.items():
+                counts[field_name].update(counter)
+        return counts
+
+    def import_keys(self):
+        keys = set()
+        for shard_keys in pool_results(self.pool(), shard_import_keys, [(path,) for path in self.shard_paths()], len(self.shards)):
+            keys |= shard_keys
+        return keys
+
+    def find_duplicates(self, limit=None):
+        # The normalized records are made in the pool a shard at a time and blocked here (a
+        # duplicate can sit in another shard), then the blocks are scored in the pool in batches
+        records = {}
+        blocks = collections.defaultdict(list)
+        for shard_records in pool_results(self.pool(), shard_duplicate_records, [(path,) for path in self.shard_paths()], len(self.shards)):
+            for lead_id, record in shard_records:
+                records[lead_id] = record
+                for key in duplicate_keys(record):
+                    blocks[key].append(lead_id)
+        blocks = [block for block in blocks.values() if 2 <= len(block) <= DuplicateIndex.MAX_BLOCK_SIZE]
+        batch_size = max(1000, len(blocks) // (self.workers * 4) + 1)
+        tasks = []
+        for start in range(0, len(blocks), batch_size):
+            batch = blocks[start:start + batch_size]
+            tasks.append((batch, {lead_id: records[lead_id] for block in batch for lead_id in block}, DuplicateIndex.THRESHOLD))
+        pairs = {}
+        for batch_pairs in pool_results(self.pool(), score_duplicate_blocks, tasks, self.workers * 2):
+            pairs.update(batch_pairs)
+        duplicates = sorted(((score, first_id, second_id) for (first_id, second_id), score in pairs.items()), reverse=True)
+        duplicates = duplicates[:limit] if limit else duplicates
+        return duplicates, {lead_id: records[lead_id] for pair in duplicates for lead_id in pair[1:]}
+
+    @profiled("sharded store flush")
+    def write_pending(self, pending):
+        # After a failed flush, shards that did commit just write the same rows again
+        upserts = collections.defaultdict(list)
+        deletes = collections.defaultdict(list)
+        for lead_id, lead in pending.items():
+            if lead is not None:
+                index = self.shard_index(lead_id, lead)
+                upserts[index].append(SqliteLeadStore.lead_to_row(lead_id, lead))
+            # With Job Type shards a deleted lead, or one whose Job Type changed, may be in
+            # any of the other shards
+            if self.partition == "job":
+                for other in range(len(self.shards)):
+                    if lead is None or other != index:
+                        deletes[other].append((lead_id,))
+            elif lead is None:
+                deletes[lead_id % len(self.shards)].append((lead_id,))
+        self.write_rows(upserts, deletes)
+
+    @profiled("sharded store save")
+    def save(self, leads):
+        super().save(leads)
+
+    def close(self):
+        self.flush()
+        if self.executor is not None:
+            self.executor.shutdown()
+            self.executor = None
+        for shard in self.shards:
+            shard.close()
+
+
+# Formats whose files can be written in parts and joined
+CONCATENATED_EXPORTS = ["csv", "txt"]
+
+# Pool processes keep one connection per shard file
+SHARD_CONNECTIONS = {}
+
+
+def shard_connection(path):
+    connection = SHARD_CONNECTIONS.get(path)
+    if connection is None:
+        connection = SHARD_CONNECTIONS[path] = sqlite3.connect(path)
+    return connection
+
+
+def pool_results(executor, function, tasks, window):
+    # function(*task) for each task in order, on executor with up to window tasks in flight
+    # (executor.map would queue them all at once), or right here when there's no executor
+    if executor is None:
+        for task in tasks:
+            yield function(*task)
+        return
+    futures = collections.deque()
+    for task in tasks:
+        futures.append(executor.submit(function, *task))
+        if len(futures) >= window:
+            yield futures.popleft().result()
+    while futures:
+        yield futures.popleft().result()
+
+
+def read_shard_rows(path, first_id=None, stop_id=None):
+    columns = ", ".join(["id"] + SQL_COLUMNS + ["extra"])
+    if first_id is None:
+        return shard_connection(path).execute(f"SELECT {columns} FROM leads")
+    return shard_connection(path).execute(f"SELECT {columns} FROM leads WHERE id >= ? AND id < ? ORDER BY id", (first_id, stop_id)).fetchall()
+
+
+def scan_shard_range(paths, first_id, stop_id, options):
+    # Pool task: the leads with first_id <= id < stop_id in any of the shards that match options, in id order
+    rows = [row for path in paths for row in read_shard_rows(path, first_id, stop_id)]
+    rows.sort(key=operator.itemgetter(0))
+    matches = lead_filter(options)
+    return [lead for lead in map(SqliteLeadStore.row_to_lead, rows) if matches(lead)]
+
+
+def export_shard_range(paths, first_id, stop_id, options, export_format, file_name):
+    # Pool task: one part of a sharded export
+    return export_leads(export_format, LeadStream([scan_shard_range(paths, first_id, stop_id, options)]), file_name), file_name
+
+
+def count_shard(path, options):
+    counts = {field_name: collections.Counter() for field_name in AGGREGATE_FIELDS}
+    matches = lead_filter(options)
+    count_leads(counts, (lead for lead in map(SqliteLeadStore.row_to_lead, read_shard_rows(path)) if matches(lead)))
+    return counts
+
+
+def shard_import_keys(path):
+    return {lead_import_key(SqliteLeadStore.row_to_lead(row)) for row in read_shard_rows(path)}
+
+
+def shard_duplicate_records(path):
+    return [(row[0], duplicate_record(SqliteLeadStore.row_to_lead(row))) for row in read_shard_rows(path)]
+
+
+SEARCH_FIELDS = ["Name", "Address", "Phone", "Email", "Notes", "Referred By"]
+SEARCH_FIELD_ALIASES = {
+    "name": "Name",
+    "address": "Address",
+    "phone": "Phone",
+    "email": "Email",
+    "notes": "Notes",
+    "referred": "Referred By",
+    "ref": "Referred By",
+}
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize_phone(text):
+    return re.sub(r"\D", "", text or "")
+
+
+def search_terms(field_name, text):
+    text = (text or "").lower()
+    if field_name == "Phone":
+        digits = normalize_phone(text)
+        if not digits:
+            return set()
+        # Also index the local number and the last four digits so those can be searched directly
+        return {digits, digits[-7:], digits[-4:]}
+    terms = set(WORD_RE.findall(text))
+    if field_name == "Email":
+        email = text.strip()
+        if email:
+            terms.add(email)
+            local_part, _, domain = email.partition("@")
+            terms.update(part for part in (local_part, domain) if part)
+    return terms
+
+
+def query_terms(field_name, value):
+    # A query value has to match every returned term as a prefix
+    value = value.lower().strip()
+    if field_name == "Phone":
+        digits = normalize_phone(value)
+        return [digits] if digits else []
+    if field_name == "Email" and value:
+        return [value]
+    return WORD_RE.findall(value)
+
+
+def parse_search_query(query):
+    # "smith phone:555" -> [(SEARCH_FIELDS, "smith"), (("Phone",), "555")]
+    parsed = []
+    for token in (query or "").split():
+        field_name, separator, value = token.partition(":")
+        if separator and field_name.lower() in SEARCH_FIELD_ALIASES:
+            if value:
+                parsed.append(((SEARCH_FIELD_ALIASES[field_name.lower()],), value))
+        else:
+            parsed.append((SEARCH_FIELDS, token))
+    return parsed
+
+
+def union_largest_first(sets):
+    # A new set, copying the biggest one and adding the rest is much cheaper than adding them all
+    if not sets:
+        return set()
+    largest = max(sets, key=len)
+    return largest.union(*[ids for ids in sets if ids is not largest])
+
+
+def lead_matches(lead, parsed_query):
+    # Checks one lead against a parse_search_query() result without an index
+    for field_names, value in parsed_query:
+        for field_name in field_names:
+            terms = query_terms(field_name, value)
+            if not terms:
+                continue
+            lead_terms = search_terms(field_name, lead.get(field_name, ""))
+            if all(any(lead_term.startswith(term) for lead_term in lead_terms) for term in terms):
+                break
+        else:
+            return False
+    return True
+
+
+class LeadSearchIndex(LeadsListener):
+    # Inverted index: for every searchable field a dict of term -> set of lead ids, plus the
+    # terms in sorted order so prefix lookups are a bisect. Rows [0, indexed_rows) are in the
+    # index; build() indexes the rest, either all at once or a chunk at a time from the event
+    # loop, and after that the LeadsList notifications keep it up to date.
+    # A prefix of one or two characters covers so many terms that unioning their postings would
+    # be most of a search, so every two character prefix keeps a set of its own (a one character
+    # prefix unions those few instead). Query words that short still match a large part of the
+    # leads across the fields, so their results are cached too (up to CACHE_LIMIT of them) and
+    # changed leads are re-checked against the cached words.
+    SHORT_PREFIX = 2
+    CACHE_LIMIT = 64
+
+    def __init__(self, leads):
+        self.leads = leads
+        self.indexed_rows = 0
+        self.postings = {field_name: collections.defaultdict(set) for field_name in SEARCH_FIELDS}
+        self.sorted_terms = {field_name: [] for field_name in SEARCH_FIELDS}
+        self.terms_sorted = True
+        self.removing_ids = []
+        self.prefix_postings = {field_name: collections.defaultdict(set) for field_name in SEARCH_FIELDS}
+        # (field names, lowercased word) -> set of lead ids
+        self.token_cache = {}
+        leads.add_listener(self)
+
+    def is_built(self):
+        return self.indexed_rows >= len(self.leads) and self.terms_sorted
+
+    def build(self, count=None):
+        # Returns True once every lead is indexed. Holds the leads' lock like the changes
+        # the index follows do, the API server searches from its own thread.
+        with self.leads.lock:
+            end = len(self.leads) if count is None else min(len(self.leads), self.indexed_rows + count)
+            if end > self.indexed_rows:
+                # One int object per lead, shared by every set it goes into
+                ids = self.leads.ids[self.indexed_rows:end].tolist()
+                for field_name in SEARCH_FIELDS:
+                    field_postings = self.postings[field_name]
+                    field_prefixes = self.prefix_postings[field_name]
+                    for lead_id, text in zip(ids, self.leads.column_slice(field_name, self.indexed_rows, end)):
+                        for term in search_terms(field_name, text):
+                            field_postings[term].add(lead_id)
+                            if len(term) >= self.SHORT_PREFIX:
+                                field_prefixes[term[:self.SHORT_PREFIX]].add(lead_id)
+                self.indexed_rows = end
+                self.terms_sorted = False
+                self.token_cache = {}
+            if end < len(self.leads):
+                return False
+            if not self.terms_sorted:
+                self.sorted_terms = {field_name: sorted(field_postings) for field_name, field_postings in self.postings.items()}
+                self.terms_sorted = True
+            return True
+
+    def add_terms(self, lead_id, field_name, text):
+        field_postings = self.postings[field_name]
+        field_prefixes = self.prefix_postings[field_name]
+        for term in search_terms(field_name, text):
+            if term not in field_postings and self.terms_sorted:
+                bisect.insort(self.sorted_terms[field_name], term)
+            field_postings[term].add(lead_id)
+            if len(term) >= self.SHORT_PREFIX:
+                field_prefixes[term[:self.SHORT_PREFIX]].add(lead_id)
+
+    def remove_terms(self, lead_id, field_name, text):
+        # text is all of the lead's text in field_name, so none of its terms are left afterwards
+        field_postings = self.postings[field_name]
+        field_prefixes = self.prefix_postings[field_name]
+        for term in search_terms(field_name, text):
+            ids = field_prefixes.get(term[:self.SHORT_PREFIX])
+            if ids is not None and len(term) >= self.SHORT_PREFIX:
+                ids.discard(lead_id)
+                if not ids:
+                    del field_prefixes[term[:self.SHORT_PREFIX]]
+            ids = field_postings.get(term)
+            if ids is None:
+                continue
+            ids.discard(lead_id)
+            if not ids:
+                del field_postings[term]
+                if self.terms_sorted:
+                    terms = self.sorted_terms[field_name]
+                    del terms[bisect.bisect_left(terms, term)]
+
+    def prefix_ids(self, field_name, prefix):
+        # The set may belong to the index, don't change it
+        field_prefixes = self.prefix_postings[field_name]
+        if len(prefix) == self.SHORT_PREFIX:
+            return field_prefixes.get(prefix, set())
+        field_postings = self.postings[field_name]
+        if len(prefix) < self.SHORT_PREFIX:
+            # The one character term itself and the two character prefixes starting with it
+            sets = [ids for short_prefix, ids in field_prefixes.items() if short_prefix.startswith(prefix)]
+            if prefix in field_postings:
+                sets.append(field_postings[prefix])
+            return union_largest_first(sets)
+        terms = self.sorted_terms[field_name]
+        low = bisect.bisect_left(terms, prefix)
+        high = bisect.bisect_left(terms, prefix + "\uffff", low)
+        return union_largest_first([field_postings[term] for term in terms[low:high]])
+
+    def token_ids(self, field_names, value):
+        matches = []
+        for field_name in field_names:
+            field_ids = None
+            for term in query_terms(field_name, value):
+                ids = self.prefix_ids(field_name, term)
+                field_ids = ids if field_ids is None else field_ids & ids
+                if not field_ids:
+                    break
+            if field_ids:
+                matches.append(field_ids)
+        return union_largest_first(matches)
+
+    @profiled("search index query")
+    def search(self, query):
+        # Returns the set of matching lead ids, or None when the query is empty. The set may be
+        # shared with the cache, don't change it.
+        if not self.is_built():
+            self.build()
+        result = None
+        for field_names, value in parse_search_query(query):
+            if len(value) <= self.SHORT_PREFIX:
+                key = (tuple(field_names), value.lower())
+                matches = self.token_cache.get(key)
+                if matches is None:
+                    if len(self.token_cache) >= self.CACHE_LIMIT:
+                        self.token_cache = {}
+                    matches = self.token_cache[key] = self.token_ids(field_names, value)
+            else:
+                matches = self.token_ids(field_names, value)
+            result = matches if result is None else result & matches
+            if not result:
+                break
+        return result
+
+    def recheck_cached(self, lead_id, lead):
+        for (field_names, value), ids in self.token_cache.items():
+            if lead_matches(lead, [(field_names, value)]):
+                ids.add(lead_id)
+            else:
+                ids.discard(lead_id)
+
+    def lead_matches(self, lead, query):
+        # Same rules as search() but checked against a single lead, used for rows that just changed
+        return lead_matches(lead, parse_search_query(query))
+
+    def leads_inserted(self, first, last):
+        # Rows past indexed_rows are left for build()
+        if first > self.indexed_rows:
+            return
+        for row in range(first, last + 1):
+            lead = self.leads[row]
+            for field_name in SEARCH_FIELDS:
+                self.add_terms(self.leads.ids[row], field_name, lead.get(field_name, ""))
+            if self.token_cache:
+                self.recheck_cached(self.leads.ids[row], lead)
+        self.indexed_rows += last - first + 1
+
+    def leads_about_to_be_removed(self, first, last):
+        self.removing_ids = self.leads.ids[first:last + 1]
+
+    def leads_removed(self, first, last, removed):
+        indexed = max(0, min(last + 1, self.indexed_rows) - first)
+        for lead_id, lead in zip(self.removing_ids[:indexed], removed):
+            for field_name in SEARCH_FIELDS:
+                self.remove_terms(lead_id, field_name, lead.get(field_name, ""))
+            for ids in self.token_cache.values():
+                ids.discard(lead_id)
+        self.indexed_rows -= indexed
+        self.removing_ids = []
+
+    def lead_updated(self, row, field_name, old_value, new_value):
+        if row < self.indexed_rows and field_name in SEARCH_FIELDS:
+            lead_id = self.leads.ids[row]
+            self.remove_terms(lead_id, field_name, old_value)
+            self.add_terms(lead_id, field_name, new_value)
+            if self.token_cache:
+                self.recheck_cached(lead_id, self.leads[row])
+
+    def leads_reset(self):
+        self.indexed_rows = 0
+        self.postings = {field_name: collections.defaultdict(set) for field_name in SEARCH_FIELDS}
+        self.sorted_terms = {field_name: [] for field_name in SEARCH_FIELDS}
+        self.terms_sorted = True
+        self.prefix_postings = {field_name: collections.defaultdict(set) for field_name in SEARCH_FIELDS}
+        self.token_cache = {}
+
+
+SOUNDEX_CODES = {character: code
+                 for characters, code in (("bfpv", "1"), ("cgjkqsxz", "2"), ("dt", "3"), ("l", "4"), ("mn", "5"), ("r", "6"))
+                 for character in characters}
+
+
+def soundex(word):
+    word = re.sub(r"[^a-z]", "", word.lower())
+    if not word:
+        return ""
+    result = word[0].upper()
+    last_code = SOUNDEX_CODES.get(word[0], "")
+    for letter in word[1:]:
+        code = SOUNDEX_CODES.get(letter, "")
+        if code and code != last_code:
+            result += code
+            if len(result) == 4:
+                break
+        if letter not in "hw":
+            last_code = code
+    return result.ljust(4, "0")
+
+
+def trigrams(text):
+    text = f"  {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def trigram_similarity(a, b):
+    if not a or not b:
+        return 0.0
+    a_trigrams = trigrams(a)
+    b_trigrams = trigrams(b)
+    return 2.0 * len(a_trigrams & b_trigrams) / (len(a_trigrams) + len(b_trigrams))
+
+
+def duplicate_record(lead):
+    # The normalized (name, phone, email) a lead is compared on
+    name = " ".join(WORD_RE.findall((lead.get("Name") or "").lower()))
+    return (name, normalize_phone(lead.get("Phone"))[-10:], (lead.get("Email") or "").strip().lower())
+
+
+def duplicate_keys(record):
+    name, phone, email = record
+    keys = []
+    if len(phone) >= 7:
+        keys.append("p:" + phone)
+    local_part = email.partition("@")[0].partition("+")[0].replace(".", "")
+    if local_part:
+        keys.append("e:" + local_part)
+    if name:
+        words = name.split()
+        keys.append("n:" + name)
+        keys.append("s:" + soundex(words[0]) + soundex(words[-1]))
+    return keys
+
+
+def duplicate_score(a, b):
+    name_similarity = trigram_similarity(a[0], b[0])
+    phone_match = a[1] and a[1] == b[1]
+    email_match = a[2] and a[2] == b[2]
+    if phone_match or email_match:
+        return 0.6 + 0.4 * name_similarity
+    return 0.8 * name_similarity
+
+
+def score_duplicate_blocks(blocks, records, threshold):
+    # {(first id, second id): score} for the pairs within each block scoring at least threshold,
+    # a pair sharing several blocks is scored once
+    pairs = {}
+    for block in blocks:
+        block = sorted(block)
+        for i, first_id in enumerate(block):
+            first = records[first_id]
+            for second_id in block[i + 1:]:
+                if (first_id, second_id) not in pairs:
+                    pairs[(first_id, second_id)] = duplicate_score(first, records[second_id])
+    return {pair: score for pair, score in pairs.items() if score >= threshold}
+
+
+class DuplicateIndex(LeadsListener):
+    # Blocking index for duplicate detection: leads are only compared with leads sharing a
+    # blocking key (phone, email local part, exact name or name soundex), never all pairs.
+    # Blocks bigger than MAX_BLOCK_SIZE (a very common name sound) are not compared on their own.
+    MAX_BLOCK_SIZE = 100
+    THRESHOLD = 0.75
+
+    def __init__(self, leads):
+        self.leads = leads
+        self.indexed_rows = 0
+        self.records = {}
+        self.blocks = collections.defaultdict(set)
+        self.removing_ids = []
+        leads.add_listener(self)
+
+    def is_built(self):
+        return self.indexed_rows >= len(self.leads)
+
+    def build(self, count=None):
+        end = len(self.leads) if count is None else min(len(self.leads), self.indexed_rows + count)
+        for row in range(self.indexed_rows, end):
+            self.add(self.leads.ids[row], self.leads[row])
+        self.indexed_rows = end
+        return self.is_built()
+
+    def add(self, lead_id, lead):
+        record = duplicate_record(lead)
+        self.records[lead_id] = record
+        for key in duplicate_keys(record):
+            self.blocks[key].add(lead_id)
+
+    def discard(self, lead_id):
+        record = self.records.pop(lead_id, None)
+        if record is None:
+            return
+        for key in duplicate_keys(record):
+            block = self.blocks.get(key)
+            if block is not None:
+                block.discard(lead_id)
+                if not block:
+                    del self.blocks[key]
+
+    def candidates(self, record, exclude_id=None):
+        ids = set()
+        for key in duplicate_keys(record):
+            block = self.blocks.get(key)
+            if block and len(block) <= self.MAX_BLOCK_SIZE:
+                ids |= block
+        ids.discard(exclude_id)
+        return ids
+
+    def check_lead(self, lead, exclude_id=None):
+        # [(score, lead id)] of existing leads that look like the same person, best first
+        if not self.is_built():
+            self.build()
+        record = duplicate_record(lead)
+        matches = []
+        for lead_id in self.candidates(record, exclude_id):
+            score = duplicate_score(record, self.records[lead_id])
+            if score >= self.THRESHOLD:
+                matches.append((score, lead_id))
+        matches.sort(reverse=True)
+        return matches
+
+    def find_duplicates(self, limit=None):
+        # [(score, id, id)] for every likely duplicate pair, best first
+        if not self.is_built():
+            self.build()
+        blocks = [block for block in self.blocks.values() if 2 <= len(block) <= self.MAX_BLOCK_SIZE]
+        pairs = score_duplicate_blocks(blocks, self.records, self.THRESHOLD)
+        duplicates = sorted(((score, first_id, second_id) for (first_id, second_id), score in pairs.items()), reverse=True)
+        return duplicates[:limit] if limit else duplicates
+
+    def leads_inserted(self, first, last):
+        if first > self.indexed_rows:
+            return
+        for row in range(first, last + 1):
+            self.add(self.leads.ids[row], self.leads[row])
+        self.indexed_rows += last - first + 1
+
+    def leads_about_to_be_removed(self, first, last):
+        self.removing_ids = self.leads.ids[first:last + 1]
+
+    def leads_removed(self, first, last, removed):
+        indexed = max(0, min(last + 1, self.indexed_rows) - first)
+        for lead_id in self.removing_ids[:indexed]:
+            self.discard(lead_id)
+        self.indexed_rows -= indexed
+        self.removing_ids = []
+
+    def lead_updated(self, row, field_name, old_value, new_value):
+        if row < self.indexed_rows and field_name in ("Name", "Phone", "Email"):
+            lead_id = self.leads.ids[row]
+            self.discard(lead_id)
+            self.add(lead_id, self.leads[row])
+
+    def leads_reset(self):
+        self.indexed_rows = 0
+        self.records = {}
+        self.blocks = collections.defaultdict(set)
+
+
+def merge_leads(leads, keep_row, merge_row):
+    # Fills the kept lead's empty fields from the other one, appends its notes and deletes it
+    keep = leads[keep_row]
+    other = leads[merge_row]
+    for field_name in LEAD_FIELDS:
+        value = other.get(field_name, "")
+        if not value or field_name == "Lead Status":
+            continue
+        current = keep.get(field_name, "")
+        if not current:
+            leads.update_lead(keep_row, field_name, value)
+        elif field_name == "Notes" and value != current:
+            leads.update_lead(keep_row, field_name, current + "\n" + value)
+    leads.remove_lead(merge_row)
+
+
+GROUP_FIELDS = ["Lead Status", "Job Type", "Referred By"]
+
+
+def order_position(order, keys, key, row, descending=False):
+    # Where row (with the given key) goes in order, which is sorted by key and then by row
+    low, high = 0, len(order)
+    while low < high:
+        middle = (low + high) // 2
+        other = order[middle]
+        other_key = keys[other]
+        if other_key == key:
+            before = other < row
+        else:
+            before = other_key > key if descending else other_key < key
+        if before:
+            low = middle + 1
+        else:
+            high = middle
+    return low
+
+
+class SortKeyCache(LeadsListener):
+    # Sort keys for the leads table, a list per field aligned with the rows: the Vocabulary code
+    # for Lead Status and Job Type, so they sort in pipeline order, and the casefolded text for
+    # the rest. A field's keys are built the first time it is sorted or grouped on and patched
+    # row by row from then on. The rows in key order (ties by row, so sorting on another key
+    # afterwards is stable) are cached per field and direction and kept in order through edits,
+    # so sorting on a field again is a copy instead of a sort. build() precomputes the fields
+    # used most in the background.
+    ORDER_INSERT_LIMIT = 100
+    PRECOMPUTED_FIELDS = GROUP_FIELDS + ["Name"]
+
+    def __init__(self, leads):
+        self.leads = leads
+        self.keys = {}
+        self.partial = {}
+        self.orders = {}
+        leads.add_listener(self)
+
+    @staticmethod
+    def key(field_name, value):
+        vocabulary = ENUM_FIELDS.get(field_name)
+        if vocabulary is not None:
+            if value is None and field_name == "Lead Status":
+                value = "In System"
+            return vocabulary.code(value)
+        return (value or "").casefold()
+
+    def build_keys(self, field_name, start=0, stop=None):
+        codes = self.leads.codes.get(field_name)
+        if codes is None:
+            values = self.leads.column_slice(field_name, start, stop)
+            if field_name in INTERNED_FIELDS:
+                # Few distinct values, so the rows share their keys too
+                keys = {value: (value or "").casefold() for value in set(values)}
+                return [keys[value] for value in values]
+            return [(value or "").casefold() for value in values]
+        if field_name == "Lead Status":
+            # A lead without a status shows (and sorts) as In System
+            in_system = LEAD_STATUS_VOCABULARY.code("In System")
+            return [code or in_system for code in codes[start:stop]]
+        return list(codes[start:stop])
+
+    def field_keys(self, field_name):
+        keys = self.keys.get(field_name)
+        if keys is None:
+            with self.leads.lock:
+                keys = self.partial.pop(field_name, [])
+                keys.extend(self.build_keys(field_name, len(keys)))
+                self.keys[field_name] = keys
+        return keys
+
+    def order(self, field_name, descending=False):
+        order = self.orders.get((field_name, descending))
+        if order is None:
+            keys = self.field_keys(field_name)
+            if descending:
+                # sorted() is stable with reverse too, so equal keys stay in row order, and
+                # starting from the ascending order it is little more than a reversal
+                order = sorted(self.order(field_name), key=keys.__getitem__, reverse=True)
+            else:
+                order = sorted(range(len(keys)), key=keys.__getitem__)
+            self.orders[(field_name, descending)] = order
+        return order
+
+    def build(self, count=None):
+        # Returns True once the precomputed fields have their keys and ascending order. Does
+        # count rows of keys, or one sort, per call so it can run on an idle timer.
+        with self.leads.lock:
+            for field_name in self.PRECOMPUTED_FIELDS:
+                if (field_name, False) in self.orders:
+                    continue
+                if field_name not in self.keys:
+                    keys = self.partial.setdefault(field_name, [])
+                    end = len(self.leads) if count is None else min(len(self.leads), len(keys) + count)
+                    keys.extend(self.build_keys(field_name, len(keys), end))
+                    if end < len(self.leads):
+                        return False
+                    self.keys[field_name] = self.partial.pop(field_name)
+                    if count is not None:
+                        return False
+                self.order(field_name)
+                if count is not None:
+                    return False
+            return True
+
+    def leads_inserted(self, first, last):
+        if first < len(self.leads) - (last - first + 1):
+            self.partial = {}
+        for field_name, keys in self.keys.items():
+            keys[first:first] = self.build_keys(field_name, first, last + 1)
+        if last != len(self.leads) - 1 or last - first + 1 > self.ORDER_INSERT_LIMIT:
+            self.orders = {}
+            return
+        for (field_name, descending), order in self.orders.items():
+            keys = self.keys[field_name]
+            for row in range(first, last + 1):
+                order.insert(order_position(order, keys, keys[row], row, descending), row)
+
+    def leads_removed(self, first, last, removed):
+        for keys in self.keys.values():
+            del keys[first:last + 1]
+        self.partial = {}
+        self.orders = {}
+
+    def lead_updated(self, row, field_name, old_value, new_value):
+        keys = self.keys.get(field_name)
+        if keys is None:
+            keys = self.partial.get(field_name)
+        if keys is None or row >= len(keys):
+            return
+        new_key = self.key(field_name, new_value)
+        if new_key == keys[row]:
+            return
+        # Move just this row within the cached orders, nothing is sorted again
+        orders = [(order, descending) for (order_field, descending), order in self.orders.items() if order_field == field_name]
+        for order, descending in orders:
+            del order[order_position(order, keys, keys[row], row, descending)]
+        keys[row] = new_key
+        for order, descending in orders:
+            order.insert(order_position(order, keys, new_key, row, descending), row)
+
+    def leads_reset(self):
+        self.keys = {}
+        self.partial = {}
+        self.orders = {}
+
+
+AGGREGATE_FIELDS = ["Lead Status", "Job Type", "Referred By"]
+
+
+class LeadAggregates(LeadsListener):
+    # Live lead counts by Lead Status and Job Type and referral counts by Referred By, kept up
+    # to date from the change notifications instead of scanning the leads: an edit moves one
+    # lead from one counter to another, adding or deleting leads touches only their counters.
+    # Watchers get count_changed(field_name, value, count) for each counter that moves and
+    # counts_reset() when the whole collection is replaced.
+    def __init__(self, leads):
+        self.leads = leads
+        self.watchers = []
+        self.recount()
+        leads.add_listener(self)
+
+    def add_watcher(self, watcher):
+        self.watchers.append(watcher)
+
+    def remove_watcher(self, watcher):
+        if watcher in self.watchers:
+            self.watchers.remove(watcher)
+
+    @staticmethod
+    def bucket(field_name, value):
+        # A lead without a status is In System, leads without a referrer aren't referrals
+        if field_name == "Lead Status":
+            return value or "In System"
+        if field_name == "Job Type":
+            return value or ""
+        return value or None
+
+    def recount(self):
+        with self.leads.lock:
+            self.counts = {field_name: collections.Counter() for field_name in AGGREGATE_FIELDS}
+            for field_name in AGGREGATE_FIELDS:
+                counts = self.counts[field_name]
+                for value, count in collections.Counter(self.leads.column_slice(field_name)).items():
+                    bucket = self.bucket(field_name, value)
+                    if bucket is not None:
+                        counts[bucket] += count
+
+    def add(self, field_name, value, delta):
+        bucket = self.bucket(field_name, value)
+        if bucket is None or not delta:
+            return
+        counts = self.counts[field_name]
+        count = counts[bucket] + delta
+        if count:
+            counts[bucket] = count
+        else:
+            del counts[bucket]
+        for watcher in self.watchers:
+            watcher.count_changed(field_name, bucket, count)
+
+    def add_values(self, values, sign):
+        for field_name in AGGREGATE_FIELDS:
+            for value, count in collections.Counter(values(field_name)).items():
+                self.add(field_name, value, sign * count)
+
+    def leads_inserted(self, first, last):
+        self.add_values(lambda field_name: self.leads.column_slice(field_name, first, last + 1), 1)
+
+    def leads_removed(self, first, last, removed):
+        self.add_values(lambda field_name: [lead.get(field_name) for lead in removed], -1)
+
+    def lead_updated(self, row, field_name, old_value, new_value):
+        if field_name in self.counts:
+            self.add(field_name, old_value, -1)
+            self.add(field_name, new_value, 1)
+
+    def leads_reset(self):
+        self.recount()
+        for watcher in self.watchers:
+            watcher.counts_reset()
+
+
+def count_leads(counts, leads):
+    # Adds lead dicts to {field: Counter} counted the way LeadAggregates buckets them
+    for lead in leads:
+        for field_name in AGGREGATE_FIELDS:
+            bucket = LeadAggregates.bucket(field_name, lead.get(field_name))
+            if bucket is not None:
+                counts[field_name][bucket] += 1
+
+
+FOLLOW_UP_FIELD = "Follow Up"
+# Minutes are enough, and the strings then sort in time order
+FOLLOW_UP_FORMAT = "%Y-%m-%d %H:%M"
+# A follow-up given as just a date is due at this time of day
+FOLLOW_UP_DEFAULT_TIME = "09:00"
+
+
+def parse_follow_up(value):
+    # Normalizes a follow-up to FOLLOW_UP_FORMAT, "" clears it. Raises ValueError for anything else.
+    value = "" if value is None else str(value).strip()
+    if not value:
+        return ""
+    if len(value) == 10:
+        value += " " + FOLLOW_UP_DEFAULT_TIME
+    try:
+        return datetime.datetime.fromisoformat(value).strftime(FOLLOW_UP_FORMAT)
+    except ValueError:
+        raise ValueError(f"Follow Up must be a date like 2024-05-31 or 2024-05-31 14:30, not {value!r}") from None
+
+
+def follow_up_time(moment):
+    return moment.strftime(FOLLOW_UP_FORMAT)
+
+
+def follow_up_windows(now):
+    # (start, end) of each Calendar view, as bounds for FollowUpIndex.between
+    today = now.date()
+    week_start = today - datetime.timedelta(days=today.weekday())
+    return {
+        "Overdue": ("", follow_up_time(now)),
+        "Due Today": (today.isoformat(), (today + datetime.timedelta(days=1)).isoformat()),
+        "This Week": (week_start.isoformat(), (week_start + datetime.timedelta(days=7)).isoformat()),
+    }
+
+
+class FollowUpIndex(LeadsListener):
+    # Every lead's follow-up as (due, lead id) in one sorted list, due being the FOLLOW_UP_FORMAT
+    # string. A window (overdue, today, this week, a calendar day) is two bisects plus the k
+    # entries in it, the next reminder after a moment is one bisect, and a change moves a single
+    # entry. Watchers get follow_ups_changed() once per change that touched a follow-up.
+    def __init__(self, leads):
+        self.leads = leads
+        self.watchers = []
+        self.removing_ids = []
+        self.rebuild()
+        leads.add_listener(self)
+
+    def add_watcher(self, watcher):
+        self.watchers.append(watcher)
+
+    def remove_watcher(self, watcher):
+        if watcher in self.watchers:
+            self.watchers.remove(watcher)
+
+    def notify(self):
+        for watcher in self.watchers:
+            watcher.follow_ups_changed()
+
+    def rebuild(self):
+        with self.leads.lock:
+            self.due = {}
+            for lead_id, extra in zip(self.leads.ids, self.leads.extra):
+                if extra and extra.get(FOLLOW_UP_FIELD):
+                    self.set_due(lead_id, extra[FOLLOW_UP_FIELD], False)
+            self.entries = sorted((due, lead_id) for lead_id, due in self.due.items())
+
+    def set_due(self, lead_id, value, index=True):
+        # Returns True if the lead's entry changed. Values that aren't a date are left out.
+        try:
+            due = parse_follow_up(value)
+        except ValueError:
+            due = ""
+        old = self.due.pop(lead_id, None)
+        if due:
+            self.due[lead_id] = due
+        if old == (due or None):
+            return False
+        if index and old is not None:
+            del self.entries[bisect.bisect_left(self.entries, (old, lead_id))]
+        if index and due:
+            bisect.insort(self.entries, (due, lead_id))
+        return True
+
+    def between(self, start, end):
+        # [(due, lead id)] due from start up to, but not including, end. Dates work as bounds too.
+        low = bisect.bisect_left(self.entries, (start,))
+        high = bisect.bisect_left(self.entries, (end,), low)
+        return self.entries[low:high]
+
+    def count_between(self, start, end):
+        low = bisect.bisect_left(self.entries, (start,))
+        return bisect.bisect_left(self.entries, (end,), low) - low
+
+    def due_after(self, after, until):
+        # Follow-ups due after one moment, up to and including another
+        low = bisect.bisect_right(self.entries, (after, sys.maxsize))
+        high = bisect.bisect_right(self.entries, (until, sys.maxsize), low)
+        return self.entries[low:high]
+
+    def next_after(self, moment):
+        position = bisect.bisect_right(self.entries, (moment, sys.maxsize))
+        return self.entries[position] if position < len(self.entries) else None
+
+    def leads_inserted(self, first, last):
+        changed = False
+        for lead_id, extra in zip(self.leads.ids[first:last + 1], self.leads.extra[first:last + 1]):
+            if extra and extra.get(FOLLOW_UP_FIELD):
+                changed = self.set_due(lead_id, extra[FOLLOW_UP_FIELD]) or changed
+        if changed:
+            self.notify()
+
+    def leads_about_to_be_removed(self, first, last):
+        self.removing_ids = [lead_id for lead_id in self.leads.ids[first:last + 1] if lead_id in self.due]
+
+    def leads_removed(self, first, last, removed):
+        removing_ids, self.removing_ids = self.removing_ids, []
+        for lead_id in removing_ids:
+            self.set_due(lead_id, None)
+        if removing_ids:
+            self.notify()
+
+    def lead_updated(self, row, field_name, old_value, new_value):
+        if field_name == FOLLOW_UP_FIELD and self.set_due(self.leads.ids[row], new_value):
+            self.notify()
+
+    def leads_reset(self):
+        self.rebuild()
+        self.notify()
+
+
+def open_lead_store(backend=None):
+    # LEADS_STORAGE=sqlite switches to the database, which is also used whenever it already exists.
+    # LEADS_STORAGE=sharded does the same for leads_shards/, copying whichever store was in use.
+    backend = backend or os.environ.get("LEADS_STORAGE")
+    if not backend:
+        backend = "sharded" if os.path.isdir(LEADS_SHARDS_DIR) else "sqlite" if os.path.exists(LEADS_DB_FILE) else "json"
+    if backend == "sharded":
+        store = ShardedLeadStore()
+        if store.is_new and (os.path.exists(LEADS_DB_FILE) or os.path.exists(LEADS_DATA_FILE)):
+            source = SqliteLeadStore() if os.path.exists(LEADS_DB_FILE) else JsonLeadStore()
+            try:
+                store.import_store(source)
+            finally:
+                source.close()
+        return store
+    if backend == "sqlite":
+        store = SqliteLeadStore()
+        if store.is_new and os.path.exists(LEADS_DATA_FILE):
+            store.import_json_file(LEADS_DATA_FILE)
+        return store
+    return JsonLeadStore()
+
+
+class AutosaveScheduler(LeadsListener):
+    # Background autosave. Every change wakes a worker thread that writes it to the store right
+    # away (for the JSON store, an fsynced journal record), so the UI never waits on the disk and a
+    # crash loses nothing. Edits made while a write is running queue up and go in the next one.
+    # Only compaction is debounced: once the store wants it, every change restarts a short quiet
+    # period and it runs when that runs out, or MAX_DELAY after the first change for edits that
+    # never pause. A failed write is tried again RETRY_DELAY later.
+    DELAY = 0.5
+    MAX_DELAY = 3.0
+    RETRY_DELAY = 2.0
+
+    def __init__(self, store):
+        self.store = store
+        self.condition = threading.Condition()
+        self.unwritten = False
+        self.retry_at = None
+        self.first_change = None
+        self.last_change = None
+        self.stopped = False
+        self.saving = False
+        self.saves = 0
+        self.last_save_time = None
+        self.last_latency = None
+        self.last_error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def changed(self):
+        now = time.monotonic()
+        with self.condition:
+            self.unwritten = True
+            if self.first_change is None:
+                self.first_change = now
+            self.last_change = now
+            self.condition.notify()
+
+    def queue_depth(self):
+        return self.store.pending_count()
+
+    def next_step(self):
+        # The caller holds the condition. Returns "write", "compact", or how long to wait (None for
+        # until the next change).
+        now = time.monotonic()
+        if self.unwritten and self.retry_at is None:
+            return "write"
+        timeout = None if self.retry_at is None else self.retry_at - now
+        if self.retry_at is not None and timeout <= 0:
+            return "write"
+        if self.first_change is not None and not self.store.compaction_due():
+            self.first_change = self.last_change = None
+        if self.first_change is not None:
+            due = min(self.last_change + self.DELAY, self.first_change + self.MAX_DELAY) - now
+            if due <= 0 and self.retry_at is None:
+                return "compact"
+            timeout = due if timeout is None else min(timeout, due)
+        return timeout
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.stopped:
+                    step = self.next_step()
+                    if isinstance(step, str):
+                        break
+                    self.condition.wait(None if step is None else max(step, 0.01))
+                if self.stopped:
+                    return
+                self.unwritten = False
+                self.retry_at = None
+                if step == "compact":
+                    self.first_change = self.last_change = None
+                self.saving = True
+            started = time.perf_counter()
+            try:
+                if step == "compact":
+                    self.store.compact()
+                else:
+                    self.store.flush()
+                self.last_error = None
+            except Exception as error:
+                # The store puts the changes back in its queue, try them again after a pause
+                self.last_error = str(error)
+                with self.condition:
+                    self.retry_at = time.monotonic() + self.RETRY_DELAY
+                    if step == "compact" and self.first_change is None:
+                        self.first_change = self.last_change = self.retry_at
+            self.last_latency = time.perf_counter() - started
+            self.last_save_time = time.time()
+            self.saves += 1
+            self.saving = False
+
+    def stop(self):
+        # The caller saves whatever is still queued, e.g. with store.save() on close
+        with self.condition:
+            self.stopped = True
+            self.condition.notify()
+        self.thread.join()
+
+    def leads_inserted(self, first, last):
+        self.changed()
+
+    def leads_removed(self, first, last, removed):
+        self.changed()
+
+    def lead_updated(self, row, field_name, old_value, new_value):
+        self.changed()
+
+
+EXPORT_FIELDS = ["Name", "Address", "Phone", "Email", "Notes", "Job Type"]
+EXPORT_BUFFER_SIZE = 1024 * 1024
+PROGRESS_EVERY = 1000
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def snapshot_leads(leads, rows=None):
+    # Point-in-time copy for an export running on another thread, edits made after this don't leak in
+    return leads.snapshot(rows)
+
+
+def report_export_progress(done, progress, is_cancelled):
+    if is_cancelled is not None and is_cancelled():
+        raise ExportCancelled()
+    if progress is not None:
+        progress(done)
+
+
+def write_leads_csv(leads, file_name, progress=None, is_cancelled=None):
+    with open(file_name, "w", newline="", buffering=EXPORT_BUFFER_SIZE) as csvfile:
+        writer = csv.writer(csvfile)
+        # Write the header
+        writer.writerow(EXPORT_FIELDS)
+        # Write the data a chunk at a time, missing fields (None) come out empty
+        done = 0
+        for rows in leads.iter_rows(EXPORT_FIELDS, PROGRESS_EVERY):
+            writer.writerows(rows)
+            done += len(rows)
+            report_export_progress(done, progress, is_cancelled)
+    return done
+
+
+TXT_LEAD_TEMPLATE = "".join(f"{field_name}: {{}}\n" for field_name in EXPORT_FIELDS) + "\n"
+
+
+def write_leads_txt(leads, file_name, progress=None, is_cancelled=None):
+    with open(file_name, "w", buffering=EXPORT_BUFFER_SIZE) as file:
+        done = 0
+        for rows in leads.iter_rows(EXPORT_FIELDS, PROGRESS_EVERY):
+            file.write("".join(TXT_LEAD_TEMPLATE.format(*("" if value is None else value for value in row)) for row in rows))
+            done += len(rows)
+            report_export_progress(done, progress, is_cancelled)
+    return done
+
+
+PDF_COLUMN_WIDTHS = [100, 140, 80, 130, 200, 70]
+PDF_MARGIN = 36
+PDF_FONT_SIZE = 8
+PDF_LEADING = 10
+PDF_PADDING = 3
+PDF_HEADER_BOTTOM_PADDING = 8
+# Leads read (and progress reported) at a time
+PDF_CHUNK_SIZE = 500
+
+
+def wrap_pdf_text(text, font_name, width):
+    # [(line, its width)] for text in a column width points wide, broken at spaces, and inside a
+    # word only when the word alone is too wide
+    from reportlab.pdfbase.pdfmetrics import stringWidth
+
+    text = str(text or "")
+    if "\n" not in text:
+        text_width = stringWidth(text, font_name, PDF_FONT_SIZE)
+        if text_width <= width:
+            return [(text, text_width)]
+    lines = []
+    for paragraph in text.split("\n"):
+        line, line_width = "", 0
+        for word in paragraph.split(" "):
+            candidate = f"{line} {word}" if line else word
+            candidate_width = stringWidth(candidate, font_name, PDF_FONT_SIZE)
+            if candidate_width <= width:
+                line, line_width = candidate, candidate_width
+                continue
+            if line:
+                lines.append((line, line_width))
+            line, line_width = "", 0
+            for character in word:
+                character_width = stringWidth(character, font_name, PDF_FONT_SIZE)
+                if line and line_width + character_width > width:
+                    lines.append((line, line_width))
+                    line, line_width = "", 0
+                line += character
+                line_width += character_width
+        lines.append((line, line_width))
+    return lines
+
+
+def write_leads_pdf(leads, file_name, progress=None, is_cancelled=None):
+    # Drawn straight onto the canvas: a header row on every page, then the leads one row each,
+    # as tall as their longest wrapped cell. A row that doesn't fit on the rest of the page goes
+    # on the next one, and only a row taller than a whole page is split across pages. Laying the
+    # same pages out as platypus Tables took most of the export's time; here a page is laid out
+    # first and then drawn as one background, one text object and one set of grid lines.
+    from reportlab.lib.pagesizes import letter, landscape
+    from reportlab.pdfgen.canvas import Canvas
+
+    page_width, page_height = landscape(letter)
+    canvas = Canvas(file_name, pagesize=(page_width, page_height), pageCompression=1)
+    table_width = sum(PDF_COLUMN_WIDTHS)
+    left = (page_width - table_width) / 2
+    right = left + table_width
+    lefts = list(itertools.accumulate([left] + PDF_COLUMN_WIDTHS[:-1]))
+    centers = [column_left + width / 2 for column_left, width in zip(lefts, PDF_COLUMN_WIDTHS)]
+    text_widths = [width - 2 * PDF_PADDING for width in PDF_COLUMN_WIDTHS]
+    top = page_height - PDF_MARGIN
+    header_bottom = top - (PDF_PADDING + PDF_FONT_SIZE + PDF_HEADER_BOTTOM_PADDING)
+    header = [wrap_pdf_text(field_name, "Helvetica-Bold", width) for field_name, width in zip(EXPORT_FIELDS, text_widths)]
+    page_lines = int((header_bottom - PDF_MARGIN - 2 * PDF_PADDING) // PDF_LEADING)
+    # (top of the row, its cells' lines) for the page being laid out
+    page_rows = []
+    y = header_bottom
+
+    def draw_text(rows, font_name, color):
+        text = canvas.beginText()
+        text.setFont(font_name, PDF_FONT_SIZE)
+        text.setFillColor(color)
+        for row_top, lines in rows:
+            for center, column_lines in zip(centers, lines):
+                baseline = row_top - PDF_PADDING - PDF_FONT_SIZE
+                for line, line_width in column_lines:
+                    if line:
+                        text.setTextOrigin(center - line_width / 2, baseline)
+                        text.textOut(line)
+                    baseline -= PDF_LEADING
+        canvas.drawText(text)
+
+    def draw_page():
+        canvas.setLineWidth(1)
+        canvas.setStrokeColor("black")
+        canvas.setFillColor("grey")
+        canvas.rect(left, header_bottom, table_width, top - header_bottom, stroke=0, fill=1)
+        canvas.setFillColor("beige")
+        canvas.rect(left, y, table_width, header_bottom - y, stroke=0, fill=1)
+        draw_text([(top, header)], "Helvetica-Bold", "whitesmoke")
+        draw_text(page_rows, "Helvetica", "black")
+        grid = [(left, row_top, right, row_top) for row_top in [top] + [row_top for row_top, _ in page_rows]]
+        grid.append((left, y, right, y))
+        grid.extend((column_left, top, column_left, y) for column_left in lefts + [right])
+        canvas.lines(grid)
+        canvas.showPage()
+
+    done = 0
+    for rows in leads.iter_rows(EXPORT_FIELDS, PDF_CHUNK_SIZE):
+        for row in rows:
+            lines = [wrap_pdf_text(value, "Helvetica", width) for value, width in zip(row, text_widths)]
+            remaining = max(len(column_lines) for column_lines in lines)
+            while remaining:
+                fitting = int((y - PDF_MARGIN - 2 * PDF_PADDING) // PDF_LEADING)
+                if fitting < min(remaining, page_lines):
+                    draw_page()
+                    page_rows = []
+                    y = header_bottom
+                    continue
+                count = min(remaining, fitting)
+                page_rows.append((y, [column_lines[:count] for column_lines in lines]))
+                lines = [column_lines[count:] for column_lines in lines]
+                remaining -= count
+                y -= count * PDF_LEADING + 2 * PDF_PADDING
+        done += len(rows)
+        report_export_progress(done, progress, is_cancelled)
+    draw_page()
+    canvas.save()
+    return done
+
+
+EXPORTERS = {
+    "csv": write_leads_csv,
+    "txt": write_leads_txt,
+    "pdf": write_leads_pdf,
+}
+
+
+@profiled("export")
+def export_leads(export_format, leads, file_name, progress=None, is_cancelled=None):
+    # Returns the number of leads written, or None if the export was cancelled (the partial file is removed)
+    try:
+        return EXPORTERS[export_format](leads, file_name, progress, is_cancelled)
+    except ExportCancelled:
+        if os.path.exists(file_name):
+            os.remove(file_name)
+        return None
+
+
+class LeadStream:
+    # Stands in for a LeadsList when exporting headless: the exporters only call iter_rows(),
+    # and here the rows come from chunks of lead dicts read from storage as the export goes
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def iter_dicts(self, chunk_size=1000):
+        chunk = []
+        for leads in self.chunks:
+            for lead in leads:
+                chunk.append(lead)
+                if len(chunk) >= chunk_size:
+                    yield chunk
+                    chunk = []
+        if chunk:
+            yield chunk
+
+    def iter_rows(self, fields, chunk_size=1000):
+        for chunk in self.iter_dicts(chunk_size):
+            yield [tuple(lead.get(field_name) for field_name in fields) for lead in chunk]
+
+
+IMPORT_BATCH_SIZE = 2000
+IMPORT_READ_SIZE = 64 * 1024
+
+# Normalized column names (lowercase, letters and digits only) from other systems -> lead fields
+IMPORT_COLUMN_ALIASES = {
+    "name": "Name", "fullname": "Name", "contact": "Name", "contactname": "Name", "customer": "Name", "customername": "Name",
+    "address": "Address", "streetaddress": "Address", "street": "Address", "location": "Address",
+    "phone": "Phone", "phonenumber": "Phone", "telephone": "Phone", "tel": "Phone", "mobile": "Phone", "cell": "Phone",
+    "email": "Email", "emailaddress": "Email", "mail": "Email",
+    "notes": "Notes", "note": "Notes", "comments": "Notes", "comment": "Notes", "description": "Notes",
+    "referredby": "Referred By", "referral": "Referred By", "referrer": "Referred By", "source": "Referred By",
+    "referredto": "Referred To",
+    "jobtype": "Job Type", "type": "Job Type",
+    "leadstatus": "Lead Status", "status": "Lead Status",
+    "followup": "Follow Up", "followupdate": "Follow Up", "nextcontact": "Follow Up", "callback": "Follow Up",
+}
+
+
+IMPORT_JOB_TYPES = {job_type.lower(): job_type for job_type in JOB_TYPES + ["Unknown"]}
+IMPORT_LEAD_STATUSES = {status.lower(): status for status in LEAD_STATUSES}
+
+
+def import_column_mapping(columns):
+    mapping = {}
+    for column in columns:
+        field_name = IMPORT_COLUMN_ALIASES.get(re.sub(r"[^a-z0-9]", "", str(column).lower()))
+        # First matching column wins
+        if field_name and field_name not in mapping.values():
+            mapping[column] = field_name
+    return mapping
+
+
+def iter_json_records(file):
+    # Streams the objects of a JSON array (or a JSON Lines file) without loading the whole file
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n,[]":
+            position += 1
+        if position == len(buffer):
+            if eof:
+                return
+            buffer = file.read(IMPORT_READ_SIZE)
+            position = 0
+            eof = not buffer
+            continue
+        try:
+            record, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            # The record runs past the end of the buffer, keep the tail and read on
+            chunk = file.read(IMPORT_READ_SIZE)
+            buffer = buffer[position:] + chunk
+            position = 0
+            eof = not chunk
+            continue
+        position = end
+        yield record
+
+
+def iter_import_records(file):
+    if file.name.lower().endswith(".csv"):
+        yield from csv.DictReader(file)
+    else:
+        yield from iter_json_records(file)
+
+
+def lead_import_key(lead):
+    return import_key(lead.get("Name"), lead.get("Phone"), lead.get("Email"))
+
+
+def import_key(name, phone, email):
+    return ((name or "").strip().lower(), normalize_phone(phone), (email or "").strip().lower())
+
+
+def validate_import_record(record, mapping):
+    # Returns a lead in the same shape add_lead creates, or None if there is nothing to import
+    if not isinstance(record, dict):
+        return None
+    lead = {"Name": "", "Address": "", "Phone": "", "Email": "", "Notes": "", "Referred By": "", "Job Type": "Residential", "Lead Status": "In System"}
+    for column, field_name in mapping.items():
+        value = record.get(column)
+        if value is not None:
+            lead[field_name] = str(value).strip()
+    if not (lead["Name"] or lead["Phone"] or lead["Email"]):
+        return None
+    # Unknown job types and statuses fall back to the defaults instead of adding new choices
+    lead["Job Type"] = IMPORT_JOB_TYPES.get(lead["Job Type"].lower(), "Residential")
+    lead["Lead Status"] = IMPORT_LEAD_STATUSES.get(lead["Lead Status"].lower(), "In System")
+    if FOLLOW_UP_FIELD in lead:
+        try:
+            lead[FOLLOW_UP_FIELD] = parse_follow_up(lead[FOLLOW_UP_FIELD])
+        except ValueError:
+            lead[FOLLOW_UP_FIELD] = ""
+        if not lead[FOLLOW_UP_FIELD]:
+            del lead[FOLLOW_UP_FIELD]
+    return lead
+
+
+@profiled("import")
+def import_leads(file_name, add_batch, existing_keys=None, progress=None, is_cancelled=None):
+    # Hands the batches of iter_import_batches() to add_batch. Returns (imported, duplicates, rejected).
+    counts = collections.Counter()
+    for batch in iter_import_batches(file_name, existing_keys, counts, progress):
+        add_batch(batch)
+        if is_cancelled is not None and is_cancelled():
+            break
+    return counts["imported"], counts["duplicates"], counts["rejected"]
+
+
+def iter_import_batches(file_name, existing_keys=None, counts=None, progress=None):
+    # Streams file_name, validates and dedupes the records and yields them in batches of
+    # IMPORT_BATCH_SIZE. progress gets the fraction of the file read so far, counts (a Counter)
+    # keeps track of imported, duplicates and rejected as it goes.
+    seen = set(existing_keys or ())
+    counts = collections.Counter() if counts is None else counts
+    size = max(os.path.getsize(file_name), 1)
+    with open(file_name, "r", newline="", encoding="utf-8-sig") as file:
+        batch = []
+        # CSV rows all share the header, JSON objects usually share their keys too
+        mappings = {}
+        for record in iter_import_records(file):
+            columns = tuple(record) if isinstance(record, dict) else ()
+            mapping = mappings.get(columns)
+            if mapping is None:
+                mapping = mappings[columns] = import_column_mapping(columns)
+            lead = validate_import_record(record, mapping)
+            if lead is None:
+                counts["rejected"] += 1
+                continue
+            key = lead_import_key(lead)
+            if key in seen:
+                counts["duplicates"] += 1
+                continue
+            seen.add(key)
+            batch.append(lead)
+            if len(batch) >= IMPORT_BATCH_SIZE:
+                counts["imported"] += len(batch)
+                if progress is not None:
+                    progress(file.buffer.tell() / size)
+                yield batch
+                batch = []
+        if batch:
+            counts["imported"] += len(batch)
+            yield batch
+
+
+def normalize_lead_field(name, value):
+    # Maps a field name (or one of the import/search aliases) to its lead field and checks the
+    # value, raising ValueError for unknown fields and statuses or job types that don't exist
+    name = str(name).strip()
+    field_name = name if name in LEAD_SLOTS or name == FOLLOW_UP_FIELD else SEARCH_FIELD_ALIASES.get(name.lower()) or IMPORT_COLUMN_ALIASES.get(re.sub(r"[^a-z0-9]", "", name.lower()))
+    if field_name is None:
+        raise ValueError(f"Unknown field {name!r}, expected one of {', '.join(LEAD_FIELDS + [FOLLOW_UP_FIELD])}")
+    value = "" if value is None else str(value).strip()
+    if field_name == "Lead Status":
+        if value.lower() not in IMPORT_LEAD_STATUSES:
+            raise ValueError(f"Lead Status must be one of {', '.join(LEAD_STATUSES)}")
+        value = IMPORT_LEAD_STATUSES[value.lower()]
+    elif field_name == "Job Type":
+        if value.lower() not in IMPORT_JOB_TYPES:
+            raise ValueError(f"Job Type must be one of {', '.join(IMPORT_JOB_TYPES.values())}")
+        value = IMPORT_JOB_TYPES[value.lower()]
+    elif field_name == FOLLOW_UP_FIELD:
+        value = parse_follow_up(value)
+    return field_name, value
+
+
+API_HOST = "127.0.0.1"
+API_PORT = 8765
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 1000
+API_MAX_BODY_SIZE = 1024 * 1024
+API_WRITE_BATCH_SIZE = 500
+# What a POST without the token may send: one lead, form encoded, with the fields of FORM_EMBED_TEMPLATE
+API_FORM_FIELDS = ["Name", "Phone", "Email", "Address", "Job Type", "Notes"]
+# Host headers accepted besides the public URL's, anything else is a DNS rebinding attempt
+API_LOOPBACK_HOSTS = {"127.0.0.1", "localhost", "::1"}
+HTTP_REASONS = {200: "OK", 201: "Created", 204: "No Content", 400: "Bad Request", 401: "Unauthorized", 403: "Forbidden",
+                404: "Not Found", 405: "Method Not Allowed", 413: "Payload Too Large", 500: "Internal Server Error",
+                503: "Service Unavailable"}
+FORM_RESPONSE_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title></head>
+<body><p>{message}</p></body></html>"""
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def url_host(url):
+    # "https://Leads.Example.com:8443/x" -> "leads.example.com", None for anything without a host
+    try:
+        return urllib.parse.urlsplit(url.strip()).hostname
+    except ValueError:
+        return None
+
+
+class LeadsApi:
+    # Local HTTP/JSON API over a LeadsList, on asyncio streams so it needs nothing beyond the
+    # standard library:
+    #   GET    /leads?after=<id>&limit=<n>              page through the leads in id order
+    #   GET    /leads/search?q=<query>&after=&limit=    same search syntax as the table view
+    #   GET    /leads/<id>
+    #   POST   /leads                                   JSON object (or list of them), or a plain HTML form
+    #   PATCH  /leads/<id>                              JSON object of the fields to change
+    #   DELETE /leads/<id>
+    # Reads run right on the event loop under the leads' lock, so any number of connections are
+    # served at once. Writes go through one queue to a single writer that applies whatever has
+    # queued up as a batch, through run_writes (the Qt main thread when running inside the app).
+    # Everything needs "Authorization: Bearer <token>" (LEADS_API_TOKEN, or a random one per start)
+    # except a form-encoded POST of a single lead with only the embed form's fields (API_FORM_FIELDS),
+    # which is what a web form sends. Requests must name a loopback host or the public URL's host,
+    # and CORS is only sent for the one origin in LEADS_API_ORIGIN, POST only.
+    def __init__(self, leads, search_index, run_writes=None, token=None, public_url=None, allowed_origin=None):
+        self.leads = leads
+        self.search_index = search_index
+        self.token = token or os.environ.get("LEADS_API_TOKEN") or secrets.token_urlsafe(24)
+        # Where a reverse proxy or tunnel exposes the server to web visitors, see FormEmbedTab
+        self.public_url = public_url if public_url is not None else os.environ.get("LEADS_API_PUBLIC_URL", "")
+        self.allowed_origin = allowed_origin if allowed_origin is not None else os.environ.get("LEADS_API_ORIGIN", "")
+        # Takes a function and returns a concurrent.futures.Future of its result, None to call it on the loop
+        self.run_writes = run_writes
+        self.loop = None
+        self.server = None
+        self.write_queue = None
+        self.writer_task = None
+        self.thread = None
+        self.port = None
+        self.requests = 0
+        self.writes = 0
+
+    async def start(self, host=API_HOST, port=API_PORT):
+        self.loop = asyncio.get_running_loop()
+        self.write_queue = asyncio.Queue()
+        self.writer_task = self.loop.create_task(self.writer())
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+        self.writer_task.cancel()
+
+    async def serve_forever(self, host=API_HOST, port=API_PORT):
+        # Headless: runs until cancelled (Ctrl+C)
+        await self.start(host, port)
+        print(f"Serving {len(self.leads)} leads on http://{host}:{self.port}", file=sys.stderr)
+        print(f"API token: {self.token}", file=sys.stderr)
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await self.stop()
+
+    def start_in_thread(self, host=API_HOST, port=API_PORT):
+        # Runs the server on an event loop of its own next to the Qt one, returns once it is listening
+        started = threading.Event()
+        errors = []
+
+        def run():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(self.start(host, port))
+            except OSError as error:
+                errors.append(error)
+                started.set()
+                loop.close()
+                return
+            started.set()
+            loop.run_forever()
+            loop.run_until_complete(self.stop())
+            loop.close()
+
+        self.thread = threading.Thread(target=run, daemon=True)
+        self.thread.start()
+        started.wait()
+        if errors:
+            self.thread = None
+            raise errors[0]
+
+    def stop_thread(self):
+        if self.thread is None:
+            return
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.thread = None
+
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                request_line, *header_lines = head.decode("latin-1").split("\r\n")
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try:
+                    method, target, version = request_line.split(" ", 2)
+                    length = int(headers.get("content-length") or 0)
+                except ValueError:
+                    writer.write(self.response(400, {"error": "Malformed request"}, False, headers))
+                    break
+                if length > API_MAX_BODY_SIZE:
+                    writer.write(self.response(413, {"error": "Request body too large"}, False, headers))
+                    break
+                body = await reader.readexactly(length) if length else b""
+                status, payload = await self.dispatch(method, target, headers, body)
+                keep_alive = version == "HTTP/1.1" and headers.get("connection", "").lower() != "close"
+                writer.write(self.response(status, payload, keep_alive, headers))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def response(self, status, payload, keep_alive, headers):
+        # A str payload is an HTML page, the answer to a plain form post
+        if isinstance(payload, str):
+            body, content_type = payload.encode(), "text/html; charset=utf-8"
+        else:
+            body, content_type = b"" if payload is None else json.dumps(payload).encode(), "application/json"
+        cors = ""
+        if self.allowed_origin and headers.get("origin") == self.allowed_origin:
+            # Only the site with the intake form, and only to add leads
+            cors = (f"Access-Control-Allow-Origin: {self.allowed_origin}\r\n"
+                    f"Access-Control-Allow-Methods: POST\r\n"
+                    f"Access-Control-Allow-Headers: Content-Type\r\n"
+                    f"Vary: Origin\r\n")
+        head = (f"HTTP/1.1 {status} {HTTP_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"{cors}"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        return head.encode() + body
+
+    def allowed_host(self, headers):
+        host = url_host("//" + headers.get("host", ""))
+        return host in API_LOOPBACK_HOSTS or (host is not None and host == url_host(self.public_url))
+
+    def authorized(self, headers):
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), self.token.encode())
+
+    @staticmethod
+    def is_form(headers):
+        return headers.get("content-type", "").startswith(("application/x-www-form-urlencoded", "multipart/form-data"))
+
+    async def dispatch(self, method, target, headers, body):
+        self.requests += 1
+        url = urllib.parse.urlsplit(target)
+        parts = [part for part in url.path.split("/") if part]
+        query = dict(urllib.parse.parse_qsl(url.query))
+        try:
+            if not self.allowed_host(headers):
+                raise ApiError(403, "Unknown host")
+            if method == "OPTIONS":
+                return 204, None
+            public_form = method == "POST" and self.is_form(headers)
+            if not public_form and not self.authorized(headers):
+                raise ApiError(401, "Missing or wrong API token")
+            if not parts or parts[0] != "leads" or len(parts) > 2:
+                raise ApiError(404, f"No such endpoint {url.path}")
+            if len(parts) == 1:
+                if method == "GET":
+                    return 200, self.list_leads(query)
+                if public_form:
+                    return await self.create_form_lead(headers, body)
+                if method == "POST":
+                    return 201, await self.create_leads(self.parse_body(headers, body))
+            elif parts[1] == "search":
+                if method == "GET":
+                    return 200, self.search_leads(query)
+            else:
+                lead_id = self.parse_int(parts[1], "lead id")
+                if method == "GET":
+                    return 200, self.get_lead(lead_id)
+                if method in ("PATCH", "PUT"):
+                    return 200, await self.submit_write("update", lead_id, self.parse_changes(self.parse_body(headers, body)))
+                if method == "DELETE":
+                    return 200, await self.submit_write("delete", lead_id, None)
+            raise ApiError(405, f"{method} is not supported on {url.path}")
+        except ApiError as error:
+            return error.status, {"error": str(error)}
+        except Exception as error:
+            return 500, {"error": str(error)}
+
+    @staticmethod
+    def parse_int(text, name):
+        try:
+            return int(text)
+        except ValueError:
+            raise ApiError(400, f"{name} must be a whole number")
+
+    async def create_form_lead(self, headers, body):
+        # A visitor's browser posted the embedded form, so answer with a page rather than JSON
+        try:
+            data = self.parse_body(headers, body)
+            unknown = [name for name in data if name not in API_FORM_FIELDS]
+            if unknown:
+                raise ApiError(400, f"This form can't send {unknown[0]!r}, only {', '.join(API_FORM_FIELDS)}")
+            if not any(data.get(name, "").strip() for name in ("Name", "Phone", "Email")):
+                raise ApiError(400, "Please fill in a name, phone number or email.")
+            await self.create_leads(data)
+        except ApiError as error:
+            return error.status, FORM_RESPONSE_PAGE.format(title="Not sent", message=html.escape(str(error)))
+        return 201, FORM_RESPONSE_PAGE.format(title="Thank you", message="Thanks, we got your request and will be in touch soon.")
+
+    @staticmethod
+    def parse_body(headers, body):
+        if headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):
+            return dict(urllib.parse.parse_qsl(body.decode("utf-8")))
+        if headers.get("content-type", "").startswith("multipart/form-data"):
+            raise ApiError(400, "Send the form as application/x-www-form-urlencoded")
+        try:
+            return json.loads(body or b"null")
+        except ValueError:
+            raise ApiError(400, "Request body must be JSON")
+
+    @staticmethod
+    def check_strings(record):
+        # JSON numbers, lists or objects would otherwise be stored as their str()
+        for name, value in record.items():
+            if not isinstance(value, str):
+                raise ApiError(400, f"{name} must be a string")
+
+    def parse_changes(self, data):
+        if not isinstance(data, dict) or not data:
+            raise ApiError(400, "Expected a JSON object of fields to change")
+        self.check_strings(data)
+        changes = {}
+        for name, value in data.items():
+            try:
+                field_name, value = normalize_lead_field(name, value)
+            except ValueError as error:
+                raise ApiError(400, str(error))
+            changes[field_name] = value
+        return changes
+
+    def page_limit(self, query):
+        return max(1, min(self.parse_int(query.get("limit", API_PAGE_SIZE), "limit"), API_MAX_PAGE_SIZE))
+
+    def lead_json(self, row):
+        lead = self.leads.record(row).to_dict()
+        lead["id"] = self.leads.ids[row]
+        return lead
+
+    def page(self, rows, total, limit):
+        leads = [self.lead_json(row) for row in rows[:limit]]
+        return {"leads": leads, "total": total, "next_after": leads[-1]["id"] if len(rows) > limit else None}
+
+    def list_leads(self, query):
+        after = self.parse_int(query.get("after", 0), "after")
+        limit = self.page_limit(query)
+        with self.leads.lock:
+            row = self.leads.row_of(after) if after else -1
+            # The lead the cursor points at may have been deleted since, carry on after where it was
+            start = bisect.bisect_right(self.leads.ids, after) if row is None else row + 1
+            return self.page(range(start, min(start + limit + 1, len(self.leads))), len(self.leads), limit)
+
+    def search_leads(self, query):
+        after = self.parse_int(query.get("after", 0), "after")
+        limit = self.page_limit(query)
+        with self.leads.lock:
+            if not self.search_index.is_built():
+                # Building it here would hold the lock for seconds, the app builds it in the background
+                raise ApiError(503, "The search index is still being built, try again shortly")
+            matching_ids = self.search_index.search(query.get("q", ""))
+            if matching_ids is None:
+                return self.list_leads(query)
+            matching_ids = sorted(matching_ids)
+            start = bisect.bisect_right(matching_ids, after)
+            rows = [self.leads.row_of(lead_id) for lead_id in matching_ids[start:start + limit + 1]]
+            return self.page(rows, len(matching_ids), limit)
+
+    def get_lead(self, lead_id):
+        with self.leads.lock:
+            row = self.leads.row_of(lead_id)
+            if row is None:
+                raise ApiError(404, f"No lead with id {lead_id}")
+            return self.lead_json(row)
+
+    async def create_leads(self, data):
+        records = data if isinstance(data, list) else [data]
+        leads = []
+        for record in records:
+            if isinstance(record, dict):
+                self.check_strings(record)
+            lead = validate_import_record(record, import_column_mapping(record)) if isinstance(record, dict) else None
+            if lead is None:
+                raise ApiError(400, "Each lead needs to be a JSON object with a name, phone or email")
+            leads.append(lead)
+        created = await self.submit_write("create", None, leads)
+        return created if isinstance(data, list) else created[0]
+
+    async def submit_write(self, kind, lead_id, data):
+        future = self.loop.create_future()
+        await self.write_queue.put(((kind, lead_id, data), future))
+        return await future
+
+    async def writer(self):
+        # The single writer: takes everything that has queued up and applies it in one go
+        while True:
+            batch = [await self.write_queue.get()]
+            while not self.write_queue.empty() and len(batch) < API_WRITE_BATCH_SIZE:
+                batch.append(self.write_queue.get_nowait())
+            operations = [operation for operation, _ in batch]
+            try:
+                if self.run_writes is None:
+                    results = self.apply_writes(operations)
+                else:
+                    results = await asyncio.wrap_future(self.run_writes(lambda: self.apply_writes(operations)))
+            except Exception as error:
+                results = [error] * len(batch)
+            self.writes += len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.done():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def apply_writes(self, operations):
+        # Consecutive creates go in as one add_leads() call, i.e. one table insert and one journal record
+        results = [None] * len(operations)
+        creates = []
+
+        def add_created():
+            if not creates:
+                return
+            first = self.leads.add_leads([lead for index in creates for lead in operations[index][2]])
+            for index in creates:
+                count = len(operations[index][2])
+                results[index] = [self.lead_json(row) for row in range(first, first + count)]
+                first += count
+            creates.clear()
+
+        for index, (kind, lead_id, data) in enumerate(operations):
+            if kind == "create":
+                creates.append(index)
+                continue
+            add_created()
+            row = self.leads.row_of(lead_id)
+            if row is None:
+                results[index] = ApiError(404, f"No lead with id {lead_id}")
+            elif kind == "update":
+                for field_name, value in data.items():
+                    self.leads.update_lead(row, field_name, value)
+                results[index] = self.lead_json(row)
+            else:
+                self.leads.remove_lead(row)
+                results[index] = {"deleted": lead_id}
+        add_created()
+        return results
+
+
+CLI_CHUNK_SIZE = 1000
+
+
+def lead_filter(args):
+    # Predicate for the --query / --status / --job-type options shared by the commands
+    parsed_query = parse_search_query(args.query)
+    status = args.status and IMPORT_LEAD_STATUSES.get(args.status.lower(), args.status)
+    job_type = args.job_type and IMPORT_JOB_TYPES.get(args.job_type.lower(), args.job_type)
+
+    def matches(lead):
+        if status and lead.get("Lead Status") != status:
+            return False
+        if job_type and lead.get("Job Type") != job_type:
+            return False
+        return lead_matches(lead, parsed_query)
+
+    return matches
+
+
+def filter_options(args):
+    # Just the filter options of args, which is what gets sent along to pool processes
+    return argparse.Namespace(query=getattr(args, "query", "") or "", status=getattr(args, "status", None), job_type=getattr(args, "job_type", None))
+
+
+def iter_matching_leads(store, args):
+    return store.iter_matching(filter_options(args))
+
+
+def parse_assignments(assignments):
+    # ["Lead Status=Closed", "ref=Bob"] -> {"Lead Status": "Closed", "Referred By": "Bob"}
+    updates = {}
+    for assignment in assignments:
+        name, separator, value = assignment.partition("=")
+        if not separator:
+            raise ValueError(f"Expected FIELD=VALUE, got {assignment!r}")
+        field_name, value = normalize_lead_field(name, value)
+        updates[field_name] = value
+    return updates
+
+
+def cli_list(store, args):
+    fields = [field_name.strip() for field_name in args.fields.split(",")] if args.fields else LEAD_FIELDS
+    out = sys.stdout
+    writer = csv.writer(out)
+    if args.format == "csv":
+        writer.writerow(fields)
+    count = 0
+    for chunk in iter_matching_leads(store, args):
+        if args.format == "json":
+            # JSON Lines, one lead per line, which is also what import reads back
+            out.writelines(json.dumps({field_name: lead[field_name] for field_name in fields if field_name in lead}) + "\n" for lead in chunk)
+        else:
+            writer.writerows([lead.get(field_name, "") for field_name in fields] for lead in chunk)
+        count += len(chunk)
+    out.flush()
+    print(f"{count} leads", file=sys.stderr)
+    return 0
+
+
+def cli_import(store, args):
+    # Only the dedupe keys of the stored leads are kept in memory, the leads themselves stream through
+    existing_keys = store.import_keys()
+    counts = collections.Counter()
+    store.append_leads(iter_import_batches(args.file, existing_keys, counts))
+    print(f"Imported {counts['imported']} leads.\nSkipped {counts['duplicates']} duplicates and {counts['rejected']} rows without a name, phone or email.")
+    return 0
+
+
+def cli_export(store, args):
+    count = store.export_matching(args.format, filter_options(args), args.file)
+    print(f"Exported {count} leads to {args.file}")
+    return 0
+
+
+def cli_bulk_update(store, args):
+    if not (args.query or args.status or args.job_type or args.all):
+        print("Refusing to update every lead without --all, narrow it down with --query, --status or --job-type.", file=sys.stderr)
+        return 2
+    try:
+        updates = parse_assignments(args.set)
+    except ValueError as error:
+        print(error, file=sys.stderr)
+        return 2
+    matches = lead_filter(args)
+
+    def update(lead):
+        if not matches(lead) or all(lead.get(field_name) == value for field_name, value in updates.items()):
+            return False
+        lead.update(updates)
+        return True
+
+    print(f"Updated {store.update_leads(update)} leads.")
+    return 0
+
+
+def cli_stats(store, args):
+    counts = store.lead_counts(filter_options(args))
+    total = sum(counts["Lead Status"].values())
+    print(f"{total} leads")
+    for field_name in AGGREGATE_FIELDS:
+        print(f"\n{field_name}")
+        for value, count in counts[field_name].most_common():
+            print(f"  {value or '(blank)':<30}{count:>10}")
+    return 0
+
+
+def cli_duplicates(store, args):
+    duplicates, records = store.find_duplicates(args.limit)
+    writer = csv.writer(sys.stdout)
+    writer.writerow(["Score", "Id", "Name", "Phone", "Email", "Other Id", "Other Name", "Other Phone", "Other Email"])
+    writer.writerows([f"{score:.2f}", first_id, *records[first_id], second_id, *records[second_id]] for score, first_id, second_id in duplicates)
+    sys.stdout.flush()
+    print(f"{len(duplicates)} likely duplicate pairs", file=sys.stderr)
+    return 0
+
+
+def cli_serve(store, args):
+    # The API needs random access by id and a search index, so the leads are loaded in full
+    leads = LeadsList()
+    store.load(leads)
+    while store.load_more(leads):
+        pass
+    store.attach(leads)
+    autosave = AutosaveScheduler(store)
+    leads.add_listener(autosave)
+    search_index = LeadSearchIndex(leads)
+    search_index.build()
+    api = LeadsApi(leads, search_index)
+    try:
+        asyncio.run(api.serve_forever(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        autosave.stop()
+        store.save(leads)
+    return 0
+
+
+BENCHMARK_FIRST_NAMES = ["James", "Mary", "Robert", "Patricia", "John", "Jennifer", "Michael", "Linda", "David", "Elizabeth",
+                         "William", "Barbara", "Richard", "Susan", "Joseph", "Jessica", "Thomas", "Sarah", "Carlos", "Maria",
+                         "Wei", "Priya", "Ahmed", "Fatima", "Olga", "Kenji", "Aisha", "Liam", "Noah", "Emma"]
+BENCHMARK_LAST_NAMES = ["Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis", "Rodriguez", "Martinez",
+                        "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson", "Thomas", "Taylor", "Moore", "Jackson", "Martin",
+                        "Lee", "Nguyen", "Patel", "Kim", "Chen", "O'Brien", "Schmidt", "Novak", "Rossi", "Kowalski"]
+BENCHMARK_STREETS = ["Main St", "Oak Ave", "Maple Dr", "Cedar Ln", "Pine St", "Elm St", "Washington Blvd", "Lake Rd",
+                     "Hill St", "Park Ave", "Sunset Blvd", "River Rd", "Church St", "Mill Rd", "2nd St", "Highland Ave"]
+BENCHMARK_CITIES = ["Springfield", "Riverside", "Franklin", "Greenville", "Bristol", "Clinton", "Fairview", "Salem", "Madison"]
+BENCHMARK_NOTES = ["", "", "Wants a quote for a new roof", "Kitchen remodel, call after 5pm", "Asked about financing",
+                   "Leaky basement, send someone to look", "Needs a new deck before summer", "Left a voicemail",
+                   "Comparing three bids", "Repeat customer\nPrefers email", "Commercial space, 4000 sq ft"]
+BENCHMARK_EMAIL_DOMAINS = ["gmail.com", "yahoo.com", "outlook.com", "hotmail.com", "icloud.com", "comcast.net"]
+BENCHMARK_STEPS = ["load", "save", "add", "delete", "export", "populate_table"]
+
+
+def generate_leads(count, seed=1, chunk_size=10000):
+    # Chunks of made up but realistic leads in the leads_data.json shape, the same for the same seed.
+    # Referrers follow a long tail like real ones do, a few send most of the leads.
+    generator = random.Random(seed)
+    referrers = [f"{generator.choice(BENCHMARK_FIRST_NAMES)} {generator.choice(BENCHMARK_LAST_NAMES)}" for _ in range(300)]
+    referrer_weights = [1 / (rank + 1) for rank in range(len(referrers))]
+    status_weights = [40, 20, 15, 10, 5, 10]
+    job_type_weights = [70, 20, 10]
+    for start in range(0, count, chunk_size):
+        chunk = []
+        for number in range(start, min(count, start + chunk_size)):
+            first_name = generator.choice(BENCHMARK_FIRST_NAMES)
+            last_name = generator.choice(BENCHMARK_LAST_NAMES)
+            lead = {
+                "Name": f"{first_name} {last_name}",
+                "Address": f"{generator.randint(1, 9999)} {generator.choice(BENCHMARK_STREETS)}, {generator.choice(BENCHMARK_CITIES)}",
+                "Phone": f"({generator.randint(200, 999)}) {generator.randint(200, 999)}-{generator.randint(0, 9999):04d}",
+                "Email": f"{first_name.lower()}.{last_name.lower().replace(chr(39), '')}{number}@{generator.choice(BENCHMARK_EMAIL_DOMAINS)}",
+                "Notes": generator.choice(BENCHMARK_NOTES),
+                "Referred By": generator.choices(referrers, referrer_weights)[0] if generator.random() < 0.6 else "",
+                "Job Type": generator.choices(JOB_TYPES, job_type_weights)[0],
+                "Lead Status": generator.choices(LEAD_STATUSES, status_weights)[0],
+            }
+            if generator.random() < 0.1:
+                lead["Referred To"] = generator.choice(referrers)
+            chunk.append(lead)
+        yield chunk
+
+
+def reset_peak_memory():
+    # Linux lets a process reset its peak RSS, elsewhere each step's peak includes the ones before it
+    try:
+        with open("/proc/self/clear_refs", "w") as file:
+            file.write("5")
+    except OSError:
+        pass
+
+
+def peak_memory():
+    # Peak resident set size in bytes, None where there is no way to read it
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def measure(results, step, function, operations=None):
+    gc.collect()
+    reset_peak_memory()
+    started = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - started
+    results[step] = {"seconds": round(seconds, 4), "peak_rss_bytes": peak_memory()}
+    if operations:
+        results[step]["operations"] = operations
+        results[step]["seconds_per_operation"] = round(seconds / operations, 7)
+    print(f"  {step:<16} {seconds:9.3f} s", file=sys.stderr)
+
+
+def benchmark_leads(count, args, folder_path):
+    # Times the hot paths on count generated leads, the way the app runs them
+    path = os.path.join(folder_path, f"leads_{count}.json")
+    JsonLeadStore.write_leads_file(path, generate_leads(count, args.seed))
+    result = {"leads": count, "file_bytes": os.path.getsize(path), "steps": {}}
+    steps = result["steps"]
+    leads = LeadsList()
+    store = JsonLeadStore(path)
+
+    def load():
+        # What ContractorLeadsApp.load_leads_data and load_more_leads do
+        store.load(leads)
+        store.attach(leads)
+        while store.load_more(leads):
+            pass
+
+    def add():
+        for chunk in generate_leads(args.operations, args.seed + 1):
+            for lead in chunk:
+                leads.append_lead(lead)
+        store.flush()
+
+    def delete():
+        generator = random.Random(args.seed)
+        for _ in range(min(args.operations, len(leads))):
+            leads.remove_lead(generator.randrange(len(leads)))
+        store.flush()
+
+    def export(export_format):
+        export_leads(export_format, snapshot_leads(leads), os.path.join(folder_path, f"export.{export_format}"))
+
+    def populate_table():
+        duplicate_index = DuplicateIndex(leads)
+        search_index = LeadSearchIndex(leads)
+        tab = LeadsTableTab(leads, duplicate_index, search_index)
+        tab.sort_keys_timer.stop()
+        tab.resize(1200, 800)
+        tab.show()
+        tab.populate_table()
+        # The first paint is where the view asks for the visible rows
+        QApplication.processEvents()
+        tab.hide()
+        # Everything the step registered, so later steps don't keep updating them
+        for listener in [duplicate_index, search_index, tab.sort_keys, tab.model, tab.sort_keys_restart]:
+            leads.remove_listener(listener)
+        tab.deleteLater()
+
+    if "load" in args.steps:
+        measure(steps, "load", load)
+    else:
+        load()
+    if "save" in args.steps:
+        measure(steps, "save", lambda: store.save(leads))
+    if "add" in args.steps:
+        measure(steps, "add", add, args.operations)
+    if "delete" in args.steps:
+        measure(steps, "delete", delete, args.operations)
+    if "export" in args.steps:
+        for export_format in args.exporters:
+            if export_format == "pdf" and importlib.util.find_spec("reportlab") is None:
+                steps["export_pdf"] = {"skipped": "reportlab is not installed"}
+                continue
+            measure(steps, f"export_{export_format}", lambda: export(export_format))
+    if "populate_table" in args.steps:
+        measure(steps, "populate_table", populate_table)
+    store.close()
+    leads.remove_listener(store)
+    return result
+
+
+def compare_benchmarks(previous, current):
+    # Lines of "leads step previous -> current (ratio)" for every step both runs have
+    previous_runs = {run["leads"]: run["steps"] for run in previous.get("runs", [])}
+    lines = []
+    for run in current["runs"]:
+        for step, result in run["steps"].items():
+            before = previous_runs.get(run["leads"], {}).get(step, {})
+            if "seconds" in result and before.get("seconds"):
+                lines.append(f"{run['leads']:>9} {step:<16} {before['seconds']:9.3f} -> {result['seconds']:9.3f} s  ({result['seconds'] / before['seconds']:.2f}x)")
+    return lines
+
+
+def cli_benchmark(args):
+    args.steps = [step.strip() for step in args.steps.split(",")] if args.steps else BENCHMARK_STEPS
+    args.exporters = [name.strip() for name in args.exporters.split(",")] if args.exporters else sorted(EXPORTERS)
+    unknown = [step for step in args.steps if step not in BENCHMARK_STEPS] + [name for name in args.exporters if name not in EXPORTERS]
+    if unknown:
+        print(f"Unknown step or exporter: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+    report = {
+        "seed": args.seed,
+        "operations": args.operations,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "started": datetime.datetime.now().isoformat(timespec="seconds"),
+        "runs": [],
+    }
+    if "populate_table" in args.steps:
+        # Offscreen unless told otherwise, the benchmark never needs a display
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        # Kept on args for the whole run, PyQt deletes a QApplication nothing refers to right away
+        args.application = QApplication.instance() or QApplication([])
+    # Generated files and exports go in a scratch folder, the real leads are never touched
+    with tempfile.TemporaryDirectory() as folder_path:
+        for count in args.leads:
+            print(f"{count} leads", file=sys.stderr)
+            report["runs"].append(benchmark_leads(count, args, folder_path))
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare) as file:
+            print("\n".join(compare_benchmarks(json.load(file), report)), file=sys.stderr)
+    return 0
+
+
+CLI_COMMANDS = {
+    "list": cli_list,
+    "filter": cli_list,
+    "import": cli_import,
+    "export": cli_export,
+    "bulk-update": cli_bulk_update,
+    "stats": cli_stats,
+    "duplicates": cli_duplicates,
+    "serve": cli_serve,
+    "benchmark": cli_benchmark,
+}
+
+
+def cli_parser():
+    parser = argparse.ArgumentParser(description="Contractor Leads Database without the window. Run with no arguments to open the app.")
+    parser.add_argument("--storage", choices=["json", "sqlite", "sharded"],
+                        help="storage backend, defaults like the app (LEADS_STORAGE or whichever exists). sharded spreads the leads over "
+                             "LEADS_SHARDS files by id, or by Job Type with LEADS_SHARD_BY=job, and works on LEADS_WORKERS processes")
+    parser.add_argument("--profile", metavar="FILE", help="time the command and write a Chrome trace (chrome://tracing, Perfetto) to FILE")
+    query_help = 'search like the table view, e.g. "smith phone:555 ref:bob"'
+    filters = argparse.ArgumentParser(add_help=False)
+    filters.add_argument("--status", help="only leads with this Lead Status")
+    filters.add_argument("--job-type", help="only leads with this Job Type")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    list_parser = commands.add_parser("list", parents=[filters], help="write leads to stdout")
+    filter_parser = commands.add_parser("filter", parents=[filters], help="write the leads matching a search query to stdout")
+    filter_parser.add_argument("query", help=query_help)
+    for command_parser in (list_parser, filter_parser):
+        command_parser.add_argument("--format", choices=["csv", "json"], default="csv", help="csv, or json for one lead per line")
+        command_parser.add_argument("--fields", help="comma separated fields, defaults to all of them")
+    list_parser.add_argument("--query", default="", help=query_help)
+
+    import_parser = commands.add_parser("import", help="import leads from a CSV, JSON or JSON Lines file")
+    import_parser.add_argument("file")
+
+    export_parser = commands.add_parser("export", parents=[filters], help="export leads to a file")
+    export_parser.add_argument("format", choices=sorted(EXPORTERS))
+    export_parser.add_argument("file")
+    export_parser.add_argument("--query", default="", help=query_help)
+
+    update_parser = commands.add_parser("bulk-update", parents=[filters], help="set fields on every matching lead")
+    update_parser.add_argument("--set", action="append", required=True, metavar="FIELD=VALUE", help='e.g. --set "Lead Status=Closed", can be repeated')
+    update_parser.add_argument("--query", default="", help=query_help)
+    update_parser.add_argument("--all", action="store_true", help="allow updating every lead when no filter is given")
+
+    stats_parser = commands.add_parser("stats", parents=[filters], help="count leads by Lead Status, Job Type and Referred By")
+    stats_parser.add_argument("--query", default="", help=query_help)
+
+    duplicates_parser = commands.add_parser("duplicates", help="write likely duplicate pairs to stdout as CSV, best first")
+    duplicates_parser.add_argument("--limit", type=int, help="only the best LIMIT pairs")
+
+    serve_parser = commands.add_parser("serve", help="run the HTTP/JSON API without the window")
+    serve_parser.add_argument("--host", default=API_HOST)
+    serve_parser.add_argument("--port", type=int, default=API_PORT)
+
+    benchmark_parser = commands.add_parser("benchmark", help="time loading, saving, exporting and editing generated leads, report as JSON")
+    benchmark_parser.add_argument("--leads", type=lambda text: [int(count) for count in text.split(",")], default=[10000, 100000],
+                                  help="comma separated dataset sizes, default 10000,100000")
+    benchmark_parser.add_argument("--seed", type=int, default=1, help="the same seed generates the same leads")
+    benchmark_parser.add_argument("--operations", type=int, default=1000, help="leads added and deleted one at a time, default 1000")
+    benchmark_parser.add_argument("--steps", help=f"comma separated, default all of {','.join(BENCHMARK_STEPS)}")
+    benchmark_parser.add_argument("--exporters", help="comma separated, default every format")
+    benchmark_parser.add_argument("--output", help="write the JSON report here instead of stdout")
+    benchmark_parser.add_argument("--compare", help="a previous report to print the timings against")
+    return parser
+
+
+def run_cli(argv):
+    args = cli_parser().parse_args(argv)
+    if args.profile:
+        PROFILER.enable()
+    try:
+        if args.command == "benchmark":
+            return cli_benchmark(args)
+        store = open_lead_store(args.storage)
+        try:
+            return CLI_COMMANDS[args.command](store, args)
+        finally:
+            store.close()
+    finally:
+        if args.profile:
+            print(f"Wrote {PROFILER.write_chrome_trace(args.profile)} trace events to {args.profile}", file=sys.stderr)
+
+
+class ContractorLeadsApp(QMainWindow):
+    def __init__(self):
+        super().__init__()
+        self.setWindowTitle("Contractor Leads Database by REA")
+        self.setGeometry(100, 100, 1600, 800)
+
+        self.central_widget = QWidget(self)
+        self.setCentralWidget(self.central_widget)
+
+        self.store = open_lead_store()
+        self.leads = LeadsList()
+        self.autosave = None
+        self.load_worker = None
+        self.load_error = None
+        self.first_paint_done = False
+
+        self.setup_ui()
+        startup_mark("window built")
+
+        # Autosave status in the status bar
+        self.save_status_label = QLabel("")
+        self.statusBar().addPermanentWidget(self.save_status_label)
+        self.save_status_timer = QTimer(self)
+        self.save_status_timer.timeout.connect(self.update_save_status)
+        self.save_status_timer.start(500)
+
+    def event(self, event):
+        # Loading the leads and checking the dependencies wait until the window has been painted once
+        if event.type() == QEvent.Paint and not self.first_paint_done:
+            self.first_paint_done = True
+            startup_mark("first paint")
+            QTimer.singleShot(0, self.finish_startup)
+        return super().event(event)
+
+    def finish_startup(self):
+        # Reading the leads file happens on a worker thread, the rest once it's done
+        self.load_worker = LoadWorker(self.store, self)
+        self.load_worker.load_failed.connect(self.load_failed)
+        self.load_worker.finished.connect(self.finish_loading)
+        self.load_worker.start()
+        # pip can take a while, never block the window on it
+        if not check_dependencies():
+            threading.Thread(target=install_dependencies, daemon=True).start()
+
+    def load_failed(self, message):
+        self.load_error = message
+
+    def finish_loading(self):
+        self.load_worker.deleteLater()
+        self.load_worker = None
+        if self.load_error is not None:
+            # Nothing is attached, so nothing gets saved over the file that couldn't be read
+            QMessageBox.warning(self, "Load Failed", f"Could not read the saved leads: {self.load_error}")
+            return
+        self.load_leads_data()
+        startup_mark("leads loaded")
+        QTimer.singleShot(0, self.load_more_leads)
+        # LEADS_API_PORT=<port> starts the API server with the app, e.g. for a web intake form
+        if os.environ.get("LEADS_API_PORT"):
+            try:
+                self.tabs.start_api(int(os.environ["LEADS_API_PORT"]))
+            except (OSError, ValueError) as error:
+                print(f"Could not start the API server: {error}", file=sys.stderr)
+
+    def setup_ui(self):
+        self.tabs = TabWidget(self, self.leads)
+        self.logo_label = QLabel()
+        self.logo_pixmap = QPixmap("logo.png")
+        self.logo_pixmap = self.logo_pixmap.scaledToWidth(150, Qt.SmoothTransformation)
+        self.logo_label.setPixmap(self.logo_pixmap)
+        self.logo_label.setAlignment(Qt.AlignCenter)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.logo_label)
+        layout.addWidget(self.tabs)
+        self.central_widget.setLayout(layout)
+
+        self.set_dark_theme()
+
+    def set_dark_theme(self):
+        app = QApplication.instance()
+        app.setStyle("Fusion")
+
+        # Dark palette
+        dark_palette = QPalette()
+        dark_palette.setColor(QPalette.Window, Qt.black)
+        dark_palette.setColor(QPalette.WindowText, Qt.white)
+        dark_palette.setColor(QPalette.Base, QColor(53, 53, 53))
+        dark_palette.setColor(QPalette.AlternateBase, QColor(35, 35, 35))
+        dark_palette.setColor(QPalette.ToolTipBase, Qt.white)
+        dark_palette.setColor(QPalette.ToolTipText, Qt.white)
+        dark_palette.setColor(QPalette.Text, Qt.white)
+        dark_palette.setColor(QPalette.Button, QColor(53, 53, 53))
+        dark_palette.setColor(QPalette.ButtonText, Qt.white)
+        dark_palette.setColor(QPalette.BrightText, Qt.red)
+        dark_palette.setColor(QPalette.Link, QColor(42, 130, 218))
+        dark_palette.setColor(QPalette.Highlight, QColor(42, 130, 218))
+        dark_palette.setColor(QPalette.HighlightedText, Qt.black)
+
+        app.setPalette(dark_palette)
+
+        # Set the font for all widgets to improve readability
+        app_font = QFont("Arial", 10)
+        app.setFont(app_font)
+
+    def update_save_status(self):
+        autosave = self.autosave
+        if autosave is None:
+            return
+        waiting = autosave.queue_depth()
+        if autosave.last_error is not None:
+            status = f"Autosave failed: {autosave.last_error}"
+        elif autosave.saving:
+            status = "Saving..."
+        elif autosave.last_save_time is None:
+            status = "No changes yet"
+        else:
+            status = f"Saved {time.strftime('%H:%M:%S', time.localtime(autosave.last_save_time))} in {autosave.last_latency * 1000:.0f} ms"
+        self.save_status_label.setText(f"{status}  |  {waiting} change{'' if waiting == 1 else 's'} waiting")
+
+    def closeEvent(self, event):
+        if self.load_worker is not None:
+            self.load_worker.finished.disconnect(self.finish_loading)
+            self.load_worker.wait()
+            self.finish_loading()
+        self.tabs.stop_api()
+        if self.autosave is not None:
+            self.autosave.stop()
+        # Closed before the leads were loaded, there is nothing to save
+        if self.store.leads is not None:
+            self.save_leads_data()
+        self.store.close()
+        event.accept()
+
+    def save_leads_data(self):
+        self.store.save(self.leads)
+
+    def load_leads_data(self):
+        # Leads added while the file was still being read go in after the loaded ones, so the
+        # store saves them too
+        added = [lead for chunk in self.leads.iter_dicts() for lead in chunk]
+        self.store.load(self.leads)
+        self.store.attach(self.leads)
+        if added:
+            self.leads.add_leads(added)
+        self.autosave = AutosaveScheduler(self.store)
+        self.leads.add_listener(self.autosave)
+
+    def load_more_leads(self):
+        if self.store.load_more(self.leads):
+            QTimer.singleShot(0, self.load_more_leads)
+        else:
+            startup_mark("all leads paged in")
+            if os.environ.get("LEADS_STARTUP_REPORT"):
+                print(startup_report(), file=sys.stderr)
+
+
+class TabWidget(QWidget):
+    def __init__(self, parent, leads_list):
+        super().__init__()
+
+        self.leads_list = leads_list
+
+        # Shared by the input tab (checking new leads) and the table tab (finding existing duplicates)
+        self.duplicate_index = DuplicateIndex(self.leads_list)
+        self.duplicate_index_timer = QTimer(self)
+        self.duplicate_index_timer.timeout.connect(self.build_duplicate_index)
+        self.duplicate_index_timer.start(0)
+        self.leads_list.add_listener(RestartOnReset(self.duplicate_index_timer))
+
+        # Shared by the table tab's search bar and the API server, also built while the app is idle
+        self.search_index = LeadSearchIndex(self.leads_list)
+        self.search_index_timer = QTimer(self)
+        self.search_index_timer.timeout.connect(self.build_search_index)
+        self.search_index_timer.start(0)
+        self.leads_list.add_listener(RestartOnReset(self.search_index_timer))
+
+        # Counts for the dashboard, following every change as it happens
+        self.aggregates = LeadAggregates(self.leads_list)
+
+        # Follow-up dates for the calendar, one timer waits for the next one to come due. Ones
+        # already overdue at startup are listed on the calendar instead of popping up.
+        self.follow_ups = FollowUpIndex(self.leads_list)
+        self.reminded_until = follow_up_time(datetime.datetime.now())
+        self.reminder_box = None
+        self.reminder_timer = QTimer(self)
+        self.reminder_timer.setSingleShot(True)
+        self.reminder_timer.setTimerType(Qt.PreciseTimer)
+        self.reminder_timer.timeout.connect(self.show_reminders)
+        self.follow_ups.add_watcher(self)
+        self.schedule_reminder()
+
+        # The API server runs on its own thread, its writes are applied here on the main thread
+        self.main_thread_caller = MainThreadCaller(self)
+        self.api = None
+        # Set on the Embed tab, the API also answers requests addressed to this host
+        self.api_public_url = os.environ.get("LEADS_API_PUBLIC_URL", "")
+
+        # Diagnostics, off unless LEADS_PROFILE=1 or switched on in the Settings tab
+        self.event_loop_monitor = EventLoopMonitor(self)
+        self.set_profiling(bool(os.environ.get("LEADS_PROFILE")))
+
+        self.tabs = QTabWidget(self)
+
+        # Every tab is built the first time it is shown
+        self.contractor_input_tab = LazyTab(lambda: ContractorInputTab(self.leads_list, self))
+        self.leads_table_tab = LazyTab(lambda: LeadsTableTab(self.leads_list, self.duplicate_index, self.search_index))
+        self.dashboard_tab = LazyTab(lambda: DashboardTab(self.leads_list, self.aggregates))
+        self.calendar_tab = LazyTab(lambda: CalendarTab(self.leads_list, self.follow_ups))
+        self.calls_tab = LazyTab(ComingSoonTab)
+        self.email_tab = LazyTab(self.create_email_tab)
+        self.messaging_tab = LazyTab(self.create_messaging_tab)
+        self.forms_tab = LazyTab(self.create_forms_tab)
+        self.integrations_tab = LazyTab(lambda: ApiServerTab(self))
+        self.settings_tab = LazyTab(lambda: SettingsTab(self))
+
+        self.tabs.addTab(self.contractor_input_tab, "Contractor Leads Input")
+        self.tabs.addTab(self.leads_table_tab, "Leads Table View")
+        self.tabs.addTab(self.dashboard_tab, "Dashboard")
+        self.tabs.addTab(self.calendar_tab, "Calendar")
+        self.tabs.addTab(self.calls_tab, "Calls")
+        self.tabs.addTab(self.email_tab, "Email")
+        self.tabs.addTab(self.messaging_tab, "Messaging")
+        self.tabs.addTab(self.forms_tab, "Forms")
+        self.tabs.addTab(self.integrations_tab, "Integrations")
+        self.tabs.addTab(self.settings_tab, "Settings")
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.tabs)
+        self.setLayout(layout)
+
+    def create_email_tab(self):
+        email_tab = QTabWidget()
+        email_tab.addTab(LazyTab(ComingSoonTab), "Gmail")
+        email_tab.addTab(LazyTab(ComingSoonTab), "SMTP")
+        return email_tab
+
+    def create_messaging_tab(self):
+        messaging_tab = QTabWidget()
+        messaging_tab.addTab(LazyTab(ComingSoonTab), "Twilio")
+        return messaging_tab
+
+    def create_forms_tab(self):
+        forms_tab = QTabWidget()
+        forms_tab.addTab(LazyTab(ComingSoonTab), "My Forms")
+        forms_tab.addTab(LazyTab(ComingSoonTab), "Create")
+        forms_tab.addTab(LazyTab(lambda: FormEmbedTab(self)), "Embed")
+        forms_tab.addTab(LazyTab(ComingSoonTab), "Settings")
+        return forms_tab
+
+    @profiled("duplicate index build")
+    def build_duplicate_index(self):
+        if self.duplicate_index.build(2000):
+            self.duplicate_index_timer.stop()
+
+    @profiled("search index build")
+    def build_search_index(self):
+        if self.search_index.build(2000):
+            self.search_index_timer.stop()
+
+    def start_api(self, port=API_PORT):
+        # Raises OSError when the port can't be used
+        if self.api is None:
+            api = LeadsApi(self.leads_list, self.search_index, self.main_thread_caller.submit, public_url=self.api_public_url)
+            api.start_in_thread(API_HOST, port)
+            self.api = api
+        return self.api
+
+    def stop_api(self):
+        if self.api is not None:
+            self.api.stop_thread()
+            self.api = None
+
+    def set_api_public_url(self, url):
+        self.api_public_url = url
+        if self.api is not None:
+            self.api.public_url = url
+
+    def set_profiling(self, enabled):
+        PROFILER.enable(enabled)
+        if enabled:
+            self.event_loop_monitor.start()
+        else:
+            self.event_loop_monitor.stop()
+
+    def follow_ups_changed(self):
+        self.schedule_reminder()
+
+    def schedule_reminder(self):
+        entry = self.follow_ups.next_after(self.reminded_until)
+        if entry is None:
+            self.reminder_timer.stop()
+            return
+        delay = (datetime.datetime.strptime(entry[0], FOLLOW_UP_FORMAT) - datetime.datetime.now()).total_seconds()
+        # Far off ones are looked at again in a day, a QTimer can't wait much longer than three weeks
+        self.reminder_timer.start(int(min(max(delay, 0), 24 * 60 * 60) * 1000))
+
+    def show_reminders(self):
+        now = follow_up_time(datetime.datetime.now())
+        due = self.follow_ups.due_after(self.reminded_until, now)
+        self.reminded_until = max(self.reminded_until, now)
+        if due:
+            lines = []
+            for due_time, lead_id in due[:10]:
+                row = self.leads_list.row_of(lead_id)
+                if row is not None:
+                    lines.append(f"{due_time[11:]}  {self.leads_list.value(row, 'Name') or ''}  {self.leads_list.value(row, 'Phone') or ''}")
+            if len(due) > 10:
+                lines.append(f"and {len(due) - 10} more, see the Calendar tab")
+            # Not modal, reminders shouldn't block whatever is being typed
+            if self.reminder_box is None:
+                self.reminder_box = QMessageBox(QMessageBox.Information, "Follow Up Reminder", "", QMessageBox.Ok, self)
+                self.reminder_box.setModal(False)
+            self.reminder_box.setText("Time to follow up with:\n\n" + "\n".join(lines))
+            self.reminder_box.show()
+            QApplication.alert(self.window())
+        self.schedule_reminder()
+
+class RestartOnReset(LeadsListener):
+    # A reset (e.g. the leads loading after the first paint) empties the indexes, build them again
+    def __init__(self, timer):
+        self.timer = timer
+
+    def leads_reset(self):
+        self.timer.start(0)
+
+
+class MainThreadCaller(QObject):
+    # Runs functions handed over from other threads on the Qt main thread, the signal is
+    # queued because it is emitted from another thread
+    call_requested = pyqtSignal(object, object)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.call_requested.connect(self.call)
+
+    def submit(self, function):
+        future = concurrent.futures.Future()
+        self.call_requested.emit(function, future)
+        return future
+
+    def call(self, function, future):
+        try:
+            future.set_result(function())
+        except Exception as error:
+            future.set_exception(error)
+
+
+class EventLoopMonitor(QObject):
+    # Asks for a timeout every INTERVAL ms and records how late it comes, which is how long the
+    # event loop was busy with something else (a slot, a paint, a save) and the window froze
+    INTERVAL = 50
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.timer = QTimer(self)
+        self.timer.setTimerType(Qt.PreciseTimer)
+        self.timer.timeout.connect(self.tick)
+        self.last_tick = None
+
+    def start(self):
+        self.last_tick = time.perf_counter()
+        self.timer.start(self.INTERVAL)
+
+    def stop(self):
+        self.timer.stop()
+
+    def tick(self):
+        now = time.perf_counter()
+        PROFILER.sample("event loop lag", max(now - self.last_tick - self.INTERVAL / 1000, 0))
+        self.last_tick = now
+
+
+def finish_index(parent, index, label):
+    # Finishes an index the idle timer is still building, a chunk per pass of the event loop so
+    # the window keeps painting. Returns False if the user skipped it.
+    if index.is_built():
+        return True
+    progress = QProgressDialog(label, "Skip", 0, len(index.leads), parent)
+    progress.setWindowModality(Qt.WindowModal)
+    progress.setMinimumDuration(300)
+    try:
+        while not index.build(2000):
+            progress.setMaximum(len(index.leads))
+            progress.setValue(index.indexed_rows)
+            QApplication.processEvents()
+            if progress.wasCanceled():
+                return False
+        return True
+    finally:
+        progress.close()
+
+
+class LazyTab(QWidget):
+    # Stands in for a tab page and only creates the real widget when the tab is first shown
+    def __init__(self, factory):
+        super().__init__()
+        self.factory = factory
+        self.widget = None
+        self.page_layout = QVBoxLayout()
+        self.page_layout.setContentsMargins(0, 0, 0, 0)
+        self.setLayout(self.page_layout)
+
+    def showEvent(self, event):
+        if self.widget is None:
+            self.widget = self.factory()
+            self.page_layout.addWidget(self.widget)
+        super().showEvent(event)
+
+
+class ContractorInputTab(QWidget):
+    def __init__(self, leads_list, parent):
+        super().__init__()
+
+        self.leads_list = leads_list
+        self.parent = parent
+
+        self.name_label = QLabel("Name:")
+        self.name_input = QLineEdit()
+
+        self.address_label = QLabel("Address:")
+        self.address_input = QLineEdit()
+
+        self.phone_label = QLabel("Phone Number:")
+        self.phone_input = QLineEdit()
+
+        self.email_label = QLabel("Email:")
+        self.email_input = QLineEdit()
+
+        self.notes_label = QLabel("Notes:")
+        self.notes_input = QTextEdit()
+
+        self.referred_by_label = QLabel("Referred By:")
+        self.referred_by_input = QLineEdit()
+        
+        self.job_type_label = QLabel("Job Type:")
+        self.job_type_dropdown = QComboBox()
+        self.job_type_dropdown.addItems(["Residential", "Commercial", "Unknown"])
+
+        self.follow_up_label = QLabel("Follow Up:")
+        self.follow_up_input = QLineEdit()
+        self.follow_up_input.setPlaceholderText("Optional, e.g. 2024-05-31 or 2024-05-31 14:30")
+        
+        self.submit_button = QPushButton("Submit")
+        self.submit_button.clicked.connect(self.add_lead)  # Connect to the add_lead method
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.name_label)
+        layout.addWidget(self.name_input)
+        layout.addWidget(self.address_label)
+        layout.addWidget(self.address_input)
+        layout.addWidget(self.phone_label)
+        layout.addWidget(self.phone_input)
+        layout.addWidget(self.email_label)
+        layout.addWidget(self.email_input)
+        layout.addWidget(self.notes_label)
+        layout.addWidget(self.notes_input)
+        layout.addWidget(self.referred_by_label)
+        layout.addWidget(self.referred_by_input)
+        layout.addWidget(self.job_type_label)
+        layout.addWidget(self.job_type_dropdown)
+        layout.addWidget(self.follow_up_label)
+        layout.addWidget(self.follow_up_input)
+        layout.addWidget(self.submit_button)
+
+        self.setLayout(layout)
+
+    def add_lead(self):
+        name = self.name_input.text()
+        address = self.address_input.text()
+        phone = self.phone_input.text()
+        email = self.email_input.text()
+        notes = self.notes_input.toPlainText()
+        referred_by = self.referred_by_input.text()
+        job_type = self.job_type_dropdown.currentText()
+        try:
+            follow_up = parse_follow_up(self.follow_up_input.text())
+        except ValueError as error:
+            QMessageBox.warning(self, "Follow Up", str(error))
+            return
+
+        lead_data = {
+            "Name": name,
+            "Address": address,
+            "Phone": phone,
+            "Email": email,
+            "Notes": notes,
+            "Referred By": referred_by,
+            "Job Type": job_type,
+            "Lead Status": "In System"  # Set the initial status here
+        }
+        if follow_up:
+            lead_data[FOLLOW_UP_FIELD] = follow_up
+
+        # Warn before adding what looks like a lead that is already in the system, unless the
+        # check was skipped while the index was still being built
+        duplicate_index = self.parent.duplicate_index
+        matches = duplicate_index.check_lead(lead_data) if finish_index(self, duplicate_index, "Checking for duplicates...") else []
+        if matches:
+            existing = self.leads_list[self.leads_list.row_of(matches[0][1])]
+            answer = QMessageBox.question(
+                self, "Possible Duplicate",
+                f"This lead looks like an existing one:\n\n{existing.get('Name', '')}  {existing.get('Phone', '')}  {existing.get('Email', '')}\n\nAdd it anyway?",
+                QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+            )
+            if answer != QMessageBox.Yes:
+                return
+
+        # Append the lead data to the leads_list, the table picks up the new row by itself
+        self.leads_list.append_lead(lead_data)
+        
+        # Clear input fields after adding the lead
+        self.name_input.clear()
+        self.address_input.clear()
+        self.phone_input.clear()
+        self.email_input.clear()
+        self.notes_input.clear()
+        self.follow_up_input.clear()
+        self.job_type_dropdown.setCurrentIndex(0)
+
+
+# (header, lead field) for every column of the leads table, None for the actions column
+TABLE_COLUMNS = [
+    ("Lead Status", "Lead Status"),
+    ("Name", "Name"),
+    ("Address", "Address"),
+    ("Phone", "Phone"),
+    ("Email", "Email"),
+    ("Notes", "Notes"),
+    ("Job Type", "Job Type"),
+    ("Referred By", "Referred By"),
+    ("Referred To", "Referred To"),
+    ("Follow Up", FOLLOW_UP_FIELD),
+    ("Actions", None),
+]
+STATUS_COLUMN = 0
+JOB_TYPE_COLUMN = 6
+ACTIONS_COLUMN = 10
+
+
+class LeadsTableModel(QAbstractTableModel):
+    PAGE_SIZE = 500
+
+    def __init__(self, leads_list, parent=None):
+        super().__init__(parent)
+        self.leads_list = leads_list
+        self.edit_mode = False
+        # Rows of the list the model has been told about. The list changes before its listeners
+        # hear of it, so a fetchMore in between must not page in rows that are still to be announced.
+        self.known_rows = len(leads_list)
+        # Only this many rows are exposed to the view, the rest are paged in through fetchMore
+        self.loaded_rows = min(self.known_rows, self.PAGE_SIZE)
+        self.paging = True
+        self.pending_removal = 0
+        self.leads_list.add_listener(self)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.loaded_rows
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(TABLE_COLUMNS)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return TABLE_COLUMNS[section][0]
+        return section + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        column = index.column()
+        if role in (Qt.DisplayRole, Qt.EditRole):
+            if column == ACTIONS_COLUMN:
+                return "Delete"
+            # Read the one field straight from its column instead of building the whole record
+            value = self.leads_list.value(index.row(), TABLE_COLUMNS[column][1])
+            if value is None:
+                return "In System" if column == STATUS_COLUMN else ""
+            return value
+        if role == Qt.TextAlignmentRole and column == ACTIONS_COLUMN:
+            return Qt.AlignCenter
+        return None
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.NoItemFlags
+        flags = Qt.ItemIsEnabled | Qt.ItemIsSelectable
+        column = index.column()
+        # The combo boxes can always be changed, free text only while edit mode is on
+        if column in (STATUS_COLUMN, JOB_TYPE_COLUMN) or (self.edit_mode and column != ACTIONS_COLUMN):
+            flags |= Qt.ItemIsEditable
+        return flags
+
+    @profiled("edit setData")
+    def setData(self, index, value, role=Qt.EditRole):
+        if not index.isValid() or role != Qt.EditRole or index.column() == ACTIONS_COLUMN:
+            return False
+        field_name = TABLE_COLUMNS[index.column()][1]
+        if field_name == FOLLOW_UP_FIELD:
+            try:
+                value = parse_follow_up(value)
+            except ValueError:
+                return False
+        # dataChanged is emitted from lead_updated once the collection has applied the change
+        return self.leads_list.update_lead(index.row(), field_name, value)
+
+    def canFetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return False
+        return self.loaded_rows < self.known_rows
+
+    def fetchMore(self, parent=QModelIndex()):
+        if parent.isValid():
+            return
+        count = min(self.PAGE_SIZE, self.known_rows - self.loaded_rows)
+        if count <= 0:
+            return
+        self.beginInsertRows(QModelIndex(), self.loaded_rows, self.loaded_rows + count - 1)
+        self.loaded_rows += count
+        self.endInsertRows()
+
+    def fetch_all(self):
+        if self.canFetchMore():
+            self.beginInsertRows(QModelIndex(), self.loaded_rows, self.known_rows - 1)
+            self.loaded_rows = self.known_rows
+            self.endInsertRows()
+
+    def set_paging(self, paging):
+        # Searching and sorting need every row, paging stays off until they are cleared
+        self.paging = paging
+        if not paging:
+            self.fetch_all()
+
+    def set_edit_mode(self, edit_mode):
+        self.edit_mode = edit_mode
+
+    # LeadsList change notifications
+
+    def leads_inserted(self, first, last):
+        # Rows past the loaded page are picked up later by fetchMore
+        if first > self.loaded_rows:
+            self.known_rows += last - first + 1
+            return
+        self.beginInsertRows(QModelIndex(), first, last)
+        self.known_rows += last - first + 1
+        self.loaded_rows = min(self.loaded_rows + last - first + 1, self.known_rows)
+        self.endInsertRows()
+
+    def leads_about_to_be_removed(self, first, last):
+        if first >= self.loaded_rows:
+            return
+        last = min(last, self.loaded_rows - 1)
+        self.pending_removal = last - first + 1
+        self.beginRemoveRows(QModelIndex(), first, last)
+
+    def leads_removed(self, first, last, removed):
+        if not self.pending_removal:
+            self.known_rows -= last - first + 1
+            return
+        self.known_rows -= last - first + 1
+        self.loaded_rows = min(self.loaded_rows - self.pending_removal, self.known_rows)
+        self.pending_removal = 0
+        self.endRemoveRows()
+
+    def lead_updated(self, row, field_name, old_value, new_value):
+        column = self.column_for_field(field_name)
+        if row < self.loaded_rows and column >= 0:
+            index = self.index(row, column)
+            self.dataChanged.emit(index, index, [Qt.DisplayRole, Qt.EditRole])
+
+    def leads_reset(self):
+        self.beginResetModel()
+        self.known_rows = len(self.leads_list)
+        self.loaded_rows = min(self.known_rows, self.PAGE_SIZE if self.paging else self.known_rows)
+        self.endResetModel()
+
+    def reload(self):
+        self.beginResetModel()
+        self.known_rows = len(self.leads_list)
+        self.loaded_rows = min(self.known_rows, max(self.loaded_rows, self.PAGE_SIZE) if self.paging else self.known_rows)
+        self.endResetModel()
+
+    def column_for_field(self, field_name):
+        for column, (_, field) in enumerate(TABLE_COLUMNS):
+            if field == field_name:
+                return column
+        return -1
+
+
+class LeadsProxyModel(QAbstractProxyModel):
+    # Sits between LeadsTableModel and the view. Without a search, sort or grouping it passes
+    # every source row straight through (keeping fetchMore paging). Otherwise self.rows holds
+    # the source rows shown: for a search, the matching rows computed from the search index
+    # rather than asking about every row, in row order unless sorted. Sorting copies the order
+    # kept by the SortKeyCache, and grouping sorts that again by the group key (stable, so the
+    # column sort holds within each group) with a header entry, -1 - its index in self.groups,
+    # starting each group. An edit moves just that row instead of sorting again. In sorted order
+    # self.positions maps source rows to their place in self.rows, up to date for every entry above
+    # self.positions_valid, and an insert or removal only pulls that mark back to where it happened.
+    MOVE_LIMIT = 100
+
+    def __init__(self, leads_list, search_index, sort_keys, parent=None):
+        super().__init__(parent)
+        self.leads_list = leads_list
+        self.search_index = search_index
+        self.sort_keys = sort_keys
+        self.query = ""
+        self.sort_field = None
+        self.descending = False
+        self.group_field = None
+        self.rows = None
+        self.positions = {}
+        self.positions_valid = 0
+        self.removing = None
+        self.groups = []
+        self.group_lookup = {}
+        self.header_positions = []
+
+    def setSourceModel(self, source_model):
+        super().setSourceModel(source_model)
+        source_model.rowsAboutToBeInserted.connect(self.source_rows_about_to_be_inserted)
+        source_model.rowsInserted.connect(self.source_rows_inserted)
+        source_model.rowsAboutToBeRemoved.connect(self.source_rows_about_to_be_removed)
+        source_model.rowsRemoved.connect(self.source_rows_removed)
+        source_model.dataChanged.connect(self.source_data_changed)
+        source_model.modelAboutToBeReset.connect(self.beginResetModel)
+        source_model.modelReset.connect(self.source_model_reset)
+
+    def is_sorted(self):
+        return self.sort_field is not None or self.group_field is not None
+
+    def set_search_query(self, query):
+        self.query = query.strip()
+        self.rebuild()
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        # Called by the view when a column header is clicked
+        self.sort_field = TABLE_COLUMNS[column][1] if 0 <= column < len(TABLE_COLUMNS) else None
+        self.descending = order == Qt.DescendingOrder
+        self.rebuild()
+
+    def set_group_field(self, field_name):
+        self.group_field = field_name
+        self.rebuild()
+
+    @profiled("proxy rebuild")
+    def rebuild(self):
+        # Searching and sorting cover every lead, not just the pages fetched so far
+        self.sourceModel().set_paging(not (self.query or self.is_sorted()))
+        self.beginResetModel()
+        self.refilter()
+        self.endResetModel()
+
+    def refilter(self):
+        self.groups = []
+        self.group_lookup = {}
+        self.header_positions = []
+        self.positions = {}
+        self.positions_valid = 0
+        matching_ids = self.search_index.search(self.query) if self.query else None
+        if matching_ids is None and not self.is_sorted():
+            self.rows = None
+            return
+        row_count = self.sourceModel().rowCount()
+        if self.sort_field is not None:
+            rows = self.sort_keys.order(self.sort_field, self.descending)
+        elif self.group_field is not None:
+            # Already in group order, so the grouping below has nothing to sort
+            rows = self.sort_keys.order(self.group_field)
+        else:
+            rows = range(row_count)
+        if matching_ids is not None:
+            ids = self.leads_list.ids
+            rows = [row for row in rows if ids[row] in matching_ids]
+        else:
+            rows = list(rows)
+        if len(rows) > row_count:
+            rows = [row for row in rows if row < row_count]
+        if self.group_field is not None:
+            group_keys = self.sort_keys.field_keys(self.group_field)
+            if self.sort_field is not None:
+                rows.sort(key=group_keys.__getitem__)
+            entries = []
+            for key, members in itertools.groupby(rows, group_keys.__getitem__):
+                members = list(members)
+                self.header_positions.append(len(entries))
+                entries.append(self.add_group(key, members[0], len(members)))
+                entries.extend(members)
+            rows = entries
+        self.rows = rows
+
+    def add_group(self, key, row, count):
+        label = self.leads_list.value(row, self.group_field)
+        if not label:
+            label = "In System" if self.group_field == "Lead Status" else "(blank)"
+        self.group_lookup[key] = len(self.groups)
+        self.groups.append([key, label, count])
+        return -len(self.groups)
+
+    def header_group(self, row):
+        if not self.header_positions:
+            return None
+        entry = self.rows[row]
+        return self.groups[-1 - entry] if entry < 0 else None
+
+    def lead_count(self):
+        if self.rows is None:
+            return self.sourceModel().rowCount()
+        return len(self.rows) - len(self.header_positions)
+
+    def lead_rows(self):
+        # The source rows in display order, None when every lead is shown in row order
+        if self.rows is None:
+            return None
+        if self.header_positions:
+            return [row for row in self.rows if row >= 0]
+        return list(self.rows)
+
+    def accepts_row(self, source_row):
+        return not self.query or self.search_index.lead_matches(self.leads_list[source_row], self.query)
+
+    def source_row(self, row):
+        return row if self.rows is None else self.rows[row]
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or row < 0 or column < 0 or row >= self.rowCount() or column >= self.columnCount():
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=None):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.sourceModel().rowCount() if self.rows is None else len(self.rows)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self.sourceModel().columnCount()
+
+    def data(self, index, role=Qt.DisplayRole):
+        group = self.header_group(index.row()) if index.isValid() else None
+        if group is None:
+            return super().data(index, role)
+        if role == Qt.DisplayRole and index.column() == 0:
+            return f"{group[1]} ({group[2]:,})"
+        if role == Qt.FontRole:
+            font = QFont()
+            font.setBold(True)
+            return font
+        return None
+
+    def flags(self, index):
+        if index.isValid() and self.header_group(index.row()) is not None:
+            return Qt.ItemIsEnabled
+        return super().flags(index)
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid():
+            return QModelIndex()
+        row = self.source_row(proxy_index.row())
+        if row < 0:
+            return QModelIndex()
+        return self.sourceModel().index(row, proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid():
+            return QModelIndex()
+        row = source_index.row()
+        if self.rows is not None:
+            position = self.position_of(row)
+            if position is None:
+                return QModelIndex()
+            row = position
+        return self.createIndex(row, source_index.column())
+
+    def position_of(self, row):
+        if not self.is_sorted():
+            position = bisect.bisect_left(self.rows, row)
+            return position if position < len(self.rows) and self.rows[position] == row else None
+        position = self.positions.get(row)
+        if position is None or position >= self.positions_valid:
+            for position in range(self.positions_valid, len(self.rows)):
+                self.positions[self.rows[position]] = position
+            self.positions_valid = len(self.rows)
+            position = self.positions.get(row)
+        return position
+
+    def renumber_rows(self, first, count):
+        # Source rows from first on moved by count, their positions need counting again
+        self.rows = [row + count if row >= first else row for row in self.rows]
+        self.positions = {}
+        self.positions_valid = 0
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return self.rows is None and self.sourceModel().canFetchMore(parent)
+
+    def fetchMore(self, parent=QModelIndex()):
+        if self.rows is None:
+            self.sourceModel().fetchMore(parent)
+
+    # Sorted and grouped rows
+
+    def entry_before(self, entry, row):
+        # True when the displayed entry belongs above source row
+        if self.group_field is not None:
+            group_keys = self.sort_keys.field_keys(self.group_field)
+            if entry < 0:
+                return self.groups[-1 - entry][0] <= group_keys[row]
+            if group_keys[entry] != group_keys[row]:
+                return group_keys[entry] < group_keys[row]
+        if self.sort_field is not None:
+            keys = self.sort_keys.field_keys(self.sort_field)
+            if keys[entry] != keys[row]:
+                return keys[entry] > keys[row] if self.descending else keys[entry] < keys[row]
+        return entry < row
+
+    def insert_position(self, row):
+        low, high = 0, len(self.rows)
+        while low < high:
+            middle = (low + high) // 2
+            if self.entry_before(self.rows[middle], row):
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def insert_entry(self, position, entry):
+        self.beginInsertRows(QModelIndex(), position, position)
+        self.rows.insert(position, entry)
+        self.positions_valid = min(self.positions_valid, position)
+        start = bisect.bisect_left(self.header_positions, position)
+        for i in range(start, len(self.header_positions)):
+            self.header_positions[i] += 1
+        if entry < 0:
+            self.header_positions.insert(start, position)
+        self.endInsertRows()
+
+    def delete_entry(self, position):
+        self.beginRemoveRows(QModelIndex(), position, position)
+        self.take_entry(position)
+        self.endRemoveRows()
+
+    def take_entry(self, position):
+        entry = self.rows.pop(position)
+        self.positions.pop(entry, None)
+        self.positions_valid = min(self.positions_valid, position)
+        start = bisect.bisect_left(self.header_positions, position)
+        if entry < 0:
+            del self.header_positions[start]
+        for i in range(start, len(self.header_positions)):
+            self.header_positions[i] -= 1
+
+    def insert_row(self, row):
+        group = None
+        if self.group_field is not None:
+            key = self.sort_keys.field_keys(self.group_field)[row]
+            if key not in self.group_lookup:
+                self.insert_entry(self.insert_position(row), self.add_group(key, row, 0))
+            group = self.group_lookup[key]
+            self.groups[group][2] += 1
+        position = self.insert_position(row)
+        self.insert_entry(position, row)
+        if group is not None:
+            self.group_header_changed(position)
+
+    def remove_entry(self, position):
+        header = self.header_before(position)
+        self.delete_entry(position)
+        self.group_shrunk(header)
+
+    def header_before(self, position):
+        # Index in self.header_positions of the header of position's group, None when not grouped
+        if not self.header_positions:
+            return None
+        return bisect.bisect_right(self.header_positions, position) - 1
+
+    def group_shrunk(self, header):
+        # A lead below header_positions[header] was taken out
+        if header is None:
+            return
+        group = self.groups[-1 - self.rows[self.header_positions[header]]]
+        group[2] -= 1
+        if group[2]:
+            self.group_header_changed(self.header_positions[header])
+        else:
+            del self.group_lookup[group[0]]
+            self.delete_entry(self.header_positions[header])
+
+    def group_header_changed(self, position):
+        header = self.header_positions[bisect.bisect_right(self.header_positions, position) - 1]
+        self.dataChanged.emit(self.index(header, 0), self.index(header, 0), [Qt.DisplayRole])
+
+    # Source model signals
+
+    def source_rows_about_to_be_inserted(self, parent, first, last):
+        if self.rows is None:
+            self.beginInsertRows(QModelIndex(), first, last)
+
+    def source_rows_inserted(self, parent, first, last):
+        if self.rows is None:
+            self.endInsertRows()
+            return
+        count = last - first + 1
+        if self.is_sorted():
+            if last < self.sourceModel().rowCount() - 1:
+                self.renumber_rows(first, count)
+            new_rows = [row for row in range(first, last + 1) if self.accepts_row(row)]
+            if len(new_rows) > self.MOVE_LIMIT:
+                self.beginResetModel()
+                self.refilter()
+                self.endResetModel()
+            else:
+                for row in new_rows:
+                    self.insert_row(row)
+            return
+        position = bisect.bisect_left(self.rows, first)
+        for i in range(position, len(self.rows)):
+            self.rows[i] += count
+        new_rows = [row for row in range(first, last + 1) if self.accepts_row(row)]
+        if new_rows:
+            self.beginInsertRows(QModelIndex(), position, position + len(new_rows) - 1)
+            self.rows[position:position] = new_rows
+            self.endInsertRows()
+
+    def source_rows_about_to_be_removed(self, parent, first, last):
+        if self.rows is None:
+            self.beginRemoveRows(QModelIndex(), first, last)
+            return
+        if self.is_sorted():
+            if last > first:
+                self.beginResetModel()
+                return
+            position = self.position_of(first)
+            self.removing = (position, self.header_before(position) if position is not None else None)
+            if position is not None:
+                self.beginRemoveRows(QModelIndex(), position, position)
+            return
+        low = bisect.bisect_left(self.rows, first)
+        high = bisect.bisect_right(self.rows, last)
+        self.removing = (low, high, last - first + 1)
+        if high > low:
+            self.beginRemoveRows(QModelIndex(), low, high - 1)
+
+    def source_rows_removed(self, parent, first, last):
+        if self.rows is None:
+            self.endRemoveRows()
+            return
+        if self.is_sorted():
+            if last > first:
+                self.refilter()
+                self.endResetModel()
+                return
+            (position, header), self.removing = self.removing, None
+            if position is not None:
+                self.take_entry(position)
+            self.renumber_rows(last + 1, -1)
+            if position is not None:
+                self.endRemoveRows()
+                self.group_shrunk(header)
+            return
+        low, high, count = self.removing
+        self.removing = None
+        del self.rows[low:high]
+        for i in range(low, len(self.rows)):
+            self.rows[i] -= count
+        if high > low:
+            self.endRemoveRows()
+
+    @profiled("proxy dataChanged")
+    def source_data_changed(self, top_left, bottom_right, roles=[]):
+        if self.rows is None:
+            self.dataChanged.emit(self.index(top_left.row(), top_left.column()), self.index(bottom_right.row(), bottom_right.column()), roles)
+            return
+        fields = {TABLE_COLUMNS[column][1] for column in range(top_left.column(), bottom_right.column() + 1)}
+        moved = self.is_sorted() and (self.sort_field in fields or self.group_field in fields)
+        for row in range(top_left.row(), bottom_right.row() + 1):
+            position = self.position_of(row)
+            accepted = self.accepts_row(row)
+            if position is not None and accepted and not moved:
+                self.dataChanged.emit(self.index(position, top_left.column()), self.index(position, bottom_right.column()), roles)
+            elif not self.is_sorted():
+                if position is not None:
+                    # The edit took the lead out of the search results
+                    self.beginRemoveRows(QModelIndex(), position, position)
+                    del self.rows[position]
+                    self.endRemoveRows()
+                elif accepted:
+                    position = bisect.bisect_left(self.rows, row)
+                    self.beginInsertRows(QModelIndex(), position, position)
+                    self.rows.insert(position, row)
+                    self.endInsertRows()
+            else:
+                # Take the row out and put it back where its new keys belong
+                if position is not None:
+                    self.remove_entry(position)
+                if accepted:
+                    self.insert_row(row)
+
+    def source_model_reset(self):
+        self.refilter()
+        self.endResetModel()
+
+
+class CustomDelegate(QStyledItemDelegate):
+    delete_requested = pyqtSignal(int)
+
+    def createEditor(self, parent, option, index):
+        # Editors only exist while a cell is being edited, nothing is created per row up front
+        if index.column() == STATUS_COLUMN:
+            editor = QComboBox(parent)
+            editor.addItems(LEAD_STATUSES)
+        elif index.column() == JOB_TYPE_COLUMN:
+            editor = QComboBox(parent)
+            editor.addItems(JOB_TYPES)
+        else:
+            editor = super().createEditor(parent, option, index)
+        if isinstance(editor, QLineEdit):
+            editor.editingFinished.connect(lambda: self.commitData.emit(editor))
+        elif isinstance(editor, QComboBox):
+            editor.activated.connect(lambda: self.commitData.emit(editor))
+        return editor
+
+    def setEditorData(self, editor, index):
+        if isinstance(editor, QComboBox):
+            editor.setCurrentText(index.data(Qt.EditRole))
+        else:
+            super().setEditorData(editor, index)
+
+    def setModelData(self, editor, model, index):
+        if isinstance(editor, QComboBox):
+            model.setData(index, editor.currentText(), Qt.EditRole)
+        else:
+            super().setModelData(editor, model, index)
+
+    def paint(self, painter, option, index):
+        if index.column() != ACTIONS_COLUMN:
+            super().paint(painter, option, index)
+            return
+        # Draw the delete button instead of creating a QPushButton for every row
+        button = QStyleOptionButton()
+        button.rect = option.rect.adjusted(2, 2, -2, -2)
+        button.text = index.data(Qt.DisplayRole)
+        button.state = QStyle.State_Enabled
+        QApplication.style().drawControl(QStyle.CE_PushButton, button, painter)
+
+    def editorEvent(self, event, model, option, index):
+        if index.column() == ACTIONS_COLUMN:
+            if event.type() == QEvent.MouseButtonRelease and event.button() == Qt.LeftButton:
+                self.delete_requested.emit(index.row())
+                return True
+            return False
+        return super().editorEvent(event, model, option, index)
+
+
+class ExportWorker(QThread):
+    progress = pyqtSignal(int)
+    export_finished = pyqtSignal(object)
+    export_failed = pyqtSignal(str)
+
+    def __init__(self, export_format, leads, file_name, parent=None):
+        super().__init__(parent)
+        self.export_format = export_format
+        self.leads = leads
+        self.file_name = file_name
+        self.cancelled = False
+
+    def cancel(self):
+        self.cancelled = True
+
+    def run(self):
+        try:
+            count = export_leads(self.export_format, self.leads, self.file_name, self.progress.emit, lambda: self.cancelled)
+        except Exception as error:
+            self.export_failed.emit(str(error))
+        else:
+            self.export_finished.emit(count)
+
+
+class LoadWorker(QThread):
+    # Runs the store's prepare() off the GUI thread, the window stays responsive while a
+    # large JSON file is read
+    load_failed = pyqtSignal(str)
+
+    def __init__(self, store, parent=None):
+        super().__init__(parent)
+        self.store = store
+
+    def run(self):
+        try:
+            self.store.prepare()
+        except Exception as error:
+            self.load_failed.emit(str(error))
+
+
+class ImportWorker(QThread):
+    batch_ready = pyqtSignal(object)
+    progress = pyqtSignal(int)
+    import_finished = pyqtSignal(int, int, int)
+    import_failed = pyqtSignal(str)
+
+    def __init__(self, file_name, existing_columns, parent=None):
+        super().__init__(parent)
+        self.file_name = file_name
+        # The Name, Phone and Email columns of the leads already there
+        self.existing_columns = existing_columns
+        self.cancelled = False
+        # At most two batches waiting for the GUI thread, so a large file can't pile up in memory
+        self.pending_batches = threading.Semaphore(2)
+
+    def cancel(self):
+        self.cancelled = True
+
+    def add_batch(self, batch):
+        self.pending_batches.acquire()
+        self.batch_ready.emit(batch)
+
+    def batch_applied(self):
+        self.pending_batches.release()
+
+    def run(self):
+        try:
+            existing_keys = set(map(import_key, *self.existing_columns))
+            imported, duplicates, rejected = import_leads(self.file_name, self.add_batch, existing_keys,
+                                                          lambda fraction: self.progress.emit(int(fraction * 100)), lambda: self.cancelled)
+        except Exception as error:
+            self.import_failed.emit(str(error))
+        else:
+            self.import_finished.emit(imported, duplicates, rejected)
+
+
+class DuplicatesDialog(QDialog):
+    def __init__(self, leads_list, duplicate_index, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("Possible Duplicates")
+        self.resize(900, 500)
+        self.leads_list = leads_list
+        self.pairs = duplicate_index.find_duplicates(limit=500)
+
+        self.table = QTableWidget(len(self.pairs), 3, self)
+        self.table.setHorizontalHeaderLabels(["Score", "Lead", "Possible Duplicate"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        for row, (score, first_id, second_id) in enumerate(self.pairs):
+            self.table.setItem(row, 0, QTableWidgetItem(f"{score:.2f}"))
+            self.table.setItem(row, 1, QTableWidgetItem(self.describe(first_id)))
+            self.table.setItem(row, 2, QTableWidgetItem(self.describe(second_id)))
+
+        self.merge_button = QPushButton("Merge")
+        self.merge_button.clicked.connect(self.merge_selected)
+        self.ignore_button = QPushButton("Ignore")
+        self.ignore_button.clicked.connect(self.ignore_selected)
+        self.close_button = QPushButton("Close")
+        self.close_button.clicked.connect(self.accept)
+
+        button_layout = QHBoxLayout()
+        button_layout.addWidget(QLabel("Merging keeps the first lead, fills its empty fields from the duplicate and deletes the duplicate."))
+        button_layout.addWidget(self.merge_button)
+        button_layout.addWidget(self.ignore_button)
+        button_layout.addWidget(self.close_button)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.table)
+        layout.addLayout(button_layout)
+        self.setLayout(layout)
+
+    def describe(self, lead_id):
+        lead = self.leads_list[self.leads_list.row_of(lead_id)]
+        return "  |  ".join(value for value in (lead.get("Name", ""), lead.get("Phone", ""), lead.get("Email", ""), lead.get("Address", "")) if value)
+
+    def ignore_selected(self):
+        row = self.table.currentRow()
+        if row >= 0:
+            del self.pairs[row]
+            self.table.removeRow(row)
+
+    def merge_selected(self):
+        row = self.table.currentRow()
+        if row < 0:
+            return
+        _, first_id, second_id = self.pairs[row]
+        first_row = self.leads_list.row_of(first_id)
+        second_row = self.leads_list.row_of(second_id)
+        if first_row is None or second_row is None:
+            QMessageBox.warning(self, "Merge", "One of these leads was already merged or deleted.")
+        else:
+            merge_leads(self.leads_list, first_row, second_row)
+        self.ignore_selected()
+
+
+class LeadsTableTab(QWidget):
+    def __init__(self, leads_list, duplicate_index, search_index):
+        super().__init__()
+        self.edit_mode = False  # Initialize edit_mode to False
+
+        self.leads_list = leads_list
+        self.duplicate_index = duplicate_index
+        self.export_worker = None
+        self.import_worker = None
+
+        # Registered before the model so the keys are current when the proxy hears of a change
+        self.sort_keys = SortKeyCache(self.leads_list)
+        self.model = LeadsTableModel(self.leads_list, self)
+        self.search_index = search_index
+        self.proxy = LeadsProxyModel(self.leads_list, self.search_index, self.sort_keys, self)
+        self.proxy.setSourceModel(self.model)
+        self.table = QTableView(self)
+        self.table.setModel(self.proxy)
+        # Connected after setModel so the view has shifted its spans before a new header gets one
+        self.proxy.modelReset.connect(self.update_group_spans)
+        self.proxy.rowsInserted.connect(self.group_rows_inserted)
+        self.sort_keys_timer = QTimer(self)
+        self.sort_keys_timer.timeout.connect(self.build_sort_keys)
+        self.sort_keys_timer.start(0)
+        self.sort_keys_restart = RestartOnReset(self.sort_keys_timer)
+        self.leads_list.add_listener(self.sort_keys_restart)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        # Header clicks sort through the proxy, nothing is sorted until one is clicked
+        self.table.horizontalHeader().setSortIndicator(-1, Qt.AscendingOrder)
+        self.table.setSortingEnabled(True)
+        self.table.setEditTriggers(QAbstractItemView.CurrentChanged | QAbstractItemView.SelectedClicked | QAbstractItemView.DoubleClicked)
+
+        # Apply custom delegate to create the cell editors on demand
+        self.delegate = CustomDelegate(self.table)
+        self.delegate.delete_requested.connect(self.delete_clicked)
+        self.table.setItemDelegate(self.delegate)
+
+        # Search bar, the query runs once typing pauses
+        self.search_input = QLineEdit()
+        self.search_input.setPlaceholderText("Search leads, e.g. smith  phone:555  email:gmail.com  ref:bob")
+        self.search_input.setClearButtonEnabled(True)
+        self.search_results_label = QLabel("")
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(150)
+        self.search_timer.timeout.connect(self.apply_search)
+        self.search_input.textChanged.connect(self.search_timer.start)
+
+        self.group_combo = QComboBox()
+        self.group_combo.addItems(["No Grouping"] + [f"Group by {field_name}" for field_name in GROUP_FIELDS])
+        self.group_combo.currentIndexChanged.connect(self.group_changed)
+        
+        # Create the refresh button
+        self.refresh_button = QPushButton("Refresh")
+        self.refresh_button.clicked.connect(lambda: self.populate_table())
+
+        # Create the export buttons
+        self.export_csv_button = QPushButton("Export to CSV")
+        self.export_csv_button.clicked.connect(self.export_to_csv)
+        self.export_pdf_button = QPushButton("Export to PDF")
+        self.export_pdf_button.clicked.connect(self.export_to_pdf)
+        self.export_txt_button = QPushButton("Export to TXT")
+        self.export_txt_button.clicked.connect(self.export_to_txt)
+
+        # Create the import button
+        self.import_button = QPushButton("Import Leads")
+        self.import_button.clicked.connect(self.import_from_file)
+
+        # Create the find duplicates button
+        self.duplicates_button = QPushButton("Find Duplicates")
+        self.duplicates_button.clicked.connect(self.find_duplicates)
+
+        # Create the toggle edit mode button
+        self.toggle_edit_button = QPushButton("Toggle Edit Mode")
+        self.toggle_edit_button.clicked.connect(self.toggle_edit_mode)
+
+        # Modify the button sizes here
+        button_width = 120
+        button_height = 30
+
+        # Set fixed sizes for the buttons
+        self.refresh_button.setFixedSize(button_width, button_height)
+        self.export_csv_button.setFixedSize(button_width, button_height)
+        self.export_pdf_button.setFixedSize(button_width, button_height)
+        self.export_txt_button.setFixedSize(button_width, button_height)
+        self.import_button.setFixedSize(button_width, button_height)
+        self.duplicates_button.setFixedSize(button_width, button_height)
+        self.toggle_edit_button.setFixedSize(button_width, button_height)
+
+        # Create a layout for the export buttons
+        export_button_layout = QVBoxLayout()
+        export_button_layout.addWidget(self.export_csv_button)
+        export_button_layout.addWidget(self.export_pdf_button)
+        export_button_layout.addWidget(self.export_txt_button)
+
+        # Create a layout for the buttons and set alignment
+        button_layout = QVBoxLayout()
+        button_layout.addWidget(self.refresh_button)
+        button_layout.addLayout(export_button_layout)
+        button_layout.addWidget(self.import_button)
+        button_layout.addWidget(self.duplicates_button)
+        button_layout.addWidget(self.toggle_edit_button)
+        button_layout.setAlignment(Qt.AlignCenter)  # Center-align the buttons vertically
+
+        # Create the main layout for the tab
+        search_layout = QHBoxLayout()
+        search_layout.addWidget(self.search_input)
+        search_layout.addWidget(self.search_results_label)
+        search_layout.addWidget(self.group_combo)
+
+        layout = QVBoxLayout()
+        layout.addLayout(search_layout)
+        layout.addWidget(self.table)
+        layout.addLayout(button_layout)  # Add the button layout to the main layout
+
+        self.setLayout(layout)
+
+
+    def toggle_edit_mode(self):
+        self.edit_mode = not getattr(self, "edit_mode", False)
+        self.model.set_edit_mode(self.edit_mode)
+        
+        self.toggle_edit_button.setText("Editing Enabled" if self.edit_mode else "Editing Disabled")
+
+    @profiled("populate_table")
+    def populate_table(self):
+        # The view only asks the model for the visible rows, so this is just a reset
+        self.model.reload()
+
+    @profiled("apply_search")
+    def apply_search(self):
+        query = self.search_input.text()
+        self.proxy.set_search_query(query)
+        if query.strip():
+            self.search_results_label.setText(f"{self.proxy.lead_count()} matches")
+        else:
+            self.search_results_label.setText("")
+
+    def build_sort_keys(self):
+        if self.sort_keys.build(5000):
+            self.sort_keys_timer.stop()
+
+    def group_changed(self, index):
+        self.proxy.set_group_field(GROUP_FIELDS[index - 1] if index > 0 else None)
+
+    def update_group_spans(self):
+        # Group headers are a single cell across the whole row
+        self.table.clearSpans()
+        for position in self.proxy.header_positions:
+            self.table.setSpan(position, 0, 1, len(TABLE_COLUMNS))
+
+    def group_rows_inserted(self, parent, first, last):
+        for position in range(first, last + 1):
+            if self.proxy.header_group(position) is not None:
+                self.table.setSpan(position, 0, 1, len(TABLE_COLUMNS))
+
+    def delete_clicked(self, row):
+        row = self.proxy.source_row(row)
+        if row >= 0:
+            self.delete_lead(row)
+
+    @profiled("edit input_field_changed")
+    def input_field_changed(self, row, field_name, new_value):
+        self.leads_list.update_lead(row, field_name, new_value)
+
+    def status_changed(self, row, text):
+        self.input_field_changed(row, "Lead Status", text)
+
+    def name_changed(self, row, text):
+        self.input_field_changed(row, "Name", text)
+        
+    def address_changed(self, row, text):
+        self.input_field_changed(row, "Address", text)
+        
+    def phone_changed(self, row, text):
+        self.input_field_changed(row, "Phone", text)
+        
+    def email_changed(self, row, text):
+        self.input_field_changed(row, "Email", text)
+        
+    def notes_changed(self, row, text):
+        self.input_field_changed(row, "Notes", text)
+        
+    def referred_by_changed(self, row, text):
+        self.input_field_changed(row, "Referred By", text)
+
+    def referred_to_changed(self, row, text):
+        self.input_field_changed(row, "Referred To", text)
+        
+    def export_to_csv(self):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        file_name, _ = QFileDialog.getSaveFileName(self, "Export to CSV", "", "CSV Files (*.csv);;All Files (*)", options=options)
+        if file_name:
+            self.start_export("csv", file_name)
+
+    def export_to_pdf(self):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        file_name, _ = QFileDialog.getSaveFileName(self, "Export to PDF", "", "PDF Files (*.pdf);;All Files (*)", options=options)
+        if file_name:
+            self.start_export("pdf", file_name)
+
+    def export_to_txt(self):
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        file_name, _ = QFileDialog.getSaveFileName(self, "Export to TXT", "", "Text Files (*.txt);;All Files (*)", options=options)
+        if file_name:
+            self.start_export("txt", file_name)
+
+    def start_export(self, export_format, file_name):
+        if self.export_worker is not None:
+            QMessageBox.warning(self, "Export Running", "Wait for the current export to finish or cancel it first.")
+            return
+        # Export what the table shows, i.e. only the search results while a search is active, in display order
+        leads = snapshot_leads(self.leads_list, self.proxy.lead_rows())
+
+        self.export_progress = QProgressDialog(f"Exporting {len(leads)} leads...", "Cancel", 0, max(len(leads), 1), self)
+        self.export_progress.setWindowTitle("Export")
+        self.export_progress.setMinimumDuration(500)
+        self.export_progress.setValue(0)
+
+        self.export_worker = ExportWorker(export_format, leads, file_name, self)
+        self.export_worker.progress.connect(self.export_progress.setValue)
+        self.export_worker.export_finished.connect(self.export_finished)
+        self.export_worker.export_failed.connect(self.export_failed)
+        self.export_worker.finished.connect(self.export_worker_done)
+        self.export_progress.canceled.connect(self.export_worker.cancel)
+        self.export_worker.start()
+
+    def export_finished(self, count):
+        self.export_progress.reset()
+
+    def export_failed(self, message):
+        self.export_progress.reset()
+        QMessageBox.warning(self, "Export Failed", message)
+
+    def export_worker_done(self):
+        self.export_worker.deleteLater()
+        self.export_worker = None
+
+    def import_from_file(self):
+        if self.import_worker is not None:
+            QMessageBox.warning(self, "Import Running", "Wait for the current import to finish or cancel it first.")
+            return
+        options = QFileDialog.Options()
+        options |= QFileDialog.DontUseNativeDialog
+        file_name, _ = QFileDialog.getOpenFileName(self, "Import Leads", "", "Lead Files (*.csv *.json *.jsonl);;All Files (*)", options=options)
+        if not file_name:
+            return
+        # Only the columns are copied here, the keys are made on the worker thread
+        with self.leads_list.lock:
+            existing_columns = [self.leads_list.column_slice(field_name) for field_name in ("Name", "Phone", "Email")]
+
+        self.import_progress = QProgressDialog("Importing leads...", "Cancel", 0, 100, self)
+        self.import_progress.setWindowTitle("Import")
+        self.import_progress.setMinimumDuration(500)
+        self.import_progress.setValue(0)
+
+        self.import_worker = ImportWorker(file_name, existing_columns, self)
+        self.import_worker.batch_ready.connect(self.import_batch_ready)
+        self.import_worker.progress.connect(self.import_progress.setValue)
+        self.import_worker.import_finished.connect(self.import_finished)
+        self.import_worker.import_failed.connect(self.import_failed)
+        self.import_worker.finished.connect(self.import_worker_done)
+        self.import_progress.canceled.connect(self.import_worker.cancel)
+        self.import_worker.start()
+
+    def import_batch_ready(self, batch):
+        # One insert notification per batch for the table, index and store
+        self.leads_list.add_leads(batch)
+        self.import_worker.batch_applied()
+
+    def import_finished(self, imported, duplicates, rejected):
+        self.import_progress.reset()
+        QMessageBox.information(self, "Import Finished",
+                                f"Imported {imported} leads.\nSkipped {duplicates} duplicates and {rejected} rows without a name, phone or email.")
+
+    def import_failed(self, message):
+        self.import_progress.reset()
+        QMessageBox.warning(self, "Import Failed", message)
+
+    def import_worker_done(self):
+        self.import_worker.deleteLater()
+        self.import_worker = None
+
+    def find_duplicates(self):
+        if not finish_index(self, self.duplicate_index, "Indexing leads for duplicates..."):
+            return
+        dialog = DuplicatesDialog(self.leads_list, self.duplicate_index, self)
+        if not dialog.pairs:
+            QMessageBox.information(self, "Find Duplicates", "No likely duplicates found.")
+            return
+        dialog.exec_()
+
+    def delete_lead(self, row):
+        confirmation = QMessageBox.question(
+            self, "Confirm Deletion",
+            "Are you sure you want to delete this lead?",
+            QMessageBox.Yes | QMessageBox.No, QMessageBox.No
+        )
+        
+        if confirmation == QMessageBox.Yes:
+            self.leads_list.remove_lead(row)
+
+    def job_type_changed(self, row, text):
+        self.input_field_changed(row, "Job Type", text)
+
+class CalendarTab(QWidget):
+    # Follow-ups from the FollowUpIndex: the overdue, today and this week views and the day picked
+    # on the calendar are each a range of the index, so showing one costs the leads in it, and the
+    # days of the shown month that have follow-ups are in bold.
+    VIEWS = ["Overdue", "Due Today", "This Week", "Selected Day"]
+
+    def __init__(self, leads_list, follow_ups):
+        super().__init__()
+        self.leads_list = leads_list
+        self.follow_ups = follow_ups
+        self.entries = []
+
+        self.calendar = QCalendarWidget()
+        self.calendar.setGridVisible(True)
+        self.calendar.selectionChanged.connect(self.day_selected)
+        self.calendar.currentPageChanged.connect(self.mark_month)
+
+        self.view_combo = QComboBox()
+        self.view_combo.addItems(self.VIEWS)
+        self.view_combo.currentIndexChanged.connect(self.refresh)
+        self.summary_label = QLabel()
+
+        self.table = QTableWidget(0, 5)
+        self.table.setHorizontalHeaderLabels(["Due", "Name", "Phone", "Lead Status", "Notes"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+
+        self.done_button = QPushButton("Mark Done")
+        self.done_button.clicked.connect(self.mark_done)
+        self.snooze_button = QPushButton("Snooze 1 Day")
+        self.snooze_button.clicked.connect(self.snooze)
+
+        view_layout = QHBoxLayout()
+        view_layout.addWidget(QLabel("Show:"))
+        view_layout.addWidget(self.view_combo)
+        view_layout.addWidget(self.summary_label)
+        view_layout.addStretch()
+        view_layout.addWidget(self.done_button)
+        view_layout.addWidget(self.snooze_button)
+
+        list_layout = QVBoxLayout()
+        list_layout.addLayout(view_layout)
+        list_layout.addWidget(self.table)
+
+        layout = QHBoxLayout()
+        layout.addWidget(self.calendar)
+        layout.addLayout(list_layout, 1)
+        self.setLayout(layout)
+
+        follow_ups.add_watcher(self)
+        self.refresh()
+
+    def follow_ups_changed(self):
+        self.refresh()
+
+    def day_selected(self):
+        if self.view_combo.currentText() == "Selected Day":
+            self.refresh()
+        else:
+            self.view_combo.setCurrentText("Selected Day")
+
+    def refresh(self):
+        now = datetime.datetime.now()
+        windows = follow_up_windows(now)
+        view = self.view_combo.currentText()
+        if view == "Selected Day":
+            day = self.calendar.selectedDate().toPyDate()
+            start, end = day.isoformat(), (day + datetime.timedelta(days=1)).isoformat()
+        else:
+            start, end = windows[view]
+        self.entries = self.follow_ups.between(start, end)
+        self.summary_label.setText(f"{self.follow_ups.count_between(*windows['Overdue'])} overdue, {self.follow_ups.count_between(*windows['Due Today'])} due today")
+
+        self.table.setRowCount(len(self.entries))
+        for position, (due, lead_id) in enumerate(self.entries):
+            row = self.leads_list.row_of(lead_id)
+            values = [due] + [self.leads_list.value(row, field_name) or "" for field_name in ("Name", "Phone", "Lead Status", "Notes")]
+            for column, value in enumerate(values):
+                self.table.setItem(position, column, QTableWidgetItem(value))
+        self.mark_month(self.calendar.yearShown(), self.calendar.monthShown())
+
+    def mark_month(self, year, month):
+        self.calendar.setDateTextFormat(QDate(), QTextCharFormat())
+        bold = QTextCharFormat()
+        bold.setFontWeight(QFont.Bold)
+        first = datetime.date(year, month, 1)
+        following = datetime.date(year + month // 12, month % 12 + 1, 1)
+        for day in sorted({due[:10] for due, _ in self.follow_ups.between(first.isoformat(), following.isoformat())}):
+            self.calendar.setDateTextFormat(QDate.fromString(day, Qt.ISODate), bold)
+
+    def selected_follow_ups(self):
+        # [(row, due)] for the selected lines
+        positions = sorted({index.row() for index in self.table.selectedIndexes()})
+        selected = [(self.leads_list.row_of(self.entries[position][1]), self.entries[position][0]) for position in positions]
+        return [(row, due) for row, due in selected if row is not None]
+
+    def mark_done(self):
+        for row, _ in self.selected_follow_ups():
+            self.leads_list.update_lead(row, FOLLOW_UP_FIELD, "")
+
+    def snooze(self):
+        now = datetime.datetime.now()
+        for row, due in self.selected_follow_ups():
+            due = datetime.datetime.strptime(due, FOLLOW_UP_FORMAT)
+            if due < now:
+                # Overdue ones come back tomorrow at the same time of day
+                due = datetime.datetime.combine(now.date(), due.time())
+            self.leads_list.update_lead(row, FOLLOW_UP_FIELD, follow_up_time(due + datetime.timedelta(days=1)))
+
+
+class DashboardTab(QWidget):
+    # Pipeline counts from LeadAggregates. A change only rewrites the cells of the counters that
+    # moved, found through the count items kept per value, nothing is counted again here.
+    def __init__(self, leads_list, aggregates):
+        super().__init__()
+        self.leads_list = leads_list
+        self.aggregates = aggregates
+        self.total_label = QLabel()
+        self.total_label.setFont(QFont("Arial", 14, QFont.Bold))
+
+        self.tables = {}
+        tables_layout = QHBoxLayout()
+        for field_name, count_header in (("Lead Status", "Leads"), ("Job Type", "Leads"), ("Referred By", "Referrals")):
+            table = QTableWidget(0, 2)
+            table.setHorizontalHeaderLabels([field_name, count_header])
+            table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+            table.verticalHeader().setVisible(False)
+            table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+            self.tables[field_name] = table
+            tables_layout.addWidget(table)
+        # Referrers are listed busiest first, statuses and job types keep their usual order
+        self.tables["Referred By"].horizontalHeader().setSortIndicator(1, Qt.DescendingOrder)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.total_label)
+        layout.addLayout(tables_layout)
+        self.setLayout(layout)
+
+        self.counts_reset()
+        aggregates.add_watcher(self)
+
+    def counts_reset(self):
+        self.count_items = {field_name: {} for field_name in AGGREGATE_FIELDS}
+        listed = {"Lead Status": LEAD_STATUSES, "Job Type": JOB_TYPES + ["Unknown", ""], "Referred By": []}
+        for field_name, table in self.tables.items():
+            table.setSortingEnabled(False)
+            table.setRowCount(0)
+            counts = self.aggregates.counts[field_name]
+            for value in listed[field_name]:
+                self.add_row(field_name, value, counts.get(value, 0))
+            for value, count in counts.items():
+                if value not in self.count_items[field_name]:
+                    self.add_row(field_name, value, count)
+            table.setSortingEnabled(field_name == "Referred By")
+        self.update_total()
+
+    def add_row(self, field_name, value, count):
+        table = self.tables[field_name]
+        sorting = table.isSortingEnabled()
+        table.setSortingEnabled(False)
+        row = table.rowCount()
+        table.insertRow(row)
+        table.setItem(row, 0, QTableWidgetItem(value or "Not Set"))
+        item = QTableWidgetItem()
+        item.setData(Qt.DisplayRole, count)
+        table.setItem(row, 1, item)
+        self.count_items[field_name][value] = item
+        table.setSortingEnabled(sorting)
+
+    def count_changed(self, field_name, value, count):
+        item = self.count_items[field_name].get(value)
+        if item is None:
+            if count:
+                self.add_row(field_name, value, count)
+        elif count or field_name != "Referred By":
+            item.setData(Qt.DisplayRole, count)
+        else:
+            self.tables[field_name].removeRow(item.row())
+            del self.count_items[field_name][value]
+        if field_name == "Lead Status":
+            self.update_total()
+
+    def update_total(self):
+        self.total_label.setText(f"{len(self.leads_list):,} leads")
+
+
+class ApiServerTab(QWidget):
+    def __init__(self, parent):
+        super().__init__()
+        self.parent = parent
+
+        self.port_input = QLineEdit(str(API_PORT))
+        self.port_input.setFixedWidth(80)
+        self.start_button = QPushButton()
+        self.start_button.setFixedSize(160, 30)
+        self.start_button.clicked.connect(self.toggle_server)
+        self.status_label = QLabel()
+
+        self.endpoints_label = QLabel(
+            "GET    /leads?after=<id>&limit=<n>\n"
+            "GET    /leads/search?q=<query>&after=<id>&limit=<n>\n"
+            "GET    /leads/<id>\n"
+            "POST   /leads\n"
+            "PATCH  /leads/<id>\n"
+            "DELETE /leads/<id>\n"
+            "Everything but the web form's POST needs the header  Authorization: Bearer <token>")
+        self.endpoints_label.setFont(QFont("Courier New", 10))
+        self.endpoints_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+        self.token_label = QLabel()
+        self.token_label.setFont(QFont("Courier New", 10))
+        self.token_label.setTextInteractionFlags(Qt.TextSelectableByMouse)
+
+        # Refresh the request counts while the server is running
+        self.stats_timer = QTimer(self)
+        self.stats_timer.timeout.connect(self.update_status)
+        self.stats_timer.start(1000)
+
+        port_layout = QHBoxLayout()
+        port_layout.addWidget(QLabel("Port:"))
+        port_layout.addWidget(self.port_input)
+        port_layout.addWidget(self.start_button)
+        port_layout.addStretch()
+
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel("Local API server, for web forms and other tools to add and update leads"))
+        layout.addLayout(port_layout)
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.token_label)
+        layout.addWidget(self.endpoints_label)
+        layout.addStretch()
+        self.setLayout(layout)
+        self.update_status()
+
+    def toggle_server(self):
+        if self.parent.api is not None:
+            self.parent.stop_api()
+        else:
+            try:
+                self.parent.start_api(int(self.port_input.text()))
+            except (OSError, ValueError) as error:
+                QMessageBox.warning(self, "API Server", f"Could not start the API server: {error}")
+        self.update_status()
+
+    def update_status(self):
+        api = self.parent.api
+        self.port_input.setEnabled(api is None)
+        if api is None:
+            self.start_button.setText("Start API Server")
+            self.status_label.setText("Stopped")
+            self.token_label.setText("")
+        else:
+            self.start_button.setText("Stop API Server")
+            self.status_label.setText(f"Listening on http://{API_HOST}:{api.port}  |  {api.requests} requests, {api.writes} writes")
+            self.token_label.setText(f"Token: {api.token}")
+
+
+FORM_EMBED_TEMPLATE = """<form action="{base_url}/leads" method="post">
+  <input name="Name" placeholder="Name">
+  <input name="Phone" placeholder="Phone">
+  <input name="Email" type="email" placeholder="Email">
+  <input name="Address" placeholder="Address">
+  <select name="Job Type">
+    <option>Residential</option>
+    <option>Commercial</option>
+    <option>Other</option>
+  </select>
+  <textarea name="Notes" placeholder="Tell us about the job"></textarea>
+  <button type="submit">Send</button>
+</form>"""
+
+
+class FormEmbedTab(QWidget):
+    # The form posts from the visitor's browser, so it has to point at an address the internet can
+    # reach (a reverse proxy or tunnel in front of the API server), not at 127.0.0.1
+    def __init__(self, parent):
+        super().__init__()
+        self.parent = parent
+        self.info_label = QLabel("Paste this into a web page. Leads sent with it are added while the API server (Integrations tab) is running. "
+                                 "Enter the public address that forwards to the API server, e.g. a reverse proxy or tunnel.")
+        self.info_label.setWordWrap(True)
+        self.url_input = QLineEdit(parent.api_public_url)
+        self.url_input.setPlaceholderText("https://leads.example.com")
+        self.url_input.textChanged.connect(self.url_changed)
+        self.snippet_text = QTextEdit()
+        self.snippet_text.setReadOnly(True)
+        self.snippet_text.setFont(QFont("Courier New", 10))
+
+        url_layout = QHBoxLayout()
+        url_layout.addWidget(QLabel("Public URL:"))
+        url_layout.addWidget(self.url_input)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.info_label)
+        layout.addLayout(url_layout)
+        layout.addWidget(self.snippet_text)
+        self.setLayout(layout)
+        self.update_snippet()
+
+    def url_changed(self, text):
+        self.parent.set_api_public_url(text.strip())
+        self.update_snippet()
+
+    def update_snippet(self):
+        base_url = self.parent.api_public_url.rstrip("/")
+        if not base_url:
+            port = self.parent.api.port if self.parent.api is not None else API_PORT
+            base_url = f"http://{API_HOST}:{port}"
+        self.snippet_text.setPlainText(FORM_EMBED_TEMPLATE.format(base_url=html.escape(base_url)))
+
+
+class SettingsTab(QWidget):
+    def __init__(self, parent):
+        super().__init__()
+        self.parent = parent
+
+        self.profile_checkbox = QCheckBox("Record timings")
+        self.profile_checkbox.setChecked(PROFILER.enabled)
+        self.profile_checkbox.toggled.connect(self.parent.set_profiling)
+        self.reset_button = QPushButton("Reset")
+        self.reset_button.clicked.connect(self.reset_timings)
+        self.export_button = QPushButton("Export Trace...")
+        self.export_button.clicked.connect(self.export_trace)
+
+        self.timings_table = QTableWidget(0, 5)
+        self.timings_table.setHorizontalHeaderLabels(["Name", "Count", "Total ms", "Mean ms", "Max ms"])
+        self.timings_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.timings_table.verticalHeader().setVisible(False)
+        self.timings_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+
+        # Only refreshed while the tab is on screen
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.timeout.connect(self.update_timings)
+
+        buttons_layout = QHBoxLayout()
+        buttons_layout.addWidget(self.profile_checkbox)
+        buttons_layout.addStretch()
+        buttons_layout.addWidget(self.reset_button)
+        buttons_layout.addWidget(self.export_button)
+
+        layout = QVBoxLayout()
+        layout.addWidget(QLabel("Diagnostics: time loading, saving, searching, editing and exporting, and how long the window stops responding"))
+        layout.addLayout(buttons_layout)
+        layout.addWidget(self.timings_table)
+        self.setLayout(layout)
+        self.update_timings()
+
+    def showEvent(self, event):
+        self.refresh_timer.start(1000)
+        self.update_timings()
+        super().showEvent(event)
+
+    def hideEvent(self, event):
+        self.refresh_timer.stop()
+        super().hideEvent(event)
+
+    def update_timings(self):
+        rows = PROFILER.summary()
+        self.timings_table.setRowCount(len(rows))
+        for row, (name, count, total, mean, longest) in enumerate(rows):
+            values = [name, str(count), f"{total * 1000:.1f}", f"{mean * 1000:.2f}", f"{longest * 1000:.1f}"]
+            for column, value in enumerate(values):
+                item = self.timings_table.item(row, column)
+                if item is None:
+                    item = QTableWidgetItem()
+                    if column:
+                        item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+                    self.timings_table.setItem(row, column, item)
+                item.setText(value)
+
+    def reset_timings(self):
+        PROFILER.reset()
+        self.update_timings()
+
+    def export_trace(self):
+        file_name, _ = QFileDialog.getSaveFileName(self, "Export Trace", "leads_trace.json", "Chrome Trace (*.json)")
+        if not file_name:
+            return
+        try:
+            count = PROFILER.write_chrome_trace(file_name)
+        except OSError as error:
+            QMessageBox.warning(self, "Export Trace", f"Could not write the trace: {error}")
+            return
+        QMessageBox.information(self, "Export Trace", f"Wrote {count} events, open the file in chrome://tracing or ui.perfetto.dev")
+
+
+class ComingSoonTab(QWidget):
+    def __init__(self):
+        super().__init__()
+        self.label = QLabel("Coming Soon")
+        self.label.setAlignment(Qt.AlignCenter)
+        layout = QVBoxLayout()
+        layout.addWidget(self.label)
+        self.setLayout(layout)
+        
+if __name__ == "__main__":
+    # With a command the leads are handled headless, no Qt objects are created
+    if len(sys.argv) > 1 and (sys.argv[1] in CLI_COMMANDS or sys.argv[1].split("=")[0] in ("-h", "--help", "--storage", "--profile")):
+        sys.exit(run_cli(sys.argv[1:]))
+    startup_mark("imports")
+    app = QApplication(sys.argv)
+    startup_mark("QApplication")
+    window = ContractorLeadsApp()
+    window.show()
+    sys.exit(app.exec_())
@@ -0,0 +1,16 @@
+# The app is one script with spaces in its name, the tests share one import of it
+import importlib.util
+import os
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+APP_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "even more stable release.py")
+spec = importlib.util.spec_from_file_location("leads_app_module", APP_PATH)
+app = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(app)
+
+
+def qt_application():
+    from PyQt5.QtWidgets import QApplication
+    global application
+    application = QApplication.instance() or QApplication([])
+    return application
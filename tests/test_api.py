@@ -0,0 +1,116 @@
+import asyncio
+import json
+import unittest
+import urllib.parse
+
+from leads_app import app
+
+TOKEN = "test-token"
+
+
+class LeadsApiTest(unittest.TestCase):
+    def setUp(self):
+        self.leads = app.LeadsList([{"Name": "Ada Lovelace", "Phone": "555-0100"}, {"Name": "Grace Hopper", "Email": "grace@navy.mil"}])
+        self.search_index = app.LeadSearchIndex(self.leads)
+        self.search_index.build()
+
+    def run_requests(self, requests, **options):
+        # [(method, path, headers, body)] -> [(status, headers, body)], each on its own connection
+        async def run():
+            api = app.LeadsApi(self.leads, self.search_index, token=TOKEN, **options)
+            await api.start("127.0.0.1", 0)
+            responses = []
+            try:
+                for method, path, headers, body in requests:
+                    headers = {"Host": f"127.0.0.1:{api.port}", "Connection": "close", **headers}
+                    if isinstance(body, (dict, list)):
+                        body = json.dumps(body).encode()
+                        headers.setdefault("Content-Type", "application/json")
+                    headers["Content-Length"] = str(len(body))
+                    reader, writer = await asyncio.open_connection("127.0.0.1", api.port)
+                    writer.write(f"{method} {path} HTTP/1.1\r\n".encode()
+                                 + "".join(f"{name}: {value}\r\n" for name, value in headers.items()).encode() + b"\r\n" + body)
+                    response = await reader.read()
+                    writer.close()
+                    head, _, response_body = response.partition(b"\r\n\r\n")
+                    status_line, *header_lines = head.decode().split("\r\n")
+                    response_headers = {line.partition(":")[0].lower(): line.partition(":")[2].strip() for line in header_lines}
+                    responses.append((int(status_line.split()[1]), response_headers, response_body))
+            finally:
+                await api.stop()
+            return responses
+        return asyncio.run(run())
+
+    def request(self, method, path, headers=None, body=b"", **options):
+        return self.run_requests([(method, path, headers or {}, body)], **options)[0]
+
+    def authorized(self, method, path, body=b"", headers=None):
+        status, _, response = self.request(method, path, {"Authorization": f"Bearer {TOKEN}", **(headers or {})}, body)
+        return status, json.loads(response) if response else None
+
+    def form(self, fields):
+        return self.request("POST", "/leads", {"Content-Type": "application/x-www-form-urlencoded"},
+                            urllib.parse.urlencode(fields).encode())
+
+    def test_reads_and_writes_need_the_token(self):
+        for method, path, body in [("GET", "/leads", b""), ("GET", "/leads/1", b""), ("GET", "/leads/search?q=ada", b""),
+                                   ("PATCH", "/leads/1", {"Notes": "x"}), ("DELETE", "/leads/1", b""),
+                                   ("POST", "/leads", {"Name": "Mallory"}), ("POST", "/leads", [{"Name": "Mallory"}])]:
+            self.assertEqual(self.request(method, path, {}, body)[0], 401, (method, path))
+            self.assertEqual(self.request(method, path, {"Authorization": "Bearer wrong"}, body)[0], 401, (method, path))
+        self.assertEqual(len(self.leads), 2)
+        self.assertEqual(self.leads.value(0, "Notes"), None)
+
+    def test_endpoints_with_the_token(self):
+        status, page = self.authorized("GET", "/leads?limit=1")
+        self.assertEqual((status, [lead["Name"] for lead in page["leads"]], page["next_after"]), (200, ["Ada Lovelace"], 1))
+        status, page = self.authorized("GET", "/leads?after=1")
+        self.assertEqual([lead["Name"] for lead in page["leads"]], ["Grace Hopper"])
+        self.assertEqual(self.authorized("GET", "/leads/search?q=email:grace")[1]["total"], 1)
+        status, created = self.authorized("POST", "/leads", [{"Name": "Alan Turing"}, {"Phone": "555-0199"}])
+        self.assertEqual((status, [lead["id"] for lead in created]), (201, [3, 4]))
+        status, lead = self.authorized("PATCH", "/leads/3", {"Lead Status": "Closed", "notes": "Enigma"})
+        self.assertEqual((status, lead["Lead Status"], lead["Notes"]), (200, "Closed", "Enigma"))
+        self.assertEqual(self.authorized("DELETE", "/leads/4"), (200, {"deleted": 4}))
+        self.assertEqual(self.authorized("GET", "/leads/4")[0], 404)
+        self.assertEqual(len(self.leads), 3)
+
+    def test_rejects_values_that_are_not_strings(self):
+        self.assertEqual(self.authorized("POST", "/leads", {"Name": {"first": "Ada"}})[0], 400)
+        self.assertEqual(self.authorized("POST", "/leads", [{"Name": "Ada", "Phone": 5550100}])[0], 400)
+        self.assertEqual(self.authorized("PATCH", "/leads/1", {"Notes": ["a"]})[0], 400)
+        self.assertEqual(len(self.leads), 2)
+
+    def test_web_form_needs_no_token(self):
+        status, headers, body = self.form({"Name": "Visitor", "Phone": "555-0123", "Job Type": "Commercial", "Notes": "Roof"})
+        self.assertEqual(status, 201)
+        self.assertTrue(headers["content-type"].startswith("text/html"))
+        self.assertIn(b"Thank", body)
+        self.assertEqual(self.leads[2].to_dict()["Job Type"], "Commercial")
+        self.assertEqual(self.leads[2]["Lead Status"], "In System")
+
+    def test_web_form_only_takes_its_own_fields(self):
+        for fields in [{"Name": "Visitor", "Lead Status": "Closed"}, {"Name": "Visitor", "Follow Up": "2026-01-01 09:00"}, {"Notes": "no contact"}]:
+            status, headers, body = self.form(fields)
+            self.assertEqual(status, 400, fields)
+            self.assertTrue(headers["content-type"].startswith("text/html"))
+        self.assertEqual(len(self.leads), 2)
+
+    def test_unknown_host_is_refused(self):
+        for host in ["attacker.example", "127.0.0.1.attacker.example"]:
+            status, _, _ = self.request("GET", "/leads", {"Host": host, "Authorization": f"Bearer {TOKEN}"})
+            self.assertEqual(status, 403, host)
+        status, _, _ = self.request("POST", "/leads", {"Host": "leads.example.com", "Content-Type": "application/x-www-form-urlencoded"},
+                                    b"Name=Visitor", public_url="https://leads.example.com/")
+        self.assertEqual(status, 201)
+
+    def test_cors_only_for_the_configured_origin(self):
+        _, headers, _ = self.request("OPTIONS", "/leads", {"Origin": "https://evil.example"}, allowed_origin="https://shop.example")
+        self.assertNotIn("access-control-allow-origin", headers)
+        _, headers, _ = self.request("OPTIONS", "/leads", {"Origin": "https://shop.example"}, allowed_origin="https://shop.example")
+        self.assertEqual(headers["access-control-allow-origin"], "https://shop.example")
+        self.assertEqual(headers["access-control-allow-methods"], "POST")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import itertools
+import random
+import unittest
+
+from leads_app import app
+
+FIRST_NAMES = ["Ann", "Anne", "Bob", "Robert", "Carla", "Karla"]
+LAST_NAMES = ["Smith", "Smyth", "Jones", "Garcia"]
+
+
+def random_lead(generator):
+    first = generator.choice(FIRST_NAMES)
+    return {
+        "Name": f"{first} {generator.choice(LAST_NAMES)}",
+        "Phone": generator.choice(["", f"(212) 555-{generator.randint(0, 40):04d}"]),
+        "Email": generator.choice(["", f"{first.lower()}{generator.randint(0, 20)}@example.com"]),
+    }
+
+
+def brute_force_duplicates(leads):
+    # Every pair sharing a blocking key, scored directly
+    records = {leads.ids[row]: app.duplicate_record(leads[row]) for row in range(len(leads))}
+    duplicates = []
+    for first_id, second_id in itertools.combinations(sorted(records), 2):
+        first, second = records[first_id], records[second_id]
+        if set(app.duplicate_keys(first)) & set(app.duplicate_keys(second)):
+            score = app.duplicate_score(first, second)
+            if score >= app.DuplicateIndex.THRESHOLD:
+                duplicates.append((score, first_id, second_id))
+    return sorted(duplicates, reverse=True)
+
+
+class DuplicateIndexTest(unittest.TestCase):
+    # Small enough that no block goes over MAX_BLOCK_SIZE, so the index has to find every pair
+    def test_matches_brute_force_after_changes(self):
+        generator = random.Random(9)
+        leads = app.LeadsList([random_lead(generator) for _ in range(60)])
+        index = app.DuplicateIndex(leads)
+        while not index.build(25):
+            pass
+        self.assertEqual(index.find_duplicates(), brute_force_duplicates(leads))
+        for _ in range(100):
+            choice = generator.random()
+            if choice < 0.5:
+                field_name = generator.choice(["Name", "Phone", "Email"])
+                leads.update_lead(generator.randrange(len(leads)), field_name, random_lead(generator)[field_name])
+            elif choice < 0.75:
+                leads.add_leads([random_lead(generator)])
+            else:
+                leads.remove_lead(generator.randrange(len(leads)))
+        self.assertEqual(index.find_duplicates(), brute_force_duplicates(leads))
+
+    def test_check_lead(self):
+        leads = app.LeadsList([{"Name": "Ann Smith", "Phone": "212-555-0101"}, {"Name": "Bob Jones", "Email": "bob@example.com"}])
+        index = app.DuplicateIndex(leads)
+        self.assertEqual([lead_id for _, lead_id in index.check_lead({"Name": "Anne Smith", "Phone": "(212) 555-0101"})], [leads.ids[0]])
+        self.assertEqual([lead_id for _, lead_id in index.check_lead({"Name": "Robert Jones", "Email": "BOB@example.com"})], [leads.ids[1]])
+        self.assertEqual(index.check_lead({"Name": "Carla Garcia"}), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
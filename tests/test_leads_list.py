@@ -0,0 +1,69 @@
+import json
+import os
+import random
+import tempfile
+import unittest
+
+from leads_app import app
+
+
+class LeadsListTest(unittest.TestCase):
+    def test_json_shape_round_trips(self):
+        leads = [
+            {"Name": "Ada", "Address": "", "Phone": "555", "Email": "", "Notes": "", "Referred By": "", "Job Type": "Residential", "Lead Status": "In System"},
+            {"Name": "Grace", "Notes": None, "Job Type": None, "Custom": 3},
+            {"Name": "Alan", "Referred To": "Bob", "Follow Up": "2026-01-02 09:00"},
+        ]
+        leads_list = app.LeadsList(leads)
+        self.assertEqual([lead.to_dict() for lead in leads_list], leads)
+        self.assertEqual([lead for chunk in leads_list.iter_dicts() for lead in chunk], leads)
+        self.assertEqual(json.dumps(leads_list[1].to_dict()), json.dumps(leads[1]))
+        self.assertEqual(app.Lead.from_dict(leads[1]).to_dict(), leads[1])
+        self.assertEqual(leads_list[1].get("Notes", ""), "")
+
+    def test_json_store_keeps_the_file_shape(self):
+        leads = [{"Name": "Ada", "Phone": None, "Lead Status": "In System"}, {"Name": "Grace", "Extra": [1, 2]}]
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "leads.json")
+            with open(path, "w") as file:
+                json.dump(leads, file)
+            store = app.JsonLeadStore(path)
+            leads_list = app.LeadsList()
+            store.load(leads_list)
+            store.attach(leads_list)
+            store.save(leads_list)
+            store.close()
+            with open(path) as file:
+                self.assertEqual(file.read(), json.dumps(leads))
+
+    def test_many_distinct_enum_values(self):
+        count = 70000
+        leads_list = app.LeadsList([{"Name": str(index), "Job Type": f"Type {index}"} for index in range(count)])
+        self.assertEqual(leads_list.value(count - 1, "Job Type"), f"Type {count - 1}")
+        self.assertEqual(leads_list.snapshot([count - 1]).value(0, "Job Type"), f"Type {count - 1}")
+
+    def test_row_of_with_ids_out_of_order(self):
+        generator = random.Random(3)
+        leads_list = app.LeadsList()
+        leads_list.add_leads([{"Name": "early"}], [500])
+        leads_list.add_leads([{"Name": str(lead_id)} for lead_id in range(1, 300)], list(range(1, 300)))
+        self.assertFalse(leads_list.ids_sorted)
+        for _ in range(200):
+            if generator.random() < 0.3:
+                leads_list.remove_lead(generator.randrange(len(leads_list)))
+            else:
+                leads_list.append_lead({"Name": "new"})
+            lead_id = generator.choice(leads_list.ids)
+            self.assertEqual(leads_list.row_of(lead_id), list(leads_list.ids).index(lead_id))
+        self.assertIsNone(leads_list.row_of(10 ** 9))
+
+    def test_row_of_with_ids_in_order(self):
+        leads_list = app.LeadsList([{"Name": str(index)} for index in range(100)])
+        leads_list.remove_leads(10, 5)
+        self.assertTrue(leads_list.ids_sorted)
+        self.assertEqual(leads_list.row_of(leads_list.ids[50]), 50)
+        self.assertIsNone(leads_list.row_of(12))
+
+
+if __name__ == "__main__":
+    unittest.main()
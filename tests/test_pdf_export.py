@@ -0,0 +1,45 @@
+import importlib.util
+import os
+import re
+import tempfile
+import unittest
+
+from leads_app import app
+
+
+@unittest.skipIf(importlib.util.find_spec("reportlab") is None, "reportlab is not installed")
+class PdfExportTest(unittest.TestCase):
+    def export(self, leads):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        path = os.path.join(folder.name, "leads.pdf")
+        progress = []
+        count = app.export_leads("pdf", app.LeadsList(leads), path, progress.append)
+        with open(path, "rb") as file:
+            data = file.read()
+        return count, progress, data
+
+    def test_writes_every_lead(self):
+        leads = [lead for chunk in app.generate_leads(1200, 3) for lead in chunk]
+        count, progress, data = self.export(leads)
+        self.assertEqual(count, 1200)
+        self.assertTrue(data.startswith(b"%PDF"))
+        self.assertEqual(progress[-1], 1200)
+
+    def test_long_values_wrap_and_split_across_pages(self):
+        leads = [{"Name": "Short"}, {"Name": "Tall", "Notes": "\n".join(f"line {index}" for index in range(150))},
+                 {"Name": "x" * 300, "Email": "a@b.c"}, {"Name": "After"}]
+        count, _, data = self.export(leads)
+        self.assertEqual(count, 4)
+        # The tall row doesn't fit under the first one and takes three pages of its own, and the
+        # long name wraps to more lines than are left on the third
+        self.assertEqual(re.search(rb"/Count (\d+)", data).group(1), b"5")
+
+    def test_wrap_breaks_long_words(self):
+        lines = app.wrap_pdf_text("alpha " + "b" * 80 + " gamma", "Helvetica", 60)
+        self.assertEqual("".join(line for line, _ in lines).replace(" ", ""), "alpha" + "b" * 80 + "gamma")
+        self.assertTrue(all(width <= 60 for _, width in lines))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,144 @@
+import random
+import unittest
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtTest import QAbstractItemModelTester
+
+from leads_app import app, qt_application
+
+NAMES = ["smith", "Smith", "oak", "maple", "bob", "garcia", ""]
+
+
+def random_lead(generator):
+    return {
+        "Name": f"{generator.choice(NAMES)} {generator.choice(NAMES)}".strip(),
+        "Phone": f"555-{generator.randint(0, 30):04d}",
+        "Lead Status": generator.choice(app.LEAD_STATUSES + [""]),
+        "Job Type": generator.choice(app.JOB_TYPES + [""]),
+        "Referred By": generator.choice(NAMES),
+    }
+
+
+class RemovalWatcher(app.LeadsListener):
+    # Notes the ids of the leads being removed, so the proxy's rowsAboutToBeRemoved can be checked
+    # to still point at them rather than at whatever moved into their rows
+    def __init__(self, leads, proxy):
+        self.leads = leads
+        self.proxy = proxy
+        self.removing_ids = None
+        self.mismatches = []
+        proxy.rowsAboutToBeRemoved.connect(self.proxy_rows_about_to_be_removed)
+
+    def leads_about_to_be_removed(self, first, last):
+        self.removing_ids = set(self.leads.ids[first:last + 1])
+
+    def leads_removed(self, first, last, removed):
+        self.removing_ids = None
+
+    def proxy_rows_about_to_be_removed(self, parent, first, last):
+        if self.removing_ids is None:
+            return
+        for position in range(first, last + 1):
+            row = self.proxy.source_row(position)
+            if row >= 0 and (row >= len(self.leads) or self.leads.ids[row] not in self.removing_ids):
+                self.mismatches.append((position, row))
+
+
+class LeadsProxyModelTest(unittest.TestCase):
+    # Sorted, grouped and searched rows have to stay what sorting everything again would give,
+    # through inserts, removals and edits, and the proxy has to stay a valid model throughout
+    def setUp(self):
+        qt_application()
+        self.generator = random.Random(11)
+        self.leads = app.LeadsList([random_lead(self.generator) for _ in range(30)])
+        self.search_index = app.LeadSearchIndex(self.leads)
+        self.sort_keys = app.SortKeyCache(self.leads)
+        self.model = app.LeadsTableModel(self.leads)
+        self.proxy = app.LeadsProxyModel(self.leads, self.search_index, self.sort_keys)
+        self.proxy.setSourceModel(self.model)
+        self.removal_watcher = RemovalWatcher(self.leads, self.proxy)
+        self.leads.add_listener(self.removal_watcher)
+        self.tester = QAbstractItemModelTester(self.proxy, QAbstractItemModelTester.FailureReportingMode.Fatal)
+
+    def expected_entries(self):
+        proxy = self.proxy
+        rows = range(len(self.leads))
+        if proxy.query:
+            query = app.parse_search_query(proxy.query)
+            rows = [row for row in rows if app.lead_matches(self.leads[row], query)]
+
+        def key(field_name):
+            return lambda row: app.SortKeyCache.key(field_name, self.leads.value(row, field_name))
+        if proxy.sort_field is not None:
+            rows = sorted(rows, key=key(proxy.sort_field), reverse=proxy.descending)
+        if proxy.group_field is None:
+            return list(rows)
+        rows = sorted(rows, key=key(proxy.group_field))
+        entries = []
+        for _, members in app.itertools.groupby(rows, key(proxy.group_field)):
+            members = list(members)
+            entries.append(("group", len(members)))
+            entries.extend(members)
+        return entries
+
+    def check(self):
+        proxy = self.proxy
+        entries = []
+        for position in range(proxy.rowCount()):
+            group = proxy.header_group(position)
+            entries.append(proxy.source_row(position) if group is None else ("group", group[2]))
+        self.assertEqual(entries, self.expected_entries())
+        self.assertEqual(self.removal_watcher.mismatches, [])
+        shown = {entry: position for position, entry in enumerate(entries) if not isinstance(entry, tuple)}
+        for row in range(len(self.leads)):
+            index = proxy.mapFromSource(self.model.index(row, 1))
+            self.assertEqual(index.row() if index.isValid() else None, shown.get(row), row)
+
+    def change(self):
+        choice = self.generator.random()
+        if choice < 0.5:
+            row = self.generator.randrange(len(self.leads))
+            field_name = self.generator.choice(["Name", "Lead Status", "Job Type", "Referred By"])
+            self.leads.update_lead(row, field_name, random_lead(self.generator)[field_name])
+        elif choice < 0.7:
+            self.leads.add_leads([random_lead(self.generator) for _ in range(self.generator.randint(1, 3))])
+        elif choice < 0.95:
+            self.leads.remove_lead(self.generator.randrange(len(self.leads)))
+        else:
+            self.leads.remove_leads(self.generator.randrange(len(self.leads) - 2), 2)
+
+    def check_changes(self, count=40):
+        for step in range(count):
+            self.change()
+            if step % 5 == 0:
+                self.check()
+        self.check()
+
+    def test_sorted(self):
+        for column, order in [(1, Qt.AscendingOrder), (0, Qt.DescendingOrder), (6, Qt.AscendingOrder)]:
+            self.proxy.sort(column, order)
+            self.check_changes()
+
+    def test_grouped(self):
+        for group_field, column in [("Lead Status", None), ("Referred By", 1), ("Job Type", 0)]:
+            self.proxy.set_group_field(group_field)
+            if column is not None:
+                self.proxy.sort(column, Qt.DescendingOrder)
+            self.check_changes()
+
+    def test_searched(self):
+        self.proxy.set_search_query("smith")
+        self.check_changes()
+        self.proxy.sort(1, Qt.AscendingOrder)
+        self.check_changes()
+        self.proxy.set_group_field("Lead Status")
+        self.check_changes()
+
+    def test_many_rows_added_while_sorted(self):
+        self.proxy.sort(1, Qt.AscendingOrder)
+        self.leads.add_leads([random_lead(self.generator) for _ in range(app.LeadsProxyModel.MOVE_LIMIT + 1)])
+        self.check()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+import random
+import unittest
+
+from leads_app import app
+
+WORDS = ["smith", "smyth", "sam", "samuel", "oak", "oakley", "main", "maple", "bob", "bobby", "a", "an", "x", "gmail", "garcia"]
+QUERY_WORDS = WORDS + ["s", "sm", "sa", "o", "oa", "m", "ma", "b", "g", "gm", "z", "555", "12", "0100", "phone:555", "phone:0",
+                       "name:s", "name:sm", "email:bob", "email:b", "ref:sa", "ref:s", "notes:m", "address:oak", "ga@", "!!"]
+
+
+def random_lead(generator):
+    def words(count):
+        return " ".join(generator.choice(WORDS) for _ in range(generator.randint(0, count)))
+    return {
+        "Name": words(3).title(),
+        "Address": f"{generator.randint(1, 99)} {words(2)}",
+        "Phone": generator.choice(["", f"555-{generator.randint(0, 9999):04d}", f"(212) 555-{generator.randint(0, 120):04d}"]),
+        "Email": generator.choice(["", f"{generator.choice(WORDS)}@{generator.choice(['gmail.com', 'oak.net'])}"]),
+        "Notes": words(4),
+        "Referred By": words(1),
+    }
+
+
+def random_query(generator):
+    return " ".join(generator.choice(QUERY_WORDS) for _ in range(generator.randint(1, 3)))
+
+
+class LeadSearchIndexTest(unittest.TestCase):
+    # The index has to agree with checking every lead one by one, also after it followed changes
+    def check_queries(self, leads, index, generator, count=150):
+        for _ in range(count):
+            query = random_query(generator)
+            parsed = app.parse_search_query(query)
+            expected = {leads.ids[row] for row in range(len(leads)) if app.lead_matches(leads[row], parsed)}
+            self.assertEqual(index.search(query), expected, query)
+
+    def test_matches_brute_force(self):
+        generator = random.Random(5)
+        leads = app.LeadsList([random_lead(generator) for _ in range(400)])
+        index = app.LeadSearchIndex(leads)
+        self.check_queries(leads, index, generator)
+
+    def test_matches_brute_force_after_changes(self):
+        generator = random.Random(7)
+        leads = app.LeadsList([random_lead(generator) for _ in range(300)])
+        index = app.LeadSearchIndex(leads)
+        # Fill the cache of short words first, the changes below have to keep it right
+        for query in ["s", "sm", "o", "b", "ma", "name:s", "ref:sa", "phone:5"]:
+            index.search(query)
+        for step in range(300):
+            choice = generator.random()
+            if choice < 0.4:
+                row = generator.randrange(len(leads))
+                leads.update_lead(row, generator.choice(app.SEARCH_FIELDS), random_lead(generator)["Name"])
+            elif choice < 0.7:
+                leads.add_leads([random_lead(generator) for _ in range(generator.randint(1, 3))])
+            elif len(leads) > 10:
+                leads.remove_lead(generator.randrange(len(leads)))
+            if step % 30 == 0:
+                self.check_queries(leads, index, generator, 20)
+        self.check_queries(leads, index, generator)
+
+    def test_built_in_chunks(self):
+        generator = random.Random(11)
+        leads = app.LeadsList([random_lead(generator) for _ in range(250)])
+        index = app.LeadSearchIndex(leads)
+        while not index.build(40):
+            # Changes to rows already indexed and to rows still waiting
+            leads.update_lead(generator.randrange(len(leads)), "Name", "Samuel Oakley")
+            leads.add_leads([random_lead(generator)])
+        self.check_queries(leads, index, generator)
+
+    def test_empty_query(self):
+        leads = app.LeadsList([{"Name": "Bob Smith"}])
+        self.assertIsNone(app.LeadSearchIndex(leads).search("  "))
+
+
+if __name__ == "__main__":
+    unittest.main()
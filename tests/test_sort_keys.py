@@ -0,0 +1,58 @@
+import random
+import unittest
+
+from leads_app import app
+
+NAMES = ["smith", "Smith", "oak", "Maple", "bob", "garcia", ""]
+FIELDS = ["Name", "Lead Status", "Job Type", "Referred By"]
+
+
+def random_lead(generator):
+    return {
+        "Name": generator.choice(NAMES),
+        "Lead Status": generator.choice(app.LEAD_STATUSES + [""]),
+        "Job Type": generator.choice(app.JOB_TYPES + [""]),
+        "Referred By": generator.choice(NAMES),
+    }
+
+
+class SortKeyCacheTest(unittest.TestCase):
+    # The cached keys and orders have to match sorting the current values, also after edits
+    def check_orders(self, leads, sort_keys):
+        for field_name in FIELDS:
+            keys = [app.SortKeyCache.key(field_name, leads.value(row, field_name)) for row in range(len(leads))]
+            self.assertEqual(sort_keys.field_keys(field_name), keys, field_name)
+            self.assertEqual(sort_keys.order(field_name), sorted(range(len(leads)), key=keys.__getitem__), field_name)
+            self.assertEqual(sort_keys.order(field_name, True), sorted(range(len(leads)), key=keys.__getitem__, reverse=True), field_name)
+
+    def test_statuses_sort_in_pipeline_order(self):
+        leads = app.LeadsList([{"Lead Status": status} for status in reversed(app.LEAD_STATUSES)] + [{"Name": "No status"}])
+        sort_keys = app.SortKeyCache(leads)
+        statuses = [leads.value(row, "Lead Status") or "In System" for row in sort_keys.order("Lead Status")]
+        self.assertEqual(statuses, ["In System", "In System"] + app.LEAD_STATUSES[1:])
+
+    def test_matches_sorting_after_changes(self):
+        generator = random.Random(3)
+        leads = app.LeadsList([random_lead(generator) for _ in range(300)])
+        sort_keys = app.SortKeyCache(leads)
+        # Half the fields built a chunk at a time, the rest on first use
+        while not sort_keys.build(40):
+            if generator.random() < 0.2:
+                leads.add_leads([random_lead(generator)])
+        self.check_orders(leads, sort_keys)
+        for step in range(400):
+            choice = generator.random()
+            if choice < 0.6:
+                field_name = generator.choice(FIELDS)
+                leads.update_lead(generator.randrange(len(leads)), field_name, random_lead(generator)[field_name])
+            elif choice < 0.8:
+                leads.add_leads([random_lead(generator) for _ in range(generator.randint(1, 3))])
+            else:
+                leads.remove_lead(generator.randrange(len(leads)))
+            if step % 40 == 0:
+                self.check_orders(leads, sort_keys)
+        self.check_orders(leads, sort_keys)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,177 @@
+import os
+import sqlite3
+import tempfile
+import time
+import unittest
+
+from leads_app import app
+
+
+class TornFile:
+    # Stands in for the journal file: writes half of the first write, then fails
+    def __init__(self, file):
+        self.file = file
+        self.failed = False
+
+    def write(self, text):
+        if self.failed:
+            return self.file.write(text)
+        self.failed = True
+        self.file.write(text[:len(text) // 2])
+        self.file.flush()
+        raise OSError("No space left on device")
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+
+def failing_once(method):
+    calls = []
+
+    def wrapper(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return method(*args)
+    return wrapper
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.01)
+
+
+class QuickAutosave(app.AutosaveScheduler):
+    DELAY = 0.05
+    MAX_DELAY = 0.2
+    RETRY_DELAY = 0.1
+
+
+def stored_names(store):
+    leads = app.LeadsList()
+    store.load(leads)
+    while store.load_more(leads):
+        pass
+    return [lead["Name"] for lead in leads]
+
+
+class StoreFlushTest(unittest.TestCase):
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.addCleanup(self.folder.cleanup)
+
+    def open_store(self, store):
+        leads = app.LeadsList()
+        store.load(leads)
+        while store.load_more(leads):
+            pass
+        store.attach(leads)
+        return leads
+
+    def check_retry(self, make_store, break_write):
+        store = make_store()
+        leads = self.open_store(store)
+        leads.add_leads([{"Name": "Ada Lovelace", "Phone": "555-0100"}])
+        break_write(store)
+        with self.assertRaises(Exception):
+            store.flush()
+        self.assertEqual(store.pending_count(), 1)
+        leads.add_leads([{"Name": "Grace Hopper", "Phone": "555-0101"}])
+        store.flush()
+        self.assertEqual(store.pending_count(), 0)
+        store.close()
+        self.assertEqual(stored_names(make_store()), ["Ada Lovelace", "Grace Hopper"])
+
+    def test_sqlite_keeps_changes_after_failed_write(self):
+        path = os.path.join(self.folder.name, "leads.db")
+
+        def break_write(store):
+            store.write_rows = failing_once(store.write_rows)
+        self.check_retry(lambda: app.SqliteLeadStore(path), break_write)
+
+    def test_sharded_keeps_changes_after_failed_write(self):
+        path = os.path.join(self.folder.name, "shards")
+
+        def break_write(store):
+            # Lead 1 goes to shard 1
+            store.shards[1].write_rows = failing_once(store.shards[1].write_rows)
+        self.check_retry(lambda: app.ShardedLeadStore(path, shard_count=2, workers=1), break_write)
+
+    def test_json_cuts_off_torn_line_and_writes_again(self):
+        path = os.path.join(self.folder.name, "leads.json")
+
+        def break_write(store):
+            store.journal_file = TornFile(store.journal_file)
+        self.check_retry(lambda: app.JsonLeadStore(path), break_write)
+
+    def test_json_journal_replays_after_failed_write(self):
+        # No compaction on close, the leads have to come back from the journal
+        path = os.path.join(self.folder.name, "leads.json")
+        store = app.JsonLeadStore(path)
+        leads = self.open_store(store)
+        leads.add_leads([{"Name": "Ada Lovelace"}])
+        store.journal_file = TornFile(store.journal_file)
+        with self.assertRaises(OSError):
+            store.flush()
+        leads.add_leads([{"Name": "Grace Hopper"}])
+        store.flush()
+        store.journal_file.close()
+        self.assertEqual(stored_names(app.JsonLeadStore(path)), ["Ada Lovelace", "Grace Hopper"])
+
+
+class AutosaveTest(unittest.TestCase):
+    def setUp(self):
+        folder = tempfile.TemporaryDirectory()
+        self.addCleanup(folder.cleanup)
+        self.path = os.path.join(folder.name, "leads.json")
+        self.store = app.JsonLeadStore(self.path)
+        self.leads = app.LeadsList()
+        self.store.load(self.leads)
+        self.store.attach(self.leads)
+
+    def start(self, scheduler_class):
+        autosave = scheduler_class(self.store)
+        self.leads.add_listener(autosave)
+        self.addCleanup(autosave.stop)
+        return autosave
+
+    def journal_names(self):
+        return [lead["Name"] for record in self.store.read_segment(self.store.segment) if record["op"] == "insert" for lead in record["leads"]]
+
+    def test_every_change_is_journaled_without_waiting_for_a_pause(self):
+        class SlowCompaction(app.AutosaveScheduler):
+            DELAY = MAX_DELAY = 60
+        self.start(SlowCompaction)
+        for name in ["Ada Lovelace", "Grace Hopper"]:
+            self.leads.add_leads([{"Name": name}])
+            wait_for(lambda: self.store.pending_count() == 0 and name in self.journal_names(), timeout=1)
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_failed_write_is_retried_without_another_change(self):
+        self.store.journal_file = TornFile(self.store.journal_file)
+        autosave = self.start(QuickAutosave)
+        self.leads.add_leads([{"Name": "Ada Lovelace"}])
+        wait_for(lambda: autosave.last_error is not None)
+        wait_for(lambda: autosave.last_error is None and self.store.pending_count() == 0)
+        self.assertEqual(self.journal_names(), ["Ada Lovelace"])
+
+    def test_compaction_waits_for_a_pause(self):
+        self.store.COMPACT_EVERY = 3
+        autosave = self.start(QuickAutosave)
+        self.leads.add_leads([{"Name": "Ada Lovelace"}])
+        self.leads.add_leads([{"Name": "Grace Hopper"}])
+        wait_for(lambda: self.store.pending_count() == 0)
+        time.sleep(QuickAutosave.MAX_DELAY * 2)
+        self.assertFalse(os.path.exists(self.path))
+        self.leads.add_leads([{"Name": "Alan Turing"}])
+        wait_for(lambda: os.path.exists(self.path) and not autosave.saving)
+        autosave.stop()
+        self.store.close()
+        self.assertEqual(stored_names(app.JsonLeadStore(self.path)), ["Ada Lovelace", "Grace Hopper", "Alan Turing"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import unittest
+
+from PyQt5.QtTest import QAbstractItemModelTester
+
+from leads_app import app, qt_application
+
+
+class FetchOnInsert(app.LeadsListener):
+    # A listener ahead of the model that pages rows in while an insert is being announced,
+    # the way a view reacting to an earlier listener can
+    def __init__(self):
+        self.model = None
+
+    def leads_inserted(self, first, last):
+        while self.model is not None and self.model.canFetchMore():
+            self.model.fetchMore()
+
+
+def make_leads(count, start=0):
+    return [{"Name": f"Lead {index}", "Phone": f"555-{index:04d}"} for index in range(start, start + count)]
+
+
+class LeadsTableModelTest(unittest.TestCase):
+    def setUp(self):
+        qt_application()
+        self.leads = app.LeadsList(make_leads(1200))
+        self.fetcher = FetchOnInsert()
+        self.leads.add_listener(self.fetcher)
+        self.model = app.LeadsTableModel(self.leads)
+        self.fetcher.model = self.model
+        self.tester = QAbstractItemModelTester(self.model, QAbstractItemModelTester.FailureReportingMode.Fatal)
+
+    def check_rows(self):
+        self.assertLessEqual(self.model.rowCount(), len(self.leads))
+        name_column = self.model.column_for_field("Name")
+        for row in range(self.model.rowCount()):
+            self.assertEqual(self.model.data(self.model.index(row, name_column)), self.leads.value(row, "Name"))
+
+    def test_fetch_during_insert_stays_within_the_list(self):
+        self.leads.add_leads(make_leads(10, 5000))
+        self.assertEqual(self.model.rowCount(), len(self.leads))
+        self.check_rows()
+
+    def test_remove_and_insert_with_the_page_loaded(self):
+        self.leads.remove_lead(0)
+        self.leads.add_leads(make_leads(3, 6000))
+        self.assertEqual(self.model.rowCount(), len(self.leads))
+        self.check_rows()
+
+    def test_remove_past_the_loaded_page(self):
+        self.fetcher.model = None
+        self.leads.remove_lead(len(self.leads) - 1)
+        while self.model.canFetchMore():
+            self.model.fetchMore()
+        self.assertEqual(self.model.rowCount(), len(self.leads))
+        self.check_rows()
+
+
+if __name__ == "__main__":
+    unittest.main()